@@ -0,0 +1,100 @@
+# Copyright 2021 Red Hat, Inc.
+# GNU General Public License v3.0+ (see COPYING or
+# https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import absolute_import, division, print_function
+
+
+__metaclass__ = type
+
+import os
+
+from ansible import constants as C
+from ansible.errors import AnsibleActionFail
+from ansible.plugins.action import ActionBase
+
+from ansible_collections.repo_setup.repos.plugins.module_utils.repo_setup.get_hash.hash_info import (
+    resolve_hash_queries,
+)
+
+QUERY_ARGS = ("os_version", "release", "component", "tag", "dlrn_url")
+# keys of the items of queries
+QUERY_KEYS = QUERY_ARGS + ("fact_name",)
+# default of the dlrn_url option of the module
+DEFAULT_DLRN_URL = "https://trunk.rdoproject.org"
+HASH_RESULTS = ("commit_hash", "distro_hash", "full_hash", "extended_hash", "dlrn_url")
+
+
+class ActionModule(ActionBase):
+    """Resolve the get_hash queries on the controller.
+
+    Every host of a play usually asks for the same hashes, so each unique
+    query is resolved once per run and the result is shared with the other
+    forks through a cache in the local tmp dir of the run, which is removed
+    when the run ends.
+    """
+
+    TRANSFERS_FILES = False
+    _VALID_ARGS = frozenset(QUERY_ARGS + ("queries", "resolve_on"))
+
+    def run(self, tmp=None, task_vars=None):
+        result = super(ActionModule, self).run(tmp, task_vars)
+        del tmp  # tmp no longer has any effect
+
+        args = dict(self._task.args)
+        resolve_on = args.pop("resolve_on", "controller")
+        if resolve_on == "target":
+            result.update(
+                self._execute_module(
+                    module_name=self._task.action,
+                    module_args=dict(args, resolve_on=resolve_on),
+                    task_vars=task_vars,
+                )
+            )
+            return result
+        if resolve_on != "controller":
+            raise AnsibleActionFail(
+                "resolve_on must be one of: controller, target, got: %s" % resolve_on
+            )
+
+        defaults = dict((k, args[k]) for k in QUERY_ARGS if args.get(k) is not None)
+        # like the module, don't use the dlrn_url of the controller config
+        defaults.setdefault("dlrn_url", DEFAULT_DLRN_URL)
+        queries = args.get("queries")
+        if queries is not None and not isinstance(queries, list):
+            raise AnsibleActionFail("queries must be a list of dicts")
+        for query in queries or []:
+            if not isinstance(query, dict):
+                raise AnsibleActionFail("queries must be a list of dicts")
+            unknown = sorted(set(query) - set(QUERY_KEYS))
+            if unknown:
+                raise AnsibleActionFail(
+                    "Unsupported keys in queries: %s, supported keys are: %s"
+                    % (", ".join(unknown), ", ".join(QUERY_KEYS))
+                )
+        queries = [dict(defaults, **query) for query in queries or [{}]]
+
+        result.update(success=False, changed=False, error="")
+        try:
+            hashes = resolve_hash_queries(
+                queries, cache_dir=os.path.join(C.DEFAULT_LOCAL_TMP, "get_hash")
+            )
+        except Exception as exc:
+            result.update(
+                failed=True,
+                error=str(exc),
+                msg="Error something went wrong fetching hash info",
+            )
+            return result
+
+        if args.get("queries") is not None:
+            result["hashes"] = hashes
+            result["ansible_facts"] = dict(
+                (query["fact_name"], query_hashes["full_hash"])
+                for query, query_hashes in zip(queries, hashes)
+                if query.get("fact_name")
+            )
+        else:
+            for k in HASH_RESULTS:
+                result[k] = hashes[0][k]
+        result["success"] = True
+        return result
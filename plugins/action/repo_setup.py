@@ -0,0 +1,160 @@
+# Copyright 2021 Red Hat, Inc.
+# GNU General Public License v3.0+ (see COPYING or
+# https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import absolute_import, division, print_function
+
+
+__metaclass__ = type
+
+import contextlib
+import fcntl
+import hashlib
+import io
+import json
+import os
+
+from ansible import constants as C
+from ansible.errors import AnsibleActionFail
+from ansible.module_utils.parsing.convert_bool import boolean
+from ansible.plugins.action import ActionBase
+
+from ansible_collections.repo_setup.repos.plugins.module_utils.repo_setup import (
+    main as repo_setup,
+)
+
+# options that change the rendered repo files
+RENDER_ARGS = (
+    "repos",
+    "branch",
+    "output_path",
+    "mirror",
+    "rdo_mirror",
+    "stream",
+    "pin",
+)
+# options of type bool of the module
+BOOL_ARGS = ("stream", "pin")
+# the UBI repo files are rendered from the distro repos of the host
+TARGET_DISTROS = ("ubi8", "ubi9")
+# ansible_distribution facts of the distros supported by repo-setup. RHEL
+# can't be told apart from UBI by its facts, so it's detected on the host.
+DISTRO_FACTS = {"CentOS": "centos", "Fedora": "fedora"}
+
+
+def _get_distro_from_facts(task_vars):
+    """Returns the repo-setup distro of a host from its facts, or None"""
+    facts = task_vars.get("ansible_facts") or {}
+    distro_id = DISTRO_FACTS.get(facts.get("distribution"))
+    if distro_id == "fedora":
+        return distro_id
+    if distro_id and (distro_id, facts.get("distribution_major_version")) in (
+        repo_setup.SUPPORTED_DISTROS
+    ):
+        return distro_id + facts["distribution_major_version"]
+    return None
+
+
+def _normalize_args(args):
+    """Convert the task args like the module argument spec does.
+
+    The args are used on the controller before the module validates them,
+    so a comma separated string of repos is split and the bool options are
+    converted. Raises AnsibleActionFail for invalid values.
+    """
+    args = dict(args)
+    if "rendered_files" in args:
+        raise AnsibleActionFail("rendered_files is set by the action plugin")
+    repos = args.get("repos")
+    if isinstance(repos, str):
+        args["repos"] = [repo.strip() for repo in repos.split(",") if repo.strip()]
+    elif repos is not None and not isinstance(repos, list):
+        raise AnsibleActionFail("repos must be a list, got %r" % repos)
+    for option in BOOL_ARGS:
+        if option in args:
+            try:
+                args[option] = boolean(args[option])
+            except TypeError as exc:
+                raise AnsibleActionFail("%s: %s" % (option, exc))
+    resolve_on = args.setdefault("resolve_on", "controller")
+    if resolve_on not in ("controller", "target"):
+        raise AnsibleActionFail(
+            "resolve_on must be one of controller, target, got %r" % resolve_on
+        )
+    return args
+
+
+def _render_cached(render_args, cache_dir):
+    """Render the repo files once per unique set of options in the run.
+
+    The first fork rendering a set of options holds a lock on its cache
+    file, so the other forks wait for it instead of downloading the same
+    repo files again.
+    """
+    key = json.dumps(render_args, sort_keys=True)
+    cache_path = os.path.join(
+        cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json"
+    )
+    with open(cache_path + ".lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            with open(cache_path) as cache_file:
+                return json.load(cache_file)
+        except (IOError, OSError, ValueError):
+            pass
+        args = repo_setup._make_args(**render_args)
+        with contextlib.redirect_stdout(io.StringIO()):
+            repo_setup._validate_args(args, "", "")
+            rendered = repo_setup._render_repos(args, repo_setup._get_base_path(args))
+        with open(cache_path, "w") as cache_file:
+            json.dump(rendered, cache_file)
+        return rendered
+
+
+class ActionModule(ActionBase):
+    """Render the repo files on the controller and send them to the hosts.
+
+    The repo files are downloaded and rendered once per unique set of
+    options and distro in the run, and the forks share them through a cache
+    in the local tmp dir of the run, which is removed when the run ends.
+    Each host only receives the rendered files and writes the ones that
+    changed.
+    """
+
+    TRANSFERS_FILES = False
+
+    def run(self, tmp=None, task_vars=None):
+        result = super(ActionModule, self).run(tmp, task_vars)
+        del tmp  # tmp no longer has any effect
+        task_vars = task_vars or {}
+
+        args = _normalize_args(self._task.args)
+        distro = args.get("distro") or _get_distro_from_facts(task_vars)
+        if (
+            args["resolve_on"] == "controller"
+            and distro
+            and distro not in TARGET_DISTROS
+        ):
+            render_args = dict((k, args[k]) for k in RENDER_ARGS if k in args)
+            render_args["distro"] = distro
+            cache_dir = os.path.join(C.DEFAULT_LOCAL_TMP, "repo_setup")
+            if not os.path.isdir(cache_dir):
+                try:
+                    os.makedirs(cache_dir)
+                except OSError:
+                    # created by another fork at the same time
+                    if not os.path.isdir(cache_dir):
+                        raise
+            try:
+                rendered = _render_cached(render_args, cache_dir)
+            except Exception as exc:
+                result.update(failed=True, msg="Failed to render repos: %s" % exc)
+                return result
+            args.update(distro=distro, rendered_files=rendered)
+
+        # without the distro, or for UBI, the repo files are rendered on the host
+        result.update(
+            self._execute_module(
+                module_name=self._task.action, module_args=args, task_vars=task_vars
+            )
+        )
+        return result
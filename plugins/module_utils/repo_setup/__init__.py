@@ -0,0 +1,6 @@
+from __future__ import absolute_import, division, print_function
+
+from .main import InvalidArguments, SetupReposResult, setup_repos  # noqa: F401
+
+
+__metaclass__ = type
@@ -83,3 +83,14 @@ DEFAULT_CONFIG = {
     ],
     "os_versions": ["centos7", "centos8", "centos9", "rhel8", "rhel9"],
 }
+
+"""
+These are the parameters of a hash query and their default values, as used by
+the get_hash module and the CLI entrypoint.
+"""
+HASH_QUERY_DEFAULTS = {
+    "os_version": "centos8",
+    "release": "master",
+    "component": None,
+    "tag": "current-podified",
+}
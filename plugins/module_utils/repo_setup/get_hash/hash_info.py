@@ -15,9 +15,12 @@
 #
 from __future__ import absolute_import, division, print_function
 
+import fcntl
+import hashlib
+import json
 import logging
 import os
-from .constants import CONFIG_PATH, CONFIG_KEYS, DEFAULT_CONFIG
+from .constants import CONFIG_PATH, CONFIG_KEYS, DEFAULT_CONFIG, HASH_QUERY_DEFAULTS
 from .exceptions import HashInvalidConfig, HashInvalidDLRNResponse
 
 try:
@@ -216,7 +219,85 @@ class HashInfo:
         logging.debug("delorean commit.yaml results %s", parsed_yaml["commits"][0])
         return full, commit, distro, extended
 
+    def as_dict(self):
+        """Returns the query and the resolved hashes of this object as a dict"""
+        return {
+            "os_version": self.os_version,
+            "release": self.release,
+            "component": self.component,
+            "tag": self.tag,
+            "full_hash": self.full_hash,
+            "commit_hash": self.commit_hash,
+            "distro_hash": self.distro_hash,
+            "extended_hash": self.extended_hash,
+            "dlrn_url": self.dlrn_url,
+        }
+
     def __repr__(self):
         """Returns a string representation of the object"""
         attrs = vars(self)
         return ",\n".join("%s: %s" % item for item in attrs.items())
+
+
+def _query_id(query, dlrn_url):
+    """Returns a string identifying a hash query on a delorean server"""
+    return json.dumps([dlrn_url] + [query[k] for k in sorted(query)])
+
+
+def _resolve_cached(query, config, cache_dir):
+    """Resolve a single query, sharing the result through cache_dir.
+
+    The first process resolving a query holds a lock on its cache file,
+    so other processes resolving the same query at the same time wait
+    for its result instead of querying the delorean server again.
+    """
+    query_id = _query_id(query, config["dlrn_url"])
+    cache_path = os.path.join(
+        cache_dir, hashlib.sha1(query_id.encode("utf-8")).hexdigest() + ".json"
+    )
+    with open(cache_path + ".lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            with open(cache_path) as cache_file:
+                return json.load(cache_file)
+        except (IOError, OSError, ValueError):
+            pass
+        # failed queries raise before this point, so they are never cached
+        result = HashInfo(config=config, **query).as_dict()
+        with open(cache_path, "w") as cache_file:
+            json.dump(result, cache_file)
+        return result
+
+
+def resolve_hash_queries(queries, config=None, cache_dir=None):
+    """Resolve a list of hash queries, each unique query only once.
+
+    Each query is a dict with any of the keys in HASH_QUERY_DEFAULTS and
+    optionally a dlrn_url that overrides the one in config. When cache_dir is
+    passed, results are shared there with other processes, like the forks of
+    an ansible-playbook run.
+
+    :param queries: list of query dicts
+    :param config: dict with configuration overrides, see load_config
+    :param cache_dir: directory shared by the processes resolving queries
+    :returns list of dicts with the query and hashes, see HashInfo.as_dict
+    """
+    config = HashInfo.load_config(config)
+    if cache_dir and not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    resolved = {}
+    results = []
+    for query in queries:
+        query_config = dict(config, dlrn_url=query.get("dlrn_url") or config["dlrn_url"])
+        query = dict(
+            (k, default if query.get(k) is None else query[k])
+            for k, default in HASH_QUERY_DEFAULTS.items()
+        )
+        query_id = _query_id(query, query_config["dlrn_url"])
+        if query_id not in resolved:
+            if cache_dir:
+                resolved[query_id] = _resolve_cached(query, query_config, cache_dir)
+            else:
+                resolved[query_id] = HashInfo(config=query_config, **query).as_dict()
+        results.append(dict(resolved[query_id]))
+    return results
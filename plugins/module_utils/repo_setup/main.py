@@ -16,17 +16,28 @@
 
 from __future__ import absolute_import, division, print_function
 import argparse
+import collections
+import logging
 import os
 import platform
 import re
 import subprocess
-import sys
+import time
+
+try:
+    from repo_setup.utils import REPO_FILES_CACHE_DIR
+except ImportError:
+    from ansible_collections.repo_setup.repos.plugins.module_utils.repo_setup.utils import (
+        REPO_FILES_CACHE_DIR,
+    )
 
 
 __metaclass__ = type
 TITLE_RE = re.compile("\\[(.*)\\]")
 NAME_RE = re.compile("name=(.+)")
 PRIORITY_RE = re.compile("priority=\\d+")
+BASEURL_RE = re.compile("baseurl=(.+)")
+METADATA_EXPIRE_RE = re.compile("metadata_expire=.*\n?")
 # Packages to be included from delorean-current when using current-podified
 INCLUDE_PKGS = (
     "includepkgs=instack,instack-undercloud,"
@@ -38,6 +49,7 @@ INCLUDE_PKGS = (
 )
 DEFAULT_OUTPUT_PATH = "/etc/yum.repos.d"
 DEFAULT_RDO_MIRROR = "https://trunk.rdoproject.org"
+DEFAULT_CACHE_DIR = REPO_FILES_CACHE_DIR
 
 # RHEL is only provided to licensed cloud providers via RHUI
 DEFAULT_MIRROR_MAP = {
@@ -126,6 +138,13 @@ SUPPORTED_DISTROS = [
 DISTRO_CHOICES = ["".join(distro_pair) for distro_pair in SUPPORTED_DISTROS]
 
 
+# Result of setup_repos: the repo files installed, the ones actually written
+# and removed, whether anything changed and the time spent in each step.
+SetupReposResult = collections.namedtuple(
+    "SetupReposResult", ["repo_files", "written", "removed", "changed", "timings"]
+)
+
+
 class InvalidArguments(Exception):
     pass
 
@@ -165,18 +184,17 @@ def _get_distro():
         distro_id = "ubi"
 
     if (distro_id, distro_major_version_id) not in SUPPORTED_DISTROS:
-        print(
-            "WARNING: Unsupported platform '{0}{1}' detected by repo-setup,"
+        logging.warning(
+            "Unsupported platform '{0}{1}' detected by repo-setup,"
             " centos9 will be used unless you use CLI param to change it."
-            "".format(distro_id, distro_major_version_id),
-            file=sys.stderr,
+            "".format(distro_id, distro_major_version_id)
         )
         distro_id = "centos"
         distro_major_version_id = "9"
 
     if distro_id == "ubi":
-        print(
-            "WARNING: Centos{0} Base and AppStream will be installed for "
+        logging.warning(
+            "Centos{0} Base and AppStream will be installed for "
             "this UBI distro".format(distro_major_version_id)
         )
 
@@ -247,6 +265,28 @@ def _parse_args(distro_id, distro_major_version_id):
         default=DEFAULT_RDO_MIRROR,
         help="Server from which to install RDO packages.",
     )
+    parser.add_argument(
+        "--cache-dir",
+        default=DEFAULT_CACHE_DIR,
+        help="Directory where the downloaded DLRN repo files are cached, and "
+        "reused while the .md5 published next to them matches. Set to an "
+        "empty string to always download them.",
+    )
+    parser.add_argument(
+        "--pin",
+        action="store_true",
+        default=False,
+        help="Resolve the named tags of the DLRN repos, like current-podified, "
+        "to their hash and point the repos at the immutable hashed path, so "
+        "their metadata never has to expire.",
+    )
+    parser.add_argument(
+        "--prewarm",
+        action="store_true",
+        default=False,
+        help="Download the metadata of all installed repos in parallel into "
+        "the dnf cache, after installing them.",
+    )
     stream_group = parser.add_mutually_exclusive_group()
     stream_group.add_argument(
         "--stream",
@@ -266,10 +306,7 @@ def _parse_args(distro_id, distro_major_version_id):
         args.stream = False
 
     # Default mirror for args.distro (which defaults to 'distro')
-    default_mirror = DEFAULT_MIRROR_MAP.get(args.distro, None)
-    if default_mirror is None and "fedora" in args.distro:
-        # We don't have different mirrors for specific fedora releases
-        default_mirror = DEFAULT_MIRROR_MAP.get("fedora", None)
+    default_mirror = _get_default_mirror(args.distro)
 
     if args.mirror is None:
         args.mirror = default_mirror
@@ -278,19 +315,73 @@ def _parse_args(distro_id, distro_major_version_id):
     return args
 
 
+def _get_default_mirror(distro):
+    default_mirror = DEFAULT_MIRROR_MAP.get(distro, None)
+    if default_mirror is None and "fedora" in distro:
+        # We don't have different mirrors for specific fedora releases
+        default_mirror = DEFAULT_MIRROR_MAP.get("fedora", None)
+    return default_mirror
+
+
+def _make_args(
+    repos,
+    distro,
+    branch="master",
+    output_path=DEFAULT_OUTPUT_PATH,
+    mirror=None,
+    rdo_mirror=DEFAULT_RDO_MIRROR,
+    stream=True,
+    prewarm=False,
+    pin=False,
+    cache_dir=DEFAULT_CACHE_DIR,
+):
+    """Create the same args as _parse_args, for callers not using the CLI"""
+    default_mirror = _get_default_mirror(distro)
+    return argparse.Namespace(
+        repos=list(repos),
+        distro=distro,
+        branch=branch,
+        output_path=output_path,
+        mirror=mirror or default_mirror,
+        old_mirror=default_mirror,
+        rdo_mirror=rdo_mirror,
+        prewarm=prewarm,
+        pin=pin,
+        cache_dir=cache_dir,
+        stream=stream,
+        no_stream=not stream,
+    )
+
+
 def _get_repo(path, args):
     # lazy import
-    if "requests" not in globals():
-        import requests
+    try:
+        from repo_setup.utils import get_repo_file
+    except ImportError:
+        from ansible_collections.repo_setup.repos.plugins.module_utils.repo_setup.utils import (
+            get_repo_file,
+        )
+
+    def download():
+        # lazy import
+        if "requests" not in globals():
+            import requests
 
-    r = requests.get(path)
-    if r.status_code == 200:
-        return _inject_mirrors(r.text, args)
+        r = requests.get(path)
+        if r.status_code == 200:
+            return r.text
+        else:
+            r.raise_for_status()
+
+    if args.cache_dir:
+        content = get_repo_file(path, download, cache_dir=args.cache_dir)
     else:
-        r.raise_for_status()
+        content = download()
+    if content is not None:
+        return _inject_mirrors(content, args)
 
 
-def _write_repo(content, target, name=None):
+def _get_repo_filename(content, target, name=None):
     if not name:
         m = TITLE_RE.search(content)
         if not m:
@@ -301,10 +392,16 @@ def _write_repo(content, target, name=None):
         if "component" in name:
             name = "delorean"
     filename = name + ".repo"
-    filename = os.path.join(target, filename)
+    return os.path.join(target, filename)
+
+
+def _write_repo(content, target, name=None):
+    filename = _get_repo_filename(content, target, name)
+    name = os.path.basename(filename)[: -len(".repo")]
     with open(filename, "w") as f:
         f.write(content)
-    print("Installed repo %s to %s" % (name, filename))
+    logging.info("Installed repo %s to %s", name, filename)
+    return filename
 
 
 def _validate_distro_repos(args):
@@ -414,8 +511,8 @@ def _validate_args(args, distro_name, distro_major_version_id):
     _validate_distro_stream(args, distro_name, distro_major_version_id)
 
 
-def _remove_existing(args):
-    """Remove any delorean* or opstools repos that already exist"""
+def _get_existing_repos_pattern(args):
+    """Get the pattern matching the repo files installed by repo-setup"""
     if args.distro in ["ubi8", "ubi9"]:
         regex = (
             "^(BaseOS|AppStream|delorean|repo-setup-centos-"
@@ -426,21 +523,7 @@ def _remove_existing(args):
             "^(delorean|repo-setup-centos-"
             "(opstools|ceph|highavailability|powertools)).*.repo"
         )
-    pattern = re.compile(regex)
-    if os.path.exists("/etc/distro.repos.d"):
-        paths = set(os.listdir(args.output_path) + os.listdir("/etc/distro.repos.d"))
-    else:
-        paths = os.listdir(args.output_path)
-    for f in paths:
-        if pattern.match(f):
-            filename = os.path.join(args.output_path, f)
-            if os.path.exists(filename):
-                os.remove(filename)
-                print('Removed old repo "%s"' % filename)
-            filename = os.path.join("/etc/distro.repos.d", f)
-            if os.path.exists(filename):
-                os.remove(filename)
-                print('Removed old repo "%s"' % filename)
+    return re.compile(regex)
 
 
 def _get_base_path(args):
@@ -464,8 +547,8 @@ def _install_priorities():
     try:
         subprocess.check_call(["yum", "install", "-y", "yum-plugin-priorities"])
     except subprocess.CalledProcessError as e:
-        print(
-            "ERROR: Failed to install yum-plugin-priorities\n%s\n%s" % (e.cmd, e.output)
+        logging.error(
+            "Failed to install yum-plugin-priorities\n%s\n%s", e.cmd, e.output
         )
         raise
 
@@ -533,6 +616,44 @@ def _inject_mirrors(content, args):
     return content
 
 
+def _get_pinned_path(args, tag):
+    """Resolve a named tag to the hashed path it points to, like xx/yy/<hash>"""
+    # lazy import
+    try:
+        from repo_setup.get_hash.hash_info import HashInfo
+    except ImportError:
+        from ansible_collections.repo_setup.repos.plugins.module_utils.repo_setup.get_hash.hash_info import (
+            HashInfo,
+        )
+
+    distro = args.distro.replace("ubi", "centos")
+    hash_info = HashInfo(
+        distro, args.branch, None, tag, config={"dlrn_url": args.rdo_mirror}
+    )
+    full_hash = hash_info.full_hash
+    logging.info("Pinned %s to %s", tag, full_hash)
+    return "%s/%s/%s" % (full_hash[:2], full_hash[2:4], full_hash)
+
+
+def _pin_repo(content, base_path, tag, pinned_path):
+    """Replace the tag in the baseurls of a repo by its hashed path
+
+    The content behind a hashed path never changes, so the metadata of the
+    pinned repos is set to never expire.
+    """
+    distro_branch = base_path.rstrip("/").rsplit("/", 1)[-1]
+    tag_re = re.compile(re.escape("/%s/%s" % (distro_branch, tag)) + "(?=/|$)")
+    pinned = "/%s/%s" % (distro_branch, pinned_path)
+    content = BASEURL_RE.sub(lambda m: tag_re.sub(pinned, m.group(0)), content)
+    content = METADATA_EXPIRE_RE.sub("", content)
+    new_content = []
+    for line in content.split("\n"):
+        new_content.append(line)
+        if line.startswith("["):
+            new_content.append("metadata_expire=never")
+    return "\n".join(new_content)
+
+
 def _get_rhel_trunk_candidate_repos(args, base_path):
     content = _get_repo(base_path + "osptrunk-deps.repo", args)
     # Replace deps with candidate
@@ -546,49 +667,64 @@ def _get_rhel_trunk_candidate_repos(args, base_path):
     return content
 
 
-def _install_repos(args, base_path):
+def _install_repos(args, base_path, write_repo=None):
+    """Install all requested repos
+
+    write_repo is called with the content, target dir and optional name of
+    each repo file, and defaults to _write_repo.
+
+    returns: list of repo files that were written
+    """
+    write_repo = write_repo or _write_repo
+    repo_files = []
+
+    def get_tag_repo(tag):
+        if not args.pin:
+            return _get_repo(base_path + tag + "/delorean.repo", args)
+        pinned_path = _get_pinned_path(args, tag)
+        content = _get_repo(base_path + pinned_path + "/delorean.repo", args)
+        return _pin_repo(content, base_path, tag, pinned_path)
+
     def install_deps(args, base_path):
         if 'rhel' in args.distro:
             content = _get_rhel_trunk_candidate_repos(args, base_path)
-            _write_repo(content, args.output_path, name="osp-trunk-candidate")
+            repo_files.append(write_repo(content, args.output_path, name="osp-trunk-candidate"))
         else:
             content = _get_repo(base_path + "delorean-deps.repo", args)
-            _write_repo(content, args.output_path)
+            repo_files.append(write_repo(content, args.output_path))
 
     for repo in args.repos:
         if repo == "current":
-            content = _get_repo(base_path + "current/delorean.repo", args)
-            _write_repo(content, args.output_path, name="delorean")
+            content = get_tag_repo("current")
+            repo_files.append(write_repo(content, args.output_path, name="delorean"))
             install_deps(args, base_path)
         elif repo == "deps":
             install_deps(args, base_path)
         elif repo == "current-podified":
-            content = _get_repo(base_path + "current-podified/delorean.repo", args)
-            _write_repo(content, args.output_path)
+            content = get_tag_repo("current-podified")
+            repo_files.append(write_repo(content, args.output_path))
             install_deps(args, base_path)
         elif repo == "current-podified-dev":
             content = _get_repo(base_path + "delorean-deps.repo", args)
-            _write_repo(content, args.output_path)
-            content = _get_repo(base_path + "current-podified/delorean.repo", args)
+            repo_files.append(write_repo(content, args.output_path))
+            content = get_tag_repo("current-podified")
             content = TITLE_RE.sub("[\\1-current-podified]", content)
             content = NAME_RE.sub("name=\\1-current-podified", content)
             # We need to twiddle priorities since we're mixing multiple repos
             # that are generated with the same priority.
             content = _change_priority(content, 20)
-            _write_repo(content, args.output_path, name="delorean-current-podified")
-            content = _get_repo(base_path + "current/delorean.repo", args)
+            repo_files.append(write_repo(content, args.output_path, name="delorean-current-podified"))
+            content = get_tag_repo("current")
             content = _add_includepkgs(content)
             content = _change_priority(content, 10)
-            _write_repo(content, args.output_path, name="delorean")
+            repo_files.append(write_repo(content, args.output_path, name="delorean"))
         elif repo == "podified-ci-testing":
-            content = _get_repo(base_path + "podified-ci-testing/delorean.repo", args)
-            _write_repo(content, args.output_path)
+            content = get_tag_repo("podified-ci-testing")
+            repo_files.append(write_repo(content, args.output_path))
             install_deps(args, base_path)
         elif repo == "current-podified-rdo":
-            content = _get_repo(
-                base_path + "current-podified-rdo/delorean.repo", args
-            )
-            _write_repo(content, args.output_path)
+            content = get_tag_repo("current-podified-rdo")
+            repo_files.append(write_repo(content, args.output_path))
             install_deps(args, base_path)
         elif repo == "ceph":
             if args.branch in ["liberty", "mitaka"]:
@@ -601,10 +737,10 @@ def _install_repos(args, base_path):
                 content = _create_ceph(args, "nautilus")
             else:
                 content = _create_ceph(args, "pacific")
-            _write_repo(content, args.output_path)
+            repo_files.append(write_repo(content, args.output_path))
         elif repo == "opstools":
             content = OPSTOOLS_REPO_TEMPLATE % {"mirror": args.mirror}
-            _write_repo(content, args.output_path)
+            repo_files.append(write_repo(content, args.output_path))
         else:
             raise InvalidArguments('Invalid repo "%s" specified' % repo)
 
@@ -613,8 +749,8 @@ def _install_repos(args, base_path):
     legacy_url = "centos/"
     if distro in ["ubi8", "ubi9"]:
         if not os.path.exists("/etc/distro.repos.d"):
-            print(
-                "WARNING: For UBI it is recommended to create "
+            logging.warning(
+                "For UBI it is recommended to create "
                 "/etc/distro.repos.d and rerun!"
             )
             dp_exists = False
@@ -638,13 +774,13 @@ def _install_repos(args, base_path):
             "legacy_url": legacy_url,
             "stream": distro_name,
         }
-        _write_repo(content, distro_path)
+        repo_files.append(write_repo(content, distro_path))
         content = BASE_REPO_TEMPLATE % {
             "mirror": args.mirror,
             "legacy_url": legacy_url,
             "stream": distro_name,
         }
-        _write_repo(content, distro_path)
+        repo_files.append(write_repo(content, distro_path))
         if distro in ["centos8", "centos9", "ubi8", "ubi9"]:
             distro = "centos" + str(distro[-1])
 
@@ -665,7 +801,7 @@ def _install_repos(args, base_path):
                 "stream": stream,
                 "legacy_url": legacy_url,
             }
-            _write_repo(content, args.output_path)
+            repo_files.append(write_repo(content, args.output_path))
 
             content = POWERTOOLS_REPO_TEMPLATE % {
                 "mirror": args.mirror,
@@ -673,7 +809,7 @@ def _install_repos(args, base_path):
                 "legacy_url": legacy_url,
                 "pt_name": pt_name,
             }
-            _write_repo(content, args.output_path)
+            repo_files.append(write_repo(content, args.output_path))
 
             if "9" in stream:
                 content = APPSTREAM_REPO_TEMPLATE % {
@@ -682,35 +818,243 @@ def _install_repos(args, base_path):
                     "legacy_url": legacy_url,
                     "stream": stream,
                 }
-                _write_repo(content, args.output_path)
+                repo_files.append(write_repo(content, args.output_path))
 
                 content = BASE_REPO_TEMPLATE % {
                     "mirror": args.mirror,
                     "legacy_url": legacy_url,
                     "stream": stream,
                 }
-                _write_repo(content, args.output_path)
+                repo_files.append(write_repo(content, args.output_path))
+
+    return repo_files
+
+
+def _render_repos(args, base_path):
+    """Render all requested repos without writing them
+
+    returns: dict with the content of each repo file, by path
+    """
+    rendered = {}
+
+    def render_repo(content, target, name=None):
+        filename = _get_repo_filename(content, target, name)
+        rendered[filename] = content
+        return filename
+
+    _install_repos(args, base_path, write_repo=render_repo)
+    return rendered
+
+
+def _sync_repo_files(args, rendered):
+    """Write the rendered repo files that changed
+
+    Files with the same content are left untouched, and old repo files that
+    were not rendered are removed.
+
+    returns: lists of written and removed repo files
+    """
+    pattern = _get_existing_repos_pattern(args)
+    target_dirs = set(os.path.dirname(f) for f in rendered)
+    target_dirs.add(args.output_path)
+    if os.path.exists("/etc/distro.repos.d"):
+        target_dirs.add("/etc/distro.repos.d")
+    removed = []
+    for target in sorted(target_dirs):
+        if not os.path.isdir(target):
+            continue
+        for f in sorted(os.listdir(target)):
+            filename = os.path.join(target, f)
+            if pattern.match(f) and filename not in rendered:
+                os.remove(filename)
+                logging.info('Removed old repo "%s"', filename)
+                removed.append(filename)
+
+    written = []
+    for filename, content in sorted(rendered.items()):
+        if os.path.isfile(filename):
+            with open(filename) as f:
+                if f.read() == content:
+                    continue
+        with open(filename, "w") as f:
+            f.write(content)
+        logging.info("Installed repo %s", filename)
+        written.append(filename)
+    return written, removed
 
 
 def _run_pkg_clean(distro):
     pkg_mgr = "yum" if distro == "centos7" else "dnf"
     try:
-        subprocess.check_call([pkg_mgr, "clean", "metadata"])
+        output = subprocess.check_output(
+            [pkg_mgr, "clean", "metadata"], stderr=subprocess.STDOUT
+        )
     except subprocess.CalledProcessError:
-        print("ERROR: Failed to clean yum metadata.")
+        logging.error("Failed to clean yum metadata.")
         raise
+    logging.info(output.decode("utf-8", "replace").strip())
 
 
-def main():
-    distro_id, distro_major_version_id, distro_name = _get_distro()
-    args = _parse_args(distro_id, distro_major_version_id)
+def _get_enabled_repo_ids(repo_files):
+    """Get the ids of all enabled repos in a list of repo files"""
+    try:
+        import configparser
+    except ImportError:
+        import ConfigParser as configparser
+
+    repo_ids = []
+    for filename in repo_files:
+        config = configparser.RawConfigParser()
+        config.read(filename)
+        for section in config.sections():
+            if config.has_option(section, "enabled") and config.get(
+                section, "enabled"
+            ).strip().lower() in ("0", "false", "no"):
+                continue
+            repo_ids.append(section)
+    return repo_ids
+
+
+def _prewarm_repos(args, repo_files):
+    """Download metadata of the installed repos in parallel"""
+    if args.distro == "centos7":
+        logging.warning("Metadata pre-warm is only supported with dnf.")
+        return []
+    # lazy import
+    try:
+        from repo_setup.utils import prewarm_dnf_cache
+    except ImportError:
+        from ansible_collections.repo_setup.repos.plugins.module_utils.repo_setup.utils import (
+            prewarm_dnf_cache,
+        )
+
+    repo_ids = _get_enabled_repo_ids(repo_files)
+    reposdir = ",".join(sorted(set(os.path.dirname(f) for f in repo_files)))
+    failed = prewarm_dnf_cache(repo_ids, reposdir=reposdir)
+    if failed:
+        logging.warning("Failed to pre-warm metadata for: %s", ", ".join(failed))
+    return failed
+
+
+def _setup_repos(
+    args, distro_name, distro_major_version_id, rendered_files=None, always_clean=False
+):
+    """Install the repos of args, see setup_repos"""
+    timings = {}
+    start = time.time()
     _validate_args(args, distro_name, distro_major_version_id)
-    base_path = _get_base_path(args)
     if (distro_name.lower(), distro_major_version_id) == ("centos", "7"):
         _install_priorities()
-    _remove_existing(args)
-    _install_repos(args, base_path)
-    _run_pkg_clean(args.distro)
+    if rendered_files is None:
+        rendered_files = _render_repos(args, _get_base_path(args))
+    timings["render"] = time.time() - start
+
+    step = time.time()
+    written, removed = _sync_repo_files(args, rendered_files)
+    timings["write"] = time.time() - step
+    changed = bool(written or removed)
+    cleaned = always_clean or (changed and args.output_path == DEFAULT_OUTPUT_PATH)
+    if cleaned:
+        step = time.time()
+        _run_pkg_clean(args.distro)
+        timings["clean"] = time.time() - step
+    repo_files = sorted(rendered_files)
+    # the metadata of unchanged repos is still cached unless it was cleaned
+    prewarm_files = repo_files if cleaned else written
+    if args.prewarm and prewarm_files:
+        step = time.time()
+        _prewarm_repos(args, prewarm_files)
+        timings["prewarm"] = time.time() - step
+    timings["total"] = time.time() - start
+    return SetupReposResult(
+        repo_files=repo_files,
+        written=written,
+        removed=removed,
+        changed=changed,
+        timings=timings,
+    )
+
+
+def setup_repos(
+    repos,
+    distro=None,
+    branch="master",
+    output_path=DEFAULT_OUTPUT_PATH,
+    mirror=None,
+    rdo_mirror=DEFAULT_RDO_MIRROR,
+    stream=True,
+    prewarm=False,
+    rendered_files=None,
+    pin=False,
+    cache_dir=DEFAULT_CACHE_DIR,
+    always_clean=False,
+):
+    """Download and install the repos necessary for OpenStack
+
+    This is what the repo-setup CLI does, for callers running it in-process.
+    Repo files with the same content are not written again, and unless
+    always_clean is set, the package manager metadata is only cleaned when
+    something changed in /etc/yum.repos.d. The CLI always cleans it.
+
+    :param repos: list of repos, see repo-setup --help
+    :param distro: target distro, like centos9. Detected on this host if None
+    :param branch: target branch, the lowercase name of the OpenStack release
+    :param output_path: directory in which to save the selected repos
+    :param mirror: server from which to install base OS packages
+    :param rdo_mirror: server from which to install RDO packages
+    :param stream: enable stream support for CentOS repos
+    :param prewarm: download the metadata of the repos that changed, or of
+        all installed repos when the metadata was cleaned
+    :param pin: point the DLRN repos at the hashed path of their tag
+    :param cache_dir: directory where DLRN repo files are cached, or None to
+        always download them
+    :param always_clean: clean the package manager metadata even if no repo
+        file changed, as the content behind an unchanged baseurl may have
+        moved, like deps/latest/
+    :param rendered_files: dict with the content of the repo files by path,
+        as returned by _render_repos, to install them without downloading
+    :raises InvalidArguments for invalid combinations of repos and distro
+    :return: a SetupReposResult
+    """
+    distro_name, distro_major_version_id = "", ""
+    if distro is None or output_path == DEFAULT_OUTPUT_PATH:
+        distro_id, distro_major_version_id, distro_name = _get_distro()
+        if distro is None:
+            distro = distro_id + distro_major_version_id
+    args = _make_args(
+        repos,
+        distro,
+        branch=branch,
+        output_path=output_path,
+        mirror=mirror,
+        rdo_mirror=rdo_mirror,
+        stream=stream,
+        prewarm=prewarm,
+        pin=pin,
+        cache_dir=cache_dir,
+    )
+    return _setup_repos(
+        args,
+        distro_name,
+        distro_major_version_id,
+        rendered_files=rendered_files,
+        always_clean=always_clean,
+    )
+
+
+def main():
+    try:
+        from repo_setup.utils import load_logging
+    except ImportError:
+        from ansible_collections.repo_setup.repos.plugins.module_utils.repo_setup.utils import (
+            load_logging,
+        )
+
+    load_logging(module_name="repo-setup")
+    distro_id, distro_major_version_id, distro_name = _get_distro()
+    args = _parse_args(distro_id, distro_major_version_id)
+    # the result isn't returned, the console script exits with main()'s value
+    _setup_repos(args, distro_name, distro_major_version_id, always_clean=True)
 
 
 if __name__ == "__main__":
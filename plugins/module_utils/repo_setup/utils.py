@@ -14,13 +14,29 @@
 #
 from __future__ import absolute_import, division, print_function
 
+import hashlib
 import logging
+import os
+import re
+import shutil
+import subprocess
 import sys
+import tempfile
+from multiprocessing.pool import ThreadPool
 
 __metaclass__ = type
 
+# Default dnf cache directory used by the root user
+DNF_CACHE_DIR = "/var/cache/dnf"
+# Maximum number of repos that have their metadata fetched at the same time
+PREWARM_MAX_WORKERS = 8
+# Repo files downloaded from DLRN, reused while their .md5 sidecar matches
+REPO_FILES_CACHE_DIR = "/var/cache/repo-setup/repo-files"
+
 # portable http_get that uses either ansible recommended way or python native
 # urllib. Also deals with python2 vs python3 for centos7 train jobs.
+# http_open uses the same backend, but returns the response and raises errors,
+# for callers that need a timeout, the raw content or to stream it.
 py_version = sys.version_info.major
 if py_version < 3:
     import urllib2
@@ -32,6 +48,10 @@ if py_version < 3:
         except Exception as e:
             return (str(e), -1)
 
+    def http_open(url, timeout=None):
+        kwargs = {"timeout": timeout} if timeout else {}
+        return urllib2.urlopen(url, **kwargs)
+
 else:
     try:
         from ansible.module_utils.urls import open_url
@@ -43,6 +63,10 @@ else:
             except Exception as e:
                 return (str(e), -1)
 
+        def http_open(url, timeout=None):
+            kwargs = {"timeout": timeout} if timeout else {}
+            return open_url(url, method="GET", **kwargs)
+
     except ImportError:
         from urllib.request import urlopen
 
@@ -53,6 +77,80 @@ else:
             except Exception as e:
                 return (str(e), -1)
 
+        def http_open(url, timeout=None):
+            kwargs = {"timeout": timeout} if timeout else {}
+            return urlopen(url, **kwargs)
+
+
+def _get_repo_cache_file(url, cache_dir):
+    """Returns the file caching a repo file URL, or None if it can't be used."""
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+    except OSError as e:
+        logging.debug("Repo files cache is disabled: %s", e)
+        return None
+    if not os.access(cache_dir, os.W_OK):
+        logging.debug("Repo files cache is disabled: can't write to %s", cache_dir)
+        return None
+    return os.path.join(
+        cache_dir, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".repo"
+    )
+
+
+def get_repo_md5(url):
+    """Returns the md5 DLRN publishes next to a repo file, or None."""
+    content, status = http_get(url + ".md5")
+    if status != 200 or not re.match("^[0-9a-f]{32}$", content.strip()):
+        return None
+    return content.strip()
+
+
+def get_repo_file(url, download, cache_dir=REPO_FILES_CACHE_DIR):
+    """Returns the content of a repo file, downloading it only if it changed.
+
+    DLRN publishes the md5 of each delorean.repo in a delorean.repo.md5
+    sidecar. When the sidecar matches the copy of the repo file cached by
+    a previous run, that copy is returned and 'download' is not called.
+    Other URLs, or DLRN repo files without a sidecar, are always downloaded
+    without looking for one.
+
+    :param url: URL of the repo file.
+    :param download: callable, without arguments, returning the content of
+        the repo file.
+    :param cache_dir: directory where the repo files are cached.
+    :return: the content of the repo file, as returned by 'download'.
+    """
+    if url.rstrip("/").rsplit("/", 1)[-1] != "delorean.repo":
+        return download()
+    cache_file = _get_repo_cache_file(url, cache_dir)
+    md5 = get_repo_md5(url) if cache_file else None
+    if md5:
+        try:
+            with open(cache_file, "rb") as f:
+                content = f.read()
+        except (IOError, OSError):
+            content = None
+        if content is not None and hashlib.md5(content).hexdigest() == md5:
+            logging.debug("%s is unchanged, using %s", url, cache_file)
+            return content.decode("utf-8")
+
+    content = download()
+    # only content matching the sidecar is cached, so a cached copy always
+    # matches the repo file the sidecar was published for
+    if md5 and content is not None:
+        data = content.encode("utf-8")
+        if hashlib.md5(data).hexdigest() == md5:
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir)
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.rename(tmp_path, cache_file)
+            except (IOError, OSError) as e:
+                logging.debug("Failed to cache %s: %s", url, e)
+                os.remove(tmp_path)
+    return content
+
 
 def load_logging(level=logging.INFO, module_name="repo-setup"):
     """Load and set logging level. Default is set to logging.INFO level."""
@@ -72,3 +170,86 @@ def load_logging(level=logging.INFO, module_name="repo-setup"):
             handler.setFormatter(formatter)
             logger.addHandler(handler)
     logger.setLevel(level)
+
+
+def _makecache_repo(repo_id, reposdir, tmp_cachedir):
+    """Run 'dnf makecache' for a single repo in a private cache dir."""
+    cmd = [
+        "dnf",
+        "makecache",
+        "--quiet",
+        "--repo",
+        repo_id,
+        "--setopt=cachedir=%s" % tmp_cachedir,
+    ]
+    if reposdir:
+        cmd.append("--setopt=reposdir=%s" % reposdir)
+    proc = subprocess.Popen(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True
+    )
+    output = proc.communicate()[0]
+    return repo_id, proc.returncode, output
+
+
+def prewarm_dnf_cache(repo_ids, reposdir=None, cachedir=None, workers=None):
+    """Download the metadata of a list of repos in parallel.
+
+    dnf holds a lock on its cache directory while downloading metadata, so
+    concurrent 'makecache' calls on the same cache would run one after the
+    other. Instead, each repo is fetched into its own temporary cache dir and
+    the resulting repo cache entries are moved into the dnf cache afterwards,
+    keeping dnf's own cache layout.
+
+    :param repo_ids: list of repo ids to be pre-warmed.
+    :param reposdir: directory, or comma-separated list of directories, with
+        the repo configuration files.
+    :param cachedir: dnf cache directory. Defaults to DNF_CACHE_DIR.
+    :param workers: maximum number of repos fetched at the same time.
+    :return: list of repo ids that failed to be pre-warmed.
+    """
+    repo_ids = sorted(set(repo_ids))
+    if not repo_ids:
+        return []
+    cachedir = cachedir or DNF_CACHE_DIR
+    workers = min(workers or PREWARM_MAX_WORKERS, len(repo_ids))
+
+    tmp_root = tempfile.mkdtemp(prefix="repo-setup-prewarm-")
+    pool = ThreadPool(workers)
+    try:
+        results = pool.map(
+            lambda repo_id: _makecache_repo(
+                repo_id, reposdir, os.path.join(tmp_root, repo_id)
+            ),
+            repo_ids,
+        )
+        failed = []
+        for repo_id, returncode, output in results:
+            if returncode != 0:
+                logging.warning(
+                    "Failed to pre-warm metadata for repo '%s': %s", repo_id, output
+                )
+                failed.append(repo_id)
+                continue
+            _merge_repo_cache(repo_id, os.path.join(tmp_root, repo_id), cachedir)
+            logging.info("Metadata for repo '%s' was pre-warmed.", repo_id)
+        return failed
+    finally:
+        pool.close()
+        pool.join()
+        shutil.rmtree(tmp_root, ignore_errors=True)
+
+
+def _merge_repo_cache(repo_id, src_cachedir, dst_cachedir):
+    """Move the cache entries of a single repo into another cache dir."""
+    if not os.path.isdir(dst_cachedir):
+        os.makedirs(dst_cachedir)
+    for entry in os.listdir(src_cachedir):
+        # Only repo entries are moved, i.e. '<repo_id>-<hash>/' and solv files.
+        if not (entry.startswith(repo_id + "-") or entry.startswith(repo_id + ".")):
+            continue
+        dst = os.path.join(dst_cachedir, entry)
+        if os.path.isdir(dst):
+            shutil.rmtree(dst)
+        elif os.path.exists(dst):
+            os.remove(dst)
+        shutil.move(os.path.join(src_cachedir, entry), dst)
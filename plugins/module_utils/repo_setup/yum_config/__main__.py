@@ -13,11 +13,13 @@
 #   under the License.
 
 import argparse
+import difflib
+import json
 import logging
 import os
 import sys
 
-from repo_setup.utils import load_logging
+from repo_setup.utils import load_logging, prewarm_dnf_cache
 import repo_setup.yum_config.constants as const
 import repo_setup.yum_config.yum_config as cfg
 import repo_setup.yum_config.utils as utils
@@ -37,6 +39,50 @@ def options_to_dict(options):
     return opt_dict
 
 
+def read_packages_file(file_path):
+    """Reads a list of package names, one per line."""
+    packages = []
+    with open(file_path) as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                packages.append(line)
+    return packages
+
+
+def log_changes(config_obj):
+    """Logs all changes made, or that would be made, by a config object."""
+    if not config_obj.changed:
+        logging.info("No configuration changes were needed.")
+        return
+    action = "Would change" if config_obj.dry_run else "Changed"
+    for diff in config_obj.get_diff():
+        diff_lines = difflib.unified_diff(
+            diff["before"].splitlines(),
+            diff["after"].splitlines(),
+            fromfile=diff["before_header"],
+            tofile=diff["after_header"],
+            lineterm="",
+        )
+        logging.info(
+            "%s '%s':\n%s", action, diff["after_header"], "\n".join(diff_lines)
+        )
+
+
+def prewarm_repos(config_obj):
+    """Pre-warms the dnf metadata cache of all changed and enabled repos."""
+    if config_obj.dry_run:
+        return
+    repo_ids = config_obj.get_changed_repos()
+    if not repo_ids:
+        logging.info("No changed repos to be pre-warmed.")
+        return
+    failed = prewarm_dnf_cache(repo_ids, reposdir=config_obj.dir_path)
+    if failed:
+        # Not fatal, dnf will fetch the metadata by itself later
+        logging.warning("Unable to pre-warm repos: %s", ", ".join(failed))
+
+
 def main():
     load_logging(module_name="repo-setup-yum-config")
     # Get release model and version
@@ -91,6 +137,57 @@ def main():
         ),
     )
 
+    dry_run_parse = argparse.ArgumentParser(add_help=False)
+    dry_run_parse.add_argument(
+        "--dry-run",
+        action="store_true",
+        dest="dry_run",
+        default=False,
+        help="show the changes that would be made, without writing any "
+        "configuration file",
+    )
+
+    prewarm_parse = argparse.ArgumentParser(add_help=False)
+    prewarm_parse.add_argument(
+        "--prewarm",
+        action="store_true",
+        default=False,
+        help="after changing repos, download the metadata of all changed "
+        "repos in parallel into the dnf cache",
+    )
+
+    mirrors_parse = argparse.ArgumentParser(add_help=False)
+    mirrors_parse.add_argument(
+        "--resolve-mirrors",
+        action="store_true",
+        dest="resolve_mirrors",
+        default=False,
+        help="replace the repo mirrorlist or metalink by a baseurl list with "
+        "the fastest mirrors",
+    )
+    mirrors_parse.add_argument(
+        "--mirrors-ttl",
+        dest="mirrors_ttl",
+        type=int,
+        default=const.YUM_REPO_MIRRORS_TTL,
+        help="time in seconds before resolved mirrors are measured again",
+    )
+    mirrors_parse.add_argument(
+        "--max-mirrors",
+        dest="max_mirrors",
+        type=int,
+        default=const.YUM_REPO_MIRRORS_MAX,
+        help="maximum number of mirrors written to the repo baseurl",
+    )
+    mirrors_parse.add_argument(
+        "--verify-mirrors",
+        action="store_true",
+        dest="verify_mirrors",
+        default=False,
+        help="discard mirrors whose repomd.xml doesn't match the metalink "
+        "checksum",
+    )
+
     # Generic key-value options
     options_parse = argparse.ArgumentParser(add_help=False)
     options_parse.add_argument(
@@ -105,12 +202,59 @@ def main():
     dnf_module_parser = argparse.ArgumentParser(add_help=False)
     dnf_module_parser.add_argument(
         "operation",
-        choices=["enable", "disable", "install", "remove", "reset"],
-        help="dnf module operation to be executed",
+        choices=["enable", "disable", "install", "remove", "reset", "list", "prefetch"],
+        help="dnf module operation to be executed. 'list' shows the "
+        "available streams and profiles without starting dnf. 'prefetch' "
+        "downloads the packages of a module profile into the dnf cache, "
+        "without installing them.",
+    )
+    dnf_module_parser.add_argument(
+        "name",
+        nargs="*",
+        help="name of the modules to be modified, optionally as "
+        "'name:stream/profile' specs. All modules are changed in a single "
+        "transaction. Optional for 'list'.",
+    )
+    dnf_module_parser.add_argument(
+        "--stream", help="sets module stream, when not set in the module spec"
+    )
+    dnf_module_parser.add_argument(
+        "--profile", help="sets module profile, when not set in the module spec"
+    )
+    dnf_module_parser.add_argument(
+        "--cacheonly",
+        action="store_true",
+        default=False,
+        help="use repo metadata from the dnf cache while it isn't expired, "
+        "without checking the repos for newer metadata. Metadata is "
+        "downloaded if it isn't cached yet or expired. For 'list', repos "
+        "that aren't cached are ignored.",
+    )
+    dnf_module_parser.add_argument(
+        "--background",
+        action="store_true",
+        default=False,
+        help="run 'prefetch' in a detached background process.",
+    )
+    dnf_module_parser.add_argument(
+        "--status-file",
+        dest="status_file",
+        help="JSON file with the status of a background 'prefetch'. "
+        "Defaults to {0}.".format(const.DNF_PREFETCH_STATUS_FILE),
+    )
+    dnf_module_parser.add_argument(
+        "--config-dir-path",
+        dest="config_dir_path",
+        help="set the absolute directory path that holds all repo "
+        "configuration files, used by 'list'.",
+    )
+    dnf_module_parser.add_argument(
+        "--output-format",
+        dest="output_format",
+        choices=["table", "json"],
+        default="table",
+        help="output format of 'list'.",
     )
-    dnf_module_parser.add_argument("name", help="name of the module to be modified")
-    dnf_module_parser.add_argument("--stream", help="sets module stream")
-    dnf_module_parser.add_argument("--profile", help="sets module profile")
 
     # Compose repo arguments
     compose_args_parser = argparse.ArgumentParser(add_help=False)
@@ -126,9 +270,17 @@ def main():
     )
     compose_args_parser.add_argument(
         "--arch",
+        nargs="+",
         choices=const.COMPOSE_REPOS_SUPPORTED_ARCHS,
-        default="x86_64",
-        help="set the architecture for the destination repos.",
+        default=["x86_64"],
+        help="set one or more architectures for the destination repos.",
+    )
+    compose_args_parser.add_argument(
+        "--output-dir-template",
+        dest="output_dir_template",
+        help="directory where the repos of each architecture are written, "
+        "with '{arch}' replaced by the architecture name. Required when "
+        "more than one architecture is provided.",
     )
     compose_args_parser.add_argument(
         "--disable-repos",
@@ -143,12 +295,38 @@ def main():
         help="after enabling compose repos, disable all other repos that "
         "match variant names.",
     )
-    compose_args_parser.add_argument(
+    compose_variants_group = compose_args_parser.add_mutually_exclusive_group()
+    compose_variants_group.add_argument(
         "--variants",
         nargs="+",
         help="Name of the repos to be enabled. Default behavior is to enable "
         "all that match a specific release and architecture.",
     )
+    compose_variants_group.add_argument(
+        "--for-packages",
+        dest="for_packages",
+        nargs="+",
+        help="enable only the variants that provide this list of packages.",
+    )
+    compose_variants_group.add_argument(
+        "--packages-file",
+        dest="packages_file",
+        help="file with one package name per line. Enable only the variants "
+        "that provide these packages.",
+    )
+    compose_args_parser.add_argument(
+        "--incremental",
+        action="store_true",
+        default=False,
+        help="keep current repos of variants whose repodata didn't change "
+        "in the new compose, and report the variants that changed.",
+    )
+    compose_args_parser.add_argument(
+        "--compose-cache-dir",
+        dest="compose_cache_dir",
+        default=const.COMPOSE_REPOS_CACHE_DIR,
+        help="directory where downloaded compose info is cached.",
+    )
     compose_args_parser.add_argument(
         "--config-dir-path",
         dest="config_dir_path",
@@ -157,6 +335,44 @@ def main():
         "configuration files",
     )
 
+    # Repo audit arguments
+    audit_args_parser = argparse.ArgumentParser(add_help=False)
+    audit_args_parser.add_argument(
+        "--config-dir-path",
+        dest="config_dir_path",
+        default=const.YUM_REPO_DIR,
+        help="set the absolute directory path that holds all repo "
+        "configuration files",
+    )
+    audit_args_parser.add_argument(
+        "--timeout",
+        type=float,
+        default=const.YUM_REPO_AUDIT_TIMEOUT,
+        help="deadline in seconds for all repos to be probed.",
+    )
+    audit_args_parser.add_argument(
+        "--max-age",
+        dest="max_age",
+        type=int,
+        help="report repos with metadata older than this number of seconds "
+        "as stale.",
+    )
+    audit_args_parser.add_argument(
+        "--disable-failed",
+        action="store_true",
+        dest="disable_failed",
+        default=False,
+        help="disable all repos that are unreachable, have invalid metadata "
+        "or are stale.",
+    )
+    audit_args_parser.add_argument(
+        "--output-format",
+        dest="output_format",
+        choices=["table", "json"],
+        default="table",
+        help="format of the audit report.",
+    )
+
     # Common file path argument
     common_parse = argparse.ArgumentParser(add_help=False)
     common_parse.add_argument(
@@ -179,22 +395,41 @@ def main():
     # Subcommands
     subparsers.add_parser(
         "repo",
-        parents=[common_parse, environment_parse, repo_args_parser, options_parse],
+        parents=[
+            common_parse,
+            environment_parse,
+            repo_args_parser,
+            options_parse,
+            dry_run_parse,
+            prewarm_parse,
+            mirrors_parse,
+        ],
         help="updates a yum repository options",
     )
     subparsers.add_parser(
         "global",
-        parents=[common_parse, environment_parse, options_parse],
+        parents=[common_parse, environment_parse, options_parse, dry_run_parse],
         help="updates global yum configuration options",
     )
 
     if py_version >= 3:
         subparsers.add_parser(
             "enable-compose-repos",
-            parents=[compose_args_parser, environment_parse],
+            parents=[
+                compose_args_parser,
+                environment_parse,
+                dry_run_parse,
+                prewarm_parse,
+            ],
             help="enable CentOS compose repos based on an compose url.",
         )
 
+        subparsers.add_parser(
+            "audit",
+            parents=[audit_args_parser, dry_run_parse],
+            help="check reachability and freshness of all enabled repos.",
+        )
+
         for min_distro_ver in const.DNF_MODULE_MINIMAL_DISTRO_VERSIONS:
             if distro == min_distro_ver.get("distro") and int(
                 major_version
@@ -218,8 +453,18 @@ def main():
     if args.command == "repo":
         set_dict = options_to_dict(args.set_opts)
         config_obj = cfg.YumRepoConfig(
-            dir_path=args.config_dir_path, environment_file=args.env_file
+            dir_path=args.config_dir_path,
+            environment_file=args.env_file,
+            dry_run=args.dry_run,
         )
+        mirrors = None
+        if args.resolve_mirrors:
+            # resolved before the repos are written, so they're written once
+            mirrors = dict(
+                ttl=args.mirrors_ttl,
+                verify=args.verify_mirrors,
+                max_mirrors=args.max_mirrors,
+            )
         if args.name is not None:
             config_obj.add_or_update_section(
                 args.name,
@@ -227,6 +472,7 @@ def main():
                 file_path=args.config_file_path,
                 enabled=args.enable,
                 from_url=args.down_url,
+                mirrors=mirrors,
             )
         else:
             # When no section (name) is provided, we consider all sections from
@@ -242,22 +488,65 @@ def main():
                 file_path=args.config_file_path,
                 set_dict=set_dict,
                 enabled=args.enable,
+                mirrors=mirrors,
             )
+        log_changes(config_obj)
+        if args.prewarm:
+            prewarm_repos(config_obj)
+
+    elif args.command == "module" and args.operation == "list":
+        import repo_setup.yum_config.module_query as module_query
+
+        query = module_query.DnfModuleQuery(
+            dir_path=args.config_dir_path, cacheonly=args.cacheonly
+        )
+        modules = query.list_modules(names=args.name)
+        if args.output_format == "json":
+            print(json.dumps(modules, indent=2))
+        else:
+            print(module_query.format_modules_table(modules))
 
     elif args.command == "module":
         import repo_setup.yum_config.dnf_manager as dnf_mgr
 
-        dnf_mod_mgr = dnf_mgr.DnfModuleManager()
-        dnf_method = getattr(dnf_mod_mgr, args.operation + "_module")
-        dnf_method(args.name, stream=args.stream, profile=args.profile)
+        if not args.name:
+            main_parser.error(
+                "the following arguments are required for '{0}': name".format(
+                    args.operation
+                )
+            )
+        modules = []
+        for module_spec in args.name:
+            name, stream, profile = dnf_mgr.parse_module_spec(module_spec)
+            modules.append((name, stream or args.stream, profile or args.profile))
+        if args.operation == "prefetch" and args.background:
+            dnf_mgr.prefetch_in_background(
+                modules, status_file=args.status_file, cacheonly=args.cacheonly
+            )
+        elif args.operation == "prefetch":
+            dnf_mod_mgr = dnf_mgr.DnfModuleManager(cacheonly=args.cacheonly)
+            result = dnf_mod_mgr.prefetch_modules(modules)
+            logging.info(
+                "Prefetched %d packages (%d bytes).",
+                result["packages"],
+                result["download_size"],
+            )
+        else:
+            dnf_mod_mgr = dnf_mgr.DnfModuleManager(cacheonly=args.cacheonly)
+            dnf_mod_mgr.run_operations(
+                [(args.operation,) + module for module in modules]
+            )
 
     elif args.command == "global":
         set_dict = options_to_dict(args.set_opts)
         config_obj = cfg.YumGlobalConfig(
-            file_path=args.config_file_path, environment_file=args.env_file
+            file_path=args.config_file_path,
+            environment_file=args.env_file,
+            dry_run=args.dry_run,
         )
 
         config_obj.update_section("main", set_dict)
+        log_changes(config_obj)
 
     elif args.command == "enable-compose-repos":
         import repo_setup.yum_config.compose_repos as compose_repos
@@ -268,11 +557,33 @@ def main():
             dir_path=args.config_dir_path,
             arch=args.arch,
             environment_file=args.env_file,
+            dry_run=args.dry_run,
+            cache_dir=args.compose_cache_dir,
+            output_dir_template=args.output_dir_template,
         )
 
+        variants = args.variants
+        packages = args.for_packages
+        if args.packages_file:
+            packages = read_packages_file(args.packages_file)
+        if packages:
+            variants = repo_obj.get_variants_for_packages(packages)
+
         repo_obj.enable_compose_repos(
-            variants=args.variants, override_repos=args.disable_conflicting
+            variants=variants,
+            override_repos=args.disable_conflicting,
+            incremental=args.incremental,
         )
+        if args.incremental:
+            if repo_obj.changed_variants:
+                for arch in sorted(repo_obj.changed_variants):
+                    logging.info(
+                        "Changed variants (%s): %s",
+                        arch,
+                        ", ".join(repo_obj.changed_variants[arch]),
+                    )
+            else:
+                logging.info("No variant has changed repodata.")
         if args.disable_repos:
             for file in args.disable_repos:
                 valid_path = None
@@ -285,6 +596,24 @@ def main():
 
                 if valid_path is not None:
                     repo_obj.update_all_sections(valid_path, enabled=False)
+        log_changes(repo_obj)
+        if args.prewarm:
+            prewarm_repos(repo_obj)
+
+    elif args.command == "audit":
+        import repo_setup.yum_config.repo_audit as repo_audit
+
+        audit_obj = repo_audit.YumRepoAudit(
+            dir_path=args.config_dir_path, dry_run=args.dry_run
+        )
+        results = audit_obj.audit(timeout=args.timeout, max_age=args.max_age)
+        if args.output_format == "json":
+            print(json.dumps(results, indent=2))
+        else:
+            print(repo_audit.format_audit_table(results))
+        if args.disable_failed:
+            audit_obj.disable_failed_repos(results)
+            log_changes(audit_obj)
 
 
 def cli_entrypoint():
@@ -14,37 +14,170 @@
 #
 from __future__ import absolute_import, division, print_function
 
+import codecs
+import hashlib
 import logging
 import json
 import os
 import re
+import time
+from multiprocessing.pool import ThreadPool
 
 from .constants import (
+    COMPOSE_REPOS_BASE_VARIANTS,
+    COMPOSE_REPOS_RPMS_PATH,
     YUM_REPO_DIR,
     YUM_REPO_FILE_EXTENSION,
     YUM_REPO_SUPPORTED_OPTIONS,
+    COMPOSE_REPOS_CACHE_DIR,
+    COMPOSE_REPOS_ID_PATTERN,
+    COMPOSE_REPOS_LABEL_TTL,
     COMPOSE_REPOS_RELEASES,
     COMPOSE_REPOS_INFO_PATH,
     COMPOSE_REPOS_URL_PATTERN,
     COMPOSE_REPOS_URL_REPLACE_STR,
+    YUM_REPO_AUDIT_MAX_WORKERS,
+    YUM_REPO_AUDIT_TIMEOUT,
 )
 from .exceptions import (
     YumConfigInvalidSection,
     YumConfigComposeError,
 )
-from .yum_config import YumConfig
+from .utils import (
+    fetch_repomd,
+    file_lock,
+    parse_repomd_checksums,
+    write_file_atomic,
+)
+from .yum_config import YumConfig, get_section_options
 
 __metaclass__ = type
 
+# A string cut at the end of a chunk is matched as 'partial'
+JSON_TOKEN_REGEX = re.compile(
+    r'"(?:[^"\\]|\\.)*"|[{}\[\],]|(?P<partial>"(?:[^"\\]|\\.)*\\?\Z)'
+)
+
+
+def iter_compose_rpms(chunks):
+    """Yields all binary rpms listed in a compose rpms.json, chunk by chunk.
+
+    The manifest has tens of megabytes, often in a single line, so it's
+    scanned as a stream of tokens instead of being loaded in memory. Only
+    a string cut at the end of a chunk is carried over to the next one.
+
+    :param chunks: iterable with the rpms.json content, split anywhere.
+    :return: a generator of (variant, arch, rpm_nevra) tuples.
+    """
+    # Each item is [container, current_key, expecting_key]
+    stack = []
+    partial = ""
+    for chunk in chunks:
+        text = partial + chunk if partial else chunk
+        partial = ""
+        for match in JSON_TOKEN_REGEX.finditer(text):
+            if match.group("partial") is not None:
+                partial = match.group(0)
+                break
+            token = match.group(0)
+            if token == "{":
+                # rpms are in payload/rpms/<variant>/<arch>/<srpm>/<rpm>
+                path = [item[1] for item in stack]
+                if len(path) == 6 and path[:2] == ["payload", "rpms"]:
+                    if not path[5].endswith(".src"):
+                        yield path[2], path[3], path[5]
+                stack.append(["{", None, True])
+            elif token == "[":
+                stack.append(["[", None, False])
+            elif token in ("}", "]"):
+                stack.pop()
+            elif token == ",":
+                if stack and stack[-1][0] == "{":
+                    stack[-1][2] = True
+            elif stack and stack[-1][2]:
+                key = token[1:-1]
+                stack[-1][1] = json.loads(token) if "\\" in key else key
+                stack[-1][2] = False
+
+
+def get_repodata_checksums(base_url):
+    """Returns the repodata checksums of a repo, or None if unavailable."""
+    try:
+        content, __ = fetch_repomd(base_url, YUM_REPO_AUDIT_TIMEOUT)
+        return parse_repomd_checksums(content) or None
+    except Exception as e:
+        logging.debug("Unable to get repodata from '%s': %s", base_url, e)
+        return None
+
+
+def select_variants(index, packages, required=None):
+    """Selects the minimal set of variants that provide a list of packages.
+
+    :param index: dict with package names and the variants providing them.
+    :param packages: list of package names.
+    :param required: list of variants that are always selected.
+    :return: a tuple with the list of selected variants and the list of
+        packages not found in any variant.
+    """
+    selected = list(required or [])
+    missing = []
+    pending = []
+    for package in packages:
+        variants = index.get(package)
+        if not variants:
+            missing.append(package)
+        elif not any(var in selected for var in variants):
+            pending.append(variants)
+
+    # Greedy set cover: the variant that provides most packages comes first
+    while pending:
+        counts = {}
+        for variants in pending:
+            for var in variants:
+                counts[var] = counts.get(var, 0) + 1
+        best = sorted(counts, key=lambda var: (-counts[var], var))[0]
+        selected.append(best)
+        pending = [variants for variants in pending if best not in variants]
+    return selected, missing
+
 
 class YumComposeRepoConfig(YumConfig):
     """Manages yum repo configuration files for CentOS Compose."""
 
     def __init__(
-        self, compose_url, release, dir_path=None, arch=None, environment_file=None
+        self,
+        compose_url,
+        release,
+        dir_path=None,
+        arch=None,
+        environment_file=None,
+        dry_run=False,
+        cache_dir=None,
+        output_dir_template=None,
     ):
+        """
+        :param arch: An architecture, or a list of architectures, to have
+            repos configured.
+        :param output_dir_template: Directory where repo files of each
+            architecture are written, with '{arch}' replaced by the arch
+            name. Required when more than one arch is provided.
+        """
         conf_dir_path = dir_path or YUM_REPO_DIR
-        self.arch = arch or "x86_64"
+        arches = arch or "x86_64"
+        self.arches = [arches] if isinstance(arches, str) else list(arches)
+        self.arch = self.arches[0]
+        self.cache_dir = cache_dir or COMPOSE_REPOS_CACHE_DIR
+        self.output_dir_template = output_dir_template
+        # Variants per arch enabled or updated by 'enable_compose_repos'
+        self.changed_variants = {}
+
+        # 0. Multiple arches can't share the same repo files
+        if len(self.arches) > 1 and "{arch}" not in (output_dir_template or ""):
+            msg = (
+                "An output dir template with '{arch}' is required to "
+                "configure repos for multiple architectures."
+            )
+            raise YumConfigComposeError(error_msg=msg)
 
         # 1. validate release name
         if release not in COMPOSE_REPOS_RELEASES:
@@ -54,9 +187,12 @@ class YumComposeRepoConfig(YumConfig):
 
         # 2. Validate URL
         pattern = re.compile(COMPOSE_REPOS_URL_PATTERN[self.release])
-        if not pattern.match(compose_url):
+        url_match = pattern.match(compose_url)
+        if not url_match:
             msg = "The provided URL does not match the expect pattern."
             raise YumConfigComposeError(error_msg=msg)
+        # compose-id or label, like 'latest-CentOS-Stream'
+        self.compose_ref = url_match.group(2)
 
         # 3. Get compose info from url
         segments = [compose_url, COMPOSE_REPOS_INFO_PATH[self.release]]
@@ -77,20 +213,37 @@ class YumComposeRepoConfig(YumConfig):
             dir_path=conf_dir_path,
             file_extension=YUM_REPO_FILE_EXTENSION,
             environment_file=environment_file,
+            dry_run=dry_run,
         )
 
-    def _get_compose_info(self):
-        """Retrieve compose info for a provided compose-id url."""
+    def _download_compose_info(self, headers=None):
+        """Downloads compose info from the compose url.
+
+        :param headers: Optional request headers, used for conditional
+            requests.
+        :return: a tuple with the downloaded content and the response
+            headers, or (None, None) if the server answers 'Not Modified'.
+        """
         # NOTE(dviroel): works for both centos 8 and 9
+        import urllib.error
         import urllib.request
 
         try:
             logging.debug("Retrieving compose info from url: %s", self.compose_info_url)
-            res = urllib.request.urlopen(self.compose_info_url)
+            req = urllib.request.Request(self.compose_info_url, headers=headers or {})
+            res = urllib.request.urlopen(req)
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return None, None
+            msg = "Failed to retrieve compose info from url: %s" % self.compose_info_url
+            raise YumConfigComposeError(error_msg=msg)
         except Exception:
             msg = "Failed to retrieve compose info from url: %s" % self.compose_info_url
             raise YumConfigComposeError(error_msg=msg)
-        compose_info = json.loads(res.read())
+        return res.read(), res.headers
+
+    def _parse_compose_info(self, content):
+        compose_info = json.loads(content)
         if compose_info["header"]["version"] != "1.2":
             # NOTE(dviroel): Log a warning just in case we receive a different
             #  version here. Code may fail depending on the change.
@@ -100,34 +253,282 @@ class YumComposeRepoConfig(YumConfig):
             )
         return compose_info["payload"]
 
+    def _get_cache_dir(self):
+        """Returns the compose info cache dir, or None if it can't be used."""
+        try:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+        except OSError as e:
+            logging.warning("Compose info cache is disabled: %s", e)
+            return None
+        if not os.access(self.cache_dir, os.W_OK):
+            logging.warning(
+                "Compose info cache is disabled: no write permission on %s.",
+                self.cache_dir,
+            )
+            return None
+        return self.cache_dir
+
+    def _get_compose_info(self):
+        """Retrieve compose info for a provided compose-id url.
+
+        Compose info of a compose-id never changes, so it is cached on disk
+        forever. Labels, like 'latest-*', point to a compose-id for a short
+        time and are revalidated with a conditional request after
+        COMPOSE_REPOS_LABEL_TTL seconds. Concurrent jobs on the same host
+        wait for each other and share a single download.
+        """
+        cache_dir = self._get_cache_dir()
+        if cache_dir is None:
+            content, __ = self._download_compose_info()
+            return self._parse_compose_info(content)
+        if re.match(COMPOSE_REPOS_ID_PATTERN, self.compose_ref):
+            return self._get_cached_compose_id_info(cache_dir)
+        return self._get_cached_compose_label_info(cache_dir)
+
+    def _get_cached_compose_id_info(self, cache_dir):
+        info_file = os.path.join(cache_dir, self.compose_ref + ".json")
+        with file_lock(info_file + ".lock"):
+            if os.path.isfile(info_file):
+                logging.debug("Using cached compose info: %s", info_file)
+                with open(info_file, "rb") as f:
+                    return self._parse_compose_info(f.read())
+            content, __ = self._download_compose_info()
+            compose_info = self._parse_compose_info(content)
+            write_file_atomic(info_file, content)
+        return compose_info
+
+    def _get_cached_compose_label_info(self, cache_dir):
+        url_hash = hashlib.sha256(self.compose_info_url.encode("utf-8"))
+        label_file = os.path.join(
+            cache_dir, "label-%s.json" % url_hash.hexdigest()[:16]
+        )
+        with file_lock(label_file + ".lock"):
+            label = {}
+            if os.path.isfile(label_file):
+                try:
+                    with open(label_file) as f:
+                        label = json.load(f)
+                except ValueError:
+                    logging.warning("Ignoring invalid cache file %s.", label_file)
+
+            info_file = None
+            if label.get("compose_id"):
+                info_file = os.path.join(cache_dir, label["compose_id"] + ".json")
+                if not os.path.isfile(info_file):
+                    info_file = None
+
+            headers = {}
+            if info_file is not None:
+                if time.time() - label.get("checked_at", 0) < COMPOSE_REPOS_LABEL_TTL:
+                    logging.debug("Using cached compose info: %s", info_file)
+                    with open(info_file, "rb") as f:
+                        return self._parse_compose_info(f.read())
+                if label.get("etag"):
+                    headers["If-None-Match"] = label["etag"]
+                if label.get("last_modified"):
+                    headers["If-Modified-Since"] = label["last_modified"]
+
+            content, res_headers = self._download_compose_info(headers=headers)
+            if content is None:
+                logging.debug("Compose info not modified: %s", info_file)
+                with open(info_file, "rb") as f:
+                    content = f.read()
+            else:
+                compose_id = self._parse_compose_info(content)["compose"]["id"]
+                info_file = os.path.join(cache_dir, compose_id + ".json")
+                write_file_atomic(info_file, content)
+                label = {
+                    "url": self.compose_info_url,
+                    "compose_id": compose_id,
+                    "etag": res_headers.get("ETag"),
+                    "last_modified": res_headers.get("Last-Modified"),
+                }
+            label["checked_at"] = time.time()
+            write_file_atomic(label_file, json.dumps(label))
+        return self._parse_compose_info(content)
+
+    def _stream_compose_file(self, path):
+        """Yields the content of a compose file, in chunks as downloaded."""
+        import urllib.request
+
+        url = "/".join([self.compose_url.rstrip("/"), path])
+        try:
+            logging.debug("Retrieving compose file from url: %s", url)
+            res = urllib.request.urlopen(url)
+        except Exception:
+            msg = "Failed to retrieve compose file from url: %s" % url
+            raise YumConfigComposeError(error_msg=msg)
+
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        while True:
+            chunk = res.read(1024 * 1024)
+            text = decoder.decode(chunk, final=not chunk)
+            if text:
+                yield text
+            if not chunk:
+                break
+
+    def _build_packages_index(self):
+        index = {}
+        chunks = self._stream_compose_file(COMPOSE_REPOS_RPMS_PATH[self.release])
+        for variant, arch, nevra in iter_compose_rpms(chunks):
+            # nevra format is 'name-epoch:version-release.arch'
+            name = nevra.rsplit("-", 2)[0]
+            variants = index.setdefault(arch, {}).setdefault(name, [])
+            if variant not in variants:
+                variants.append(variant)
+        return index
+
+    def _get_packages_index(self):
+        """Returns the package index of the compose.
+
+        The index is built from the compose rpms.json and has the format
+        {arch: {package_name: [variants]}}. Like compose info, it never
+        changes for a compose-id and is cached on disk.
+        """
+        cache_dir = self._get_cache_dir()
+        if cache_dir is None:
+            return self._build_packages_index()
+
+        index_file = os.path.join(cache_dir, self.compose_id + "-rpms-index.json")
+        with file_lock(index_file + ".lock"):
+            if os.path.isfile(index_file):
+                logging.debug("Using cached package index: %s", index_file)
+                with open(index_file) as f:
+                    return json.load(f)
+            index = self._build_packages_index()
+            write_file_atomic(index_file, json.dumps(index))
+        return index
+
+    def get_variants_for_packages(self, packages):
+        """Gets the variants needed to install a list of packages.
+
+        Only the variants that provide the packages are returned, plus the
+        base variants that every other variant depends on. Package
+        dependencies are not resolved.
+
+        :param packages: List of package names.
+        :return: List of variant names.
+        """
+        index = {}
+        packages_index = self._get_packages_index()
+        for arch in self.arches:
+            for name, variants in packages_index.get(arch, {}).items():
+                index.setdefault(name, set()).update(variants)
+
+        required = [
+            var for var in COMPOSE_REPOS_BASE_VARIANTS
+            if var in self.compose_info["variants"]
+        ]
+        selected, missing = select_variants(index, packages, required=required)
+        if missing:
+            msg = "Packages not found in compose {0}: {1}.".format(
+                self.compose_id, ", ".join(missing)
+            )
+            raise YumConfigComposeError(error_msg=msg)
+        logging.info(
+            "Variants needed by the provided packages: %s.", ", ".join(selected)
+        )
+        return selected
+
     def _get_repo_name(self, variant):
         return " ".join([self.compose_id, variant])
 
     def _get_repo_filename(self, variant):
         return "-".join([self.compose_id, variant]) + ".repo"
 
-    def _get_repo_base_url(self, variant):
+    def _get_repo_base_url(self, variant, arch=None):
         """Build the base_url based on variant name and system architecture."""
+        arch = arch or self.arch
         variant_info = self.compose_info["variants"][variant]
-        if not variant_info["paths"].get("repository", {}).get(self.arch):
+        if not variant_info["paths"].get("repository", {}).get(arch):
             # Variant has no support yet
             return None
-        segments = [self.compose_url, variant_info["paths"]["repository"][self.arch]]
+        segments = [self.compose_url, variant_info["paths"]["repository"][arch]]
         return "/".join(s.strip("/") for s in segments)
 
+    def _get_arch_dir_path(self, arch):
+        """Returns the directory where repo files of an arch are written."""
+        if self.output_dir_template:
+            return self.output_dir_template.format(arch=arch)
+        return self.dir_path
+
     def get_compose_variants(self):
         return self.compose_info["variants"].keys()
 
-    def enable_compose_repos(self, variants=None, override_repos=False):
+    def _get_unchanged_variants(self, variants):
+        """Finds variants whose repodata didn't change since the current repo.
+
+        For each variant already configured and enabled in the repo
+        directory, the repodata checksums of the current repo and of the
+        new compose are fetched in parallel and compared.
+
+        :param variants: A list of variant names.
+        :return: A dict in the format {(arch, variant): current_file_path}.
+        """
+        candidates = []
+        for arch in self.arches:
+            sections = dict(
+                (var.lower(), var)
+                for var in variants
+                if self._get_repo_base_url(var, arch=arch)
+            )
+            sections_files = self._get_sections_config_files(
+                sections, dir_path=self._get_arch_dir_path(arch)
+            )
+            for section in sorted(sections_files):
+                var = sections[section]
+                new_url = self._get_repo_base_url(var, arch=arch)
+                for file in sections_files[section]:
+                    config, file = self._read_config_file(file)
+                    options = get_section_options(config, section)
+                    enabled = options.get("enabled", "1").lower()
+                    if enabled not in ("0", "false", "no") and (
+                        options.get("baseurl") not in (None, new_url)
+                    ):
+                        candidates.append(
+                            (arch, var, file, options["baseurl"], new_url)
+                        )
+                        break
+
+        urls = sorted(set(c[3] for c in candidates) | set(c[4] for c in candidates))
+        if not urls:
+            return {}
+        pool = ThreadPool(min(YUM_REPO_AUDIT_MAX_WORKERS, len(urls)))
+        try:
+            checksums = dict(zip(urls, pool.map(get_repodata_checksums, urls)))
+        finally:
+            pool.close()
+
+        unchanged = {}
+        for arch, var, file, old_url, new_url in candidates:
+            if checksums[old_url] and checksums[old_url] == checksums[new_url]:
+                unchanged[(arch, var)] = file
+        return unchanged
+
+    def enable_compose_repos(
+        self, variants=None, override_repos=False, incremental=False
+    ):
         """Enable CentOS compose repos of a given variant list.
 
         This function will build from scratch all repos for a given compose-id
         url. If a list of variants is not provided, it will enable all for all
-        variants returned from compose info.
+        variants returned from compose info. Repos of all configured arches
+        are generated in the same pass, from the same compose info, and
+        written together in a single write transaction: no repo file is
+        written if any arch fails.
+
+        In incremental mode, variants already configured with identical
+        repodata keep pointing to their current repos. The variants that
+        really changed are kept in 'changed_variants'.
 
         :param variants: A list of variant names to be enabled.
         :param override_repos: True if all matching variants in the same
             repo directory should be disable in favor of the new repos.
+        :param incremental: True to keep current repos of variants with
+            identical repodata.
+        :return: True if any repo file was (or would be) changed.
         """
         if variants:
             for var in variants:
@@ -138,54 +539,112 @@ class YumComposeRepoConfig(YumConfig):
         else:
             variants = self.compose_info["variants"].keys()
 
+        unchanged = self._get_unchanged_variants(variants) if incremental else {}
+        self.changed_variants = {}
+
+        with self._write_transaction():
+            return self._write_compose_repos(variants, unchanged, override_repos)
+
+    def _write_compose_repos(self, variants, unchanged, override_repos):
+        """Writes the repos of the variants for all configured arches.
+
+        :param variants: A list of variant names to be enabled.
+        :param unchanged: A dict in the format {(arch, variant): file_path}
+            with the variants that keep their current repos.
+        :param override_repos: True if all matching variants in the same
+            repo directory should be disable in favor of the new repos.
+        :return: True if any repo file was (or would be) changed.
+        """
+        changed = False
+        # updated repos per arch directory, needed to override other repos
         updated_repos = {}
-        for var in variants:
-            base_url = self._get_repo_base_url(var)
-            if not base_url:
-                continue
-            add_dict = {
-                "name": self._get_repo_name(var),
-                "baseurl": base_url,
-                "enabled": "1",
-                "gpgcheck": "0",
-            }
-            filename = self._get_repo_filename(var)
-            file_path = os.path.join(self.dir_path, filename)
-            # create a file if doesn't exist and add a section to it
-            try:
-                self.add_section(var.lower(), add_dict, file_path)
-            except YumConfigInvalidSection:
-                logging.debug(
-                    "Section '%s' that already exists in this file. "
-                    "Trying to update it...",
-                    var,
-                )
-                self.update_section(var.lower(), set_dict=add_dict, file_path=file_path)
-            # needed to override other repos
-            updated_repos[var.lower()] = file_path
+        for arch in self.arches:
+            arch_dir_path = self._get_arch_dir_path(arch)
+            if not os.path.isdir(arch_dir_path) and not self.dry_run:
+                os.makedirs(arch_dir_path)
+            for var in variants:
+                base_url = self._get_repo_base_url(var, arch=arch)
+                if not base_url:
+                    continue
+                if (arch, var) in unchanged:
+                    logging.info(
+                        "Variant '%s' (%s) has the same repodata, keeping "
+                        "current repo.",
+                        var,
+                        arch,
+                    )
+                    updated_repos.setdefault(arch_dir_path, {})[
+                        var.lower()
+                    ] = unchanged[(arch, var)]
+                    continue
+                add_dict = {
+                    "name": self._get_repo_name(var),
+                    "baseurl": base_url,
+                    "enabled": "1",
+                    "gpgcheck": "0",
+                }
+                filename = self._get_repo_filename(var)
+                file_path = os.path.join(arch_dir_path, filename)
+                # create a file if doesn't exist and add a section to it
+                try:
+                    var_changed = self.add_section(var.lower(), add_dict, file_path)
+                except YumConfigInvalidSection:
+                    logging.debug(
+                        "Section '%s' that already exists in this file. "
+                        "Trying to update it...",
+                        var,
+                    )
+                    var_changed = self.update_section(
+                        var.lower(), set_dict=add_dict, file_path=file_path
+                    )
+                if var_changed:
+                    self.changed_variants.setdefault(arch, []).append(var)
+                    changed = True
+                updated_repos.setdefault(arch_dir_path, {})[var.lower()] = file_path
 
         if override_repos:
-            for var in updated_repos:
-                config_files = self._get_config_files(var)
-                for file in config_files:
-                    if file != updated_repos[var]:
-                        msg = (
-                            "Disabling matching section '%(section)s' in "
-                            "configuration file: %(file)s."
-                        )
-                        msg_args = {
-                            "section": var,
-                            "file": file,
-                        }
-                        logging.debug(msg, msg_args)
-                        self.update_section(var, enabled=False, file_path=file)
+            for arch_dir_path in sorted(updated_repos):
+                changed |= self._disable_conflicting_repos(
+                    updated_repos[arch_dir_path], dir_path=arch_dir_path
+                )
+        return changed
+
+    def _disable_conflicting_repos(self, updated_repos, dir_path=None):
+        """Disables all other sections that match the updated repos.
+
+        :param updated_repos: A dict with each updated section and the file
+            that holds it.
+        :param dir_path: Directory to look for conflicting repos.
+        :return: True if any repo file was (or would be) changed.
+        """
+        changed = False
+        # Parse all repo files only once, looking for all variants
+        conflicts = {}
+        sections_files = self._get_sections_config_files(
+            updated_repos, dir_path=dir_path
+        )
+        for var, files in sections_files.items():
+            for file in files:
+                if file != updated_repos[var]:
+                    conflicts.setdefault(file, []).append(var)
+        # Single write per conflicting file, disabling all its sections
+        for file in sorted(conflicts):
+            logging.debug(
+                "Disabling matching sections '%s' in configuration file: %s.",
+                ", ".join(sorted(conflicts[file])),
+                file,
+            )
+            changed |= self.update_sections(
+                dict((var, {"enabled": "0"}) for var in conflicts[file]),
+                file,
+            )
+        return changed
 
     def add_section(self, section, add_dict, file_path):
         # Create a new file if it does not exists
-        if not os.path.isfile(file_path):
-            with open(file_path, "w+"):
-                pass
-        super(YumComposeRepoConfig, self).add_section(
+        if not os.path.isfile(file_path) and file_path not in self._pending_configs:
+            self._create_config_file(file_path)
+        return super(YumComposeRepoConfig, self).add_section(
             section, add_dict, file_path
         )
 
@@ -194,15 +653,17 @@ class YumComposeRepoConfig(YumConfig):
         if enabled is not None:
             update_dict["enabled"] = "1" if enabled else "0"
         if update_dict:
-            super(YumComposeRepoConfig, self).update_section(
+            return super(YumComposeRepoConfig, self).update_section(
                 section, update_dict, file_path=file_path
             )
+        return False
 
     def update_all_sections(self, file_path, set_dict=None, enabled=None):
         update_dict = set_dict or {}
         if enabled is not None:
             update_dict["enabled"] = "1" if enabled else "0"
         if update_dict:
-            super(YumComposeRepoConfig, self).update_all_sections(
+            return super(YumComposeRepoConfig, self).update_all_sections(
                 update_dict, file_path
             )
+        return False
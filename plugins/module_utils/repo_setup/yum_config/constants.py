@@ -71,9 +71,53 @@ COMPOSE_REPOS_INFO_PATH = {
     "centos-stream-9": "metadata/composeinfo.json",
 }
 
+COMPOSE_REPOS_RPMS_PATH = {
+    "centos-stream-8": "metadata/rpms.json",
+    "centos-stream-9": "metadata/rpms.json",
+}
+
+# Variants always enabled when selecting variants by package, since packages
+# from all other variants depend on them
+COMPOSE_REPOS_BASE_VARIANTS = ["BaseOS"]
+
+# Compose ids have the format '<release>-<date>[.<type>].<respin>', anything
+# else in a compose url is considered a label, like 'latest-CentOS-Stream'
+COMPOSE_REPOS_ID_PATTERN = r"^.+-\d{8}(\.[a-z])?\.\d+$"
+
+COMPOSE_REPOS_CACHE_DIR = "/var/cache/repo-setup/compose-info"
+
+# Time in seconds that a compose label is trusted without checking the server
+COMPOSE_REPOS_LABEL_TTL = 300
+
+"""
+Repo audit defaults
+"""
+YUM_REPO_METADATA_PATH = "repodata/repomd.xml"
+
+YUM_REPO_AUDIT_TIMEOUT = 10
+
+YUM_REPO_AUDIT_MAX_WORKERS = 16
+
+DNF_VARS_DIR = "/etc/dnf/vars"
+
+"""
+Mirror resolution defaults
+"""
+YUM_REPO_MIRRORS_TTL = 86400
+
+YUM_REPO_MIRRORS_MAX = 5
+
+YUM_REPO_MIRRORS_CACHE_FILE = "/var/cache/repo-setup/mirrors.json"
+
 """
 DNF Manager constants
 """
+DNF_MODULES_DIR = "/etc/dnf/modules.d"
+
+DNF_CACHE_DIR = "/var/cache/dnf"
+
+DNF_PREFETCH_STATUS_FILE = "/var/cache/repo-setup/prefetch-status.json"
+
 DNF_MODULE_MINIMAL_DISTRO_VERSIONS = [
     {"distro": "centos", "min_version": 8},
     {"distro": "rhel", "min_version": 8},
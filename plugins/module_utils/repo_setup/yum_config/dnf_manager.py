@@ -13,24 +13,135 @@
 #  under the License.
 from __future__ import absolute_import, division, print_function
 import logging
+import re
+
+from .exceptions import YumConfigInvalidOption
 
 
 __metaclass__ = type
 
 
+MODULE_STATE_OPERATIONS = ["enable", "disable", "reset"]
+MODULE_PACKAGE_OPERATIONS = ["install", "remove"]
+MODULE_OPERATIONS_DONE = {
+    "enable": "enabled",
+    "disable": "disabled",
+    "reset": "reset",
+    "install": "installed",
+    "remove": "removed",
+}
+
+MODULE_SPEC_REGEX = re.compile(r"^([^:/]+)(?::([^/]+))?(?:/(.+))?$")
+
+
+def parse_module_spec(module_spec):
+    """Parses a 'name[:stream][/profile]' module spec.
+
+    :return: a tuple with module name, stream and profile.
+    """
+    match = MODULE_SPEC_REGEX.match(module_spec)
+    if not match:
+        msg = "Invalid module spec '{0}'.".format(module_spec)
+        raise YumConfigInvalidOption(error_msg=msg)
+    return match.group(1), match.group(2), match.group(3)
+
+
 class DnfModuleManager:
-    """Class that manages dnf modules."""
+    """Class that manages dnf modules.
+
+    Repo metadata is only loaded when the first operation runs, and only
+    what the operation needs: module state operations (enable, disable and
+    reset) don't load the installed packages, and skip the filelists of the
+    repos on dnf versions where they are optional metadata (dnf >= 4.18).
+    Install and remove load the full sack.
+    """
+
+    SACK_MODULES = "modules"
+    SACK_FULL = "full"
 
-    def __init__(self):
+    def __init__(self, cacheonly=False):
+        """
+        :param cacheonly: If True, load repo metadata from the dnf cache
+            without checking the repos for newer metadata, as long as the
+            cached metadata of every repo is fresh. Metadata is downloaded
+            when it's not cached yet or when any repo has expired.
+        """
         # lazy import to allow CLI to start without dnf
         import dnf
 
         self.base = dnf.Base()
         self.base.conf.read()
         self.base.conf.best = True
-        self.base.read_all_repos()
-        self.base.fill_sack()
-        self.module_base = dnf.module.module_base.ModuleBase(self.base)
+        self.cacheonly = cacheonly
+        self._sack = None
+        self._module_base = None
+        # optional metadata types of the dnf config, while filelists are
+        # left out of them
+        self._optional_metadata_types = None
+
+    @property
+    def module_base(self):
+        if self._module_base is None:
+            import dnf
+
+            self._module_base = dnf.module.module_base.ModuleBase(self.base)
+        return self._module_base
+
+    def _load_sack(self, full=True):
+        """Loads the repo metadata needed by an operation.
+
+        :param full: If False, only the metadata needed to change module
+            states is loaded: the system repo is not loaded, and neither are
+            the filelists of the repos if dnf allows skipping them.
+        """
+        if self._sack == self.SACK_FULL or (
+            self._sack == self.SACK_MODULES and not full
+        ):
+            return
+        import dnf
+
+        if self._sack is None:
+            self.base.read_all_repos()
+        conf = self.base.conf
+        if not full and hasattr(conf, "optional_metadata_types"):
+            # dnf only downloads and loads the filelists listed here, older
+            # versions always load them and ignore this
+            self._optional_metadata_types = list(conf.optional_metadata_types)
+            conf.optional_metadata_types = [
+                t for t in self._optional_metadata_types if t != "filelists"
+            ]
+        elif full and self._optional_metadata_types is not None:
+            conf.optional_metadata_types = self._optional_metadata_types
+            self._optional_metadata_types = None
+
+        if self.cacheonly:
+            try:
+                self.base.fill_sack_from_repos_in_cache(load_system_repo=full)
+            except dnf.exceptions.RepoError:
+                logging.info("Repo metadata is not cached yet, downloading it.")
+            else:
+                expired = self._get_expired_repos()
+                if not expired:
+                    self._sack = self.SACK_FULL if full else self.SACK_MODULES
+                    return
+                logging.info(
+                    "Cached metadata of %s is expired, downloading it.",
+                    ", ".join(expired),
+                )
+        self.base.fill_sack(load_system_repo=full)
+        self._sack = self.SACK_FULL if full else self.SACK_MODULES
+
+    def _get_expired_repos(self):
+        """Returns the ids of the enabled repos whose cached metadata expired.
+
+        Expiry follows the 'metadata_expire' option of each repo, like when
+        dnf decides to download metadata again.
+        """
+        return sorted(
+            repo.id
+            for repo in self.base.repos.iter_enabled()
+            if repo._repo.isExpired()
+        )
 
     def _get_module_spec(self, name, stream=None, profile=None):
         """Return a module spec string based on stream and/or profile."""
@@ -49,44 +160,106 @@ class DnfModuleManager:
             logging.error("This command has to be run with superuser " "privileges.")
             raise
 
+    def run_operations(self, operations):
+        """Runs a list of module operations in a single transaction.
+
+        All operations are resolved together, all packages to be installed
+        are downloaded at once, and a single transaction is committed.
+
+        :param operations: A list of (operation, name, stream, profile)
+            tuples, where operation is one of 'enable', 'disable', 'reset',
+            'install' or 'remove'.
+        """
+        supported = MODULE_STATE_OPERATIONS + MODULE_PACKAGE_OPERATIONS
+        for operation in operations:
+            if operation[0] not in supported:
+                msg = "Invalid module operation '{0}'.".format(operation[0])
+                raise YumConfigInvalidOption(error_msg=msg)
+
+        package_ops = [
+            op[0] for op in operations if op[0] in MODULE_PACKAGE_OPERATIONS
+        ]
+        self._load_sack(full=bool(package_ops))
+        for operation, name, stream, profile in operations:
+            getattr(self.module_base, operation)(
+                [self._get_module_spec(name, stream=stream, profile=profile)]
+            )
+        if package_ops:
+            self.base.resolve(allow_erasing="remove" in package_ops)
+            self.base.download_packages(self.base.transaction.install_set)
+        self._do_transaction()
+
+        for operation, name, __, __ in operations:
+            logging.info("Module %s was %s.", name, MODULE_OPERATIONS_DONE[operation])
+
+    def prefetch_modules(self, modules):
+        """Downloads the packages of module profiles into the dnf cache.
+
+        The install set is resolved and downloaded as an install would do,
+        but no transaction is run and module states aren't changed, so a
+        later install finds all packages already cached.
+
+        :param modules: A list of (name, stream, profile) tuples.
+        :return: dict with the number of packages in the install set and
+            their total download size, in bytes.
+        """
+        self._load_sack(full=True)
+        for name, stream, profile in modules:
+            self.module_base.install(
+                [self._get_module_spec(name, stream=stream, profile=profile)]
+            )
+        self.base.resolve()
+        install_set = list(self.base.transaction.install_set)
+        self.base.download_packages(install_set)
+        for name, __, __ in modules:
+            logging.info("Packages of module %s were prefetched.", name)
+        return {
+            "packages": len(install_set),
+            "download_size": sum(pkg.downloadsize or 0 for pkg in install_set),
+        }
+
     def enable_module(self, name, stream=None, profile=None):
         """Enable a module stream."""
-        self.module_base.enable(
-            [self._get_module_spec(name, stream=stream, profile=profile)]
-        )
-        self._do_transaction()
-        logging.info("Module %s was enabled.", name)
+        self.run_operations([("enable", name, stream, profile)])
 
     def disable_module(self, name, stream=None, profile=None):
         """Disable a module stream."""
-        self.module_base.disable(
-            [self._get_module_spec(name, stream=stream, profile=profile)]
-        )
-        self._do_transaction()
-        logging.info("Module %s was disabled.", name)
+        self.run_operations([("disable", name, stream, profile)])
 
     def reset_module(self, name, stream=None, profile=None):
         """Reset a module. It will no longer be enabled or disabled."""
-        self.module_base.reset(
-            [self._get_module_spec(name, stream=stream, profile=profile)]
-        )
-        self._do_transaction()
-        logging.info("Module %s was reset.", name)
+        self.run_operations([("reset", name, stream, profile)])
 
     def install_module(self, name, stream=None, profile=None):
         """Install packages of a module profile."""
-        self.module_base.install(
-            [self._get_module_spec(name, stream=stream, profile=profile)]
-        )
-        self.base.resolve()
-        self.base.download_packages(self.base.transaction.install_set)
-        self._do_transaction()
-        logging.info("Module %s was installed.", name)
+        self.run_operations([("install", name, stream, profile)])
 
     def remove_module(self, name, stream=None, profile=None):
         """Remove packages of a module profile."""
-        self.module_base.remove(
-            [self._get_module_spec(name, stream=stream, profile=profile)]
-        )
-        self._do_transaction()
-        logging.info("Module %s was removed.", name)
+        self.run_operations([("remove", name, stream, profile)])
+
+    def prefetch_module(self, name, stream=None, profile=None):
+        """Download packages of a module profile, without installing them."""
+        return self.prefetch_modules([(name, stream, profile)])
+
+
+def prefetch_in_background(modules, status_file=None, cacheonly=False):
+    """Prefetches module packages in a detached background process.
+
+    dnf is only started in the background process, so this returns at once.
+
+    :param modules: A list of (name, stream, profile) tuples.
+    :param status_file: path of the JSON file with the prefetch status.
+    :param cacheonly: If True, load repo metadata from the dnf cache.
+    """
+    from .constants import DNF_PREFETCH_STATUS_FILE
+    from .utils import run_detached
+
+    status_file = status_file or DNF_PREFETCH_STATUS_FILE
+    run_detached(
+        lambda: DnfModuleManager(cacheonly=cacheonly).prefetch_modules(modules),
+        status_file,
+    )
+    logging.info(
+        "Prefetching module packages in background, status in %s.", status_file
+    )
@@ -0,0 +1,207 @@
+#  Copyright 2021 Red Hat, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+from __future__ import absolute_import, division, print_function
+
+import hashlib
+import json
+import logging
+import os
+import time
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
+from xml.etree import ElementTree
+
+from .constants import (
+    YUM_REPO_AUDIT_MAX_WORKERS,
+    YUM_REPO_AUDIT_TIMEOUT,
+    YUM_REPO_METADATA_PATH,
+    YUM_REPO_MIRRORS_MAX,
+)
+from .exceptions import YumConfigUrlError
+from .utils import fetch_repomd, write_file_atomic
+
+try:
+    import repo_setup.utils as repos_utils
+except ImportError:
+    import ansible_collections.repo_setup.repos.plugins.module_utils.repo_setup.utils as repos_utils
+
+__metaclass__ = type
+
+METALINK_NAMESPACE = "{http://www.metalinker.org/}"
+
+
+def parse_mirrorlist(content):
+    """Returns all base urls listed in a mirrorlist content."""
+    urls = []
+    for line in content.splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            urls.append(line)
+    return urls
+
+
+def parse_metalink(content):
+    """Parses a metalink content.
+
+    :param content: metalink content.
+    :return: a tuple with the list of base urls, ordered by preference, and a
+        list of (hash_type, hash_value) of the valid repomd.xml files.
+    """
+    root = ElementTree.fromstring(content)
+    for repomd in root.iter(METALINK_NAMESPACE + "file"):
+        if repomd.get("name") == "repomd.xml":
+            break
+    else:
+        raise ValueError("Metalink has no repomd.xml information.")
+
+    # Hashes of the current repomd.xml and of its alternates, which are
+    # still valid while mirrors are being synced
+    hashes = [
+        (h.get("type"), h.text.strip())
+        for h in repomd.iter(METALINK_NAMESPACE + "hash")
+        if h.text
+    ]
+    url_elements = [
+        url
+        for url in repomd.iter(METALINK_NAMESPACE + "url")
+        if url.get("protocol") in ("http", "https") and url.text
+    ]
+    # sort is stable, mirrors with the same preference keep their order
+    url_elements.sort(key=lambda url: -int(url.get("preference", 0)))
+    urls = []
+    for url in url_elements:
+        url = url.text.strip()
+        if url.endswith(YUM_REPO_METADATA_PATH):
+            url = url[: -len(YUM_REPO_METADATA_PATH)]
+        urls.append(url)
+    return urls, hashes
+
+
+def get_mirror_urls(url, source_type, timeout=None):
+    """Downloads a mirrorlist or metalink and returns its mirrors.
+
+    :param url: mirrorlist or metalink url.
+    :param source_type: 'mirrorlist' or 'metalink'.
+    :param timeout: timeout in seconds for the request.
+    :return: a tuple with the list of base urls and a list of repomd.xml
+        hashes. The hash list is always empty for mirrorlists.
+    """
+    try:
+        content = (
+            repos_utils.http_open(url, timeout=timeout or YUM_REPO_AUDIT_TIMEOUT)
+            .read()
+            .decode("utf-8")
+        )
+    except Exception as e:
+        msg = "Unable to download {0} '{1}': {2}".format(source_type, url, e)
+        raise YumConfigUrlError(error_msg=msg)
+
+    if source_type == "metalink":
+        try:
+            return parse_metalink(content)
+        except (ElementTree.ParseError, ValueError) as e:
+            msg = "Unable to parse metalink '{0}': {1}".format(url, e)
+            raise YumConfigUrlError(error_msg=msg)
+    return parse_mirrorlist(content), []
+
+
+def repomd_checksum_matches(content, hashes):
+    """Checks a repomd.xml content against a list of expected hashes."""
+    for hash_type, value in hashes:
+        try:
+            checksum = hashlib.new(hash_type)
+        except (TypeError, ValueError):
+            continue
+        checksum.update(content)
+        if checksum.hexdigest() == value:
+            return True
+    return False
+
+
+def _measure_mirror(base_url, timeout, hashes):
+    """Returns the repomd.xml latency of a mirror, or None if not usable."""
+    try:
+        content, latency = fetch_repomd(base_url, timeout)
+    except Exception as e:
+        logging.debug("Mirror '%s' is unreachable: %s", base_url, e)
+        return None
+    if hashes and not repomd_checksum_matches(content, hashes):
+        logging.debug("Mirror '%s' has an outdated repomd.xml.", base_url)
+        return None
+    return latency
+
+
+def rank_mirrors(
+    base_urls, timeout=None, hashes=None, max_mirrors=None, workers=None
+):
+    """Measures all mirrors at the same time and ranks them by latency.
+
+    :param base_urls: list of mirror base urls.
+    :param timeout: deadline in seconds for all mirrors to be measured.
+    :param hashes: optional list of (hash_type, hash_value) used to discard
+        mirrors with an outdated repomd.xml.
+    :param max_mirrors: maximum number of mirrors to be returned.
+    :param workers: maximum number of mirrors measured at the same time.
+    :return: list of the fastest base urls, fastest first.
+    """
+    if not base_urls:
+        return []
+    timeout = timeout or YUM_REPO_AUDIT_TIMEOUT
+    pool = ThreadPool(
+        min(workers or YUM_REPO_AUDIT_MAX_WORKERS, len(base_urls))
+    )
+    deadline = time.time() + timeout
+    async_results = [
+        pool.apply_async(_measure_mirror, (url, timeout, hashes))
+        for url in base_urls
+    ]
+    ranked = []
+    for index, async_result in enumerate(async_results):
+        try:
+            latency = async_result.get(max(0, deadline - time.time()))
+        except TimeoutError:
+            latency = None
+        if latency is not None:
+            ranked.append((latency, index))
+    # Don't wait for mirrors that didn't answer before the deadline
+    pool.terminate()
+
+    ranked.sort()
+    max_mirrors = max_mirrors or YUM_REPO_MIRRORS_MAX
+    return [base_urls[index] for __, index in ranked[:max_mirrors]]
+
+
+def load_mirrors_cache(cache_file):
+    """Loads the mirror resolution cache, in the format:
+
+        {repo_id: {'type': str, 'source': str, 'baseurls': list,
+                   'resolved_at': float}}
+    """
+    if not os.path.isfile(cache_file):
+        return {}
+    try:
+        with open(cache_file) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        logging.warning("Ignoring invalid mirrors cache file %s.", cache_file)
+        return {}
+
+
+def save_mirrors_cache(cache_file, cache):
+    """Atomically writes the mirror resolution cache."""
+    cache_dir = os.path.dirname(cache_file)
+    if cache_dir and not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    write_file_atomic(cache_file, json.dumps(cache, indent=2, sort_keys=True))
@@ -0,0 +1,458 @@
+#  Copyright 2021 Red Hat, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+from __future__ import absolute_import, division, print_function
+
+import glob
+import logging
+import os
+import re
+from multiprocessing.pool import ThreadPool
+
+from .constants import (
+    DNF_CACHE_DIR,
+    DNF_MODULES_DIR,
+    YUM_REPO_AUDIT_MAX_WORKERS,
+    YUM_REPO_AUDIT_TIMEOUT,
+)
+from .exceptions import YumConfigFileParseError
+from .repo_audit import YumRepoAudit
+from .utils import fetch_repomd, parse_repomd_locations
+from .yum_config import cfg_parser
+
+try:
+    import repo_setup.utils as repos_utils
+except ImportError:
+    import ansible_collections.repo_setup.repos.plugins.module_utils.repo_setup.utils as repos_utils
+
+__metaclass__ = type
+
+MODULEMD_DOCUMENT = "modulemd"
+MODULEMD_DEFAULTS_DOCUMENT = "modulemd-defaults"
+MODULEMD_METADATA_TYPE = "modules"
+
+MODULE_STATE_ENABLED = "enabled"
+MODULE_STATE_DISABLED = "disabled"
+
+
+def _unquote(value):
+    return value.strip().strip("'\"")
+
+
+def _parse_flow_list(value):
+    value = value.strip()
+    if not (value.startswith("[") and value.endswith("]")):
+        return []
+    return [_unquote(item) for item in value[1:-1].split(",") if item.strip()]
+
+
+def iter_modulemd(lines):
+    """Scans a modules.yaml stream for module streams and defaults.
+
+    This is not a YAML parser: it only looks at the few keys needed to
+    index the available streams and profiles, so the metadata of large
+    repos can be scanned line by line without loading it all in memory.
+
+    :param lines: iterable with the lines of a modules.yaml file.
+    :return: generator of dicts, one for each 'modulemd' document, in the
+        format {'document', 'name', 'stream', 'profiles'}, and one for each
+        'modulemd-defaults' document, in the format {'document', 'name',
+        'stream', 'profiles'}, where 'stream' is the default stream and
+        'profiles' is a dict {stream: [default_profiles]}.
+    """
+    doc = None
+    profile_key = None
+    in_profiles = False
+
+    def _new_doc():
+        return {"document": None, "name": None, "stream": None, "profiles": {}}
+
+    def _finish(doc):
+        if doc and doc["document"] and doc["name"]:
+            if doc["document"] == MODULEMD_DOCUMENT:
+                doc["profiles"] = sorted(doc["profiles"])
+                return doc
+            if doc["document"] == MODULEMD_DEFAULTS_DOCUMENT:
+                return doc
+        return None
+
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", "replace")
+        line = line.rstrip("\r\n")
+        stripped = line.strip()
+        if line.startswith("---") or line.startswith("..."):
+            finished = _finish(doc)
+            if finished:
+                yield finished
+            doc = _new_doc() if line.startswith("---") else None
+            in_profiles = False
+            continue
+        if not stripped or stripped.startswith("#"):
+            continue
+        if doc is None:
+            doc = _new_doc()
+        indent = len(line) - len(line.lstrip(" "))
+
+        if indent == 0:
+            in_profiles = False
+            if stripped.startswith("document:"):
+                doc["document"] = _unquote(stripped.split(":", 1)[1])
+            continue
+
+        if in_profiles and indent <= 2:
+            in_profiles = False
+
+        if indent == 2:
+            key, _, value = stripped.partition(":")
+            if key in ("name", "module"):
+                doc["name"] = _unquote(value)
+            elif key == "stream":
+                doc["stream"] = _unquote(value)
+            elif key == "profiles":
+                in_profiles = True
+                profile_key = None
+            continue
+
+        if not in_profiles:
+            continue
+        if (
+            doc["document"] == MODULEMD_DEFAULTS_DOCUMENT
+            and stripped.startswith("- ")
+            and profile_key is not None
+        ):
+            # Default profiles written as a block sequence
+            doc["profiles"][profile_key].append(_unquote(stripped[2:]))
+        elif indent == 4 and ":" in stripped:
+            key, _, value = stripped.partition(":")
+            profile_key = _unquote(key)
+            doc["profiles"][profile_key] = _parse_flow_list(value)
+
+    finished = _finish(doc)
+    if finished:
+        yield finished
+
+
+def build_modules_index(documents, index=None):
+    """Adds module streams and defaults to a compact modules index.
+
+    :param documents: iterable of dicts returned by 'iter_modulemd'.
+    :param index: existing index to be updated.
+    :return: dict in the format {name: {'streams': {stream: [profiles]},
+        'default_stream': stream, 'default_profiles': {stream: [profiles]}}}.
+    """
+    index = {} if index is None else index
+    for doc in documents:
+        module = index.setdefault(
+            doc["name"],
+            {"streams": {}, "default_stream": None, "default_profiles": {}},
+        )
+        if doc["document"] == MODULEMD_DOCUMENT:
+            if doc["stream"] is None:
+                continue
+            profiles = set(module["streams"].get(doc["stream"], []))
+            profiles.update(doc["profiles"])
+            module["streams"][doc["stream"]] = sorted(profiles)
+        else:
+            if doc["stream"]:
+                module["default_stream"] = doc["stream"]
+            module["default_profiles"].update(doc["profiles"])
+    return index
+
+
+def format_modules_table(modules):
+    """Formats a list of modules as a text table, like 'dnf module list'.
+
+    Streams and profiles are flagged with [d]efault, [e]nabled and
+    [x] disabled.
+    """
+    rows = [["NAME", "STREAM", "PROFILES"]]
+    for module in modules:
+        stream = module["stream"]
+        if module["default"]:
+            stream += " [d]"
+        if module["state"] == MODULE_STATE_ENABLED:
+            stream += " [e]"
+        elif module["state"] == MODULE_STATE_DISABLED:
+            stream += " [x]"
+        profiles = [
+            p + " [d]" if p in module["default_profiles"] else p
+            for p in module["profiles"]
+        ]
+        rows.append([module["name"], stream, ", ".join(profiles)])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    return "\n".join(
+        "  ".join(value.ljust(widths[i]) for i, value in enumerate(row)).rstrip()
+        for row in rows
+    )
+
+
+class DnfModuleQuery:
+    """Queries dnf modules straight from the repos module metadata.
+
+    Answers which module streams and profiles are available, and which are
+    enabled, without starting dnf: the 'modules' metadata of each enabled
+    repo is read from the dnf cache or, when not cached, downloaded from
+    the repo, and the enablement state comes from the dnf modules.d
+    directory.
+    """
+
+    def __init__(
+        self,
+        dir_path=None,
+        environment_file=None,
+        cache_dir=None,
+        modules_dir=None,
+        cacheonly=False,
+        timeout=None,
+    ):
+        """Creates a new DnfModuleQuery object.
+
+        :param dir_path: path to the yum repo configuration directory.
+        :param environment_file: path to an environment file to be loaded.
+        :param cache_dir: path to the dnf cache directory.
+        :param modules_dir: path to the dnf modules.d directory.
+        :param cacheonly: only use module metadata from the dnf cache. Repos
+            that aren't cached are ignored.
+        :param timeout: timeout in seconds to download remote metadata.
+        """
+        self.repo_config = YumRepoAudit(
+            dir_path=dir_path, environment_file=environment_file
+        )
+        self.cache_dir = cache_dir or DNF_CACHE_DIR
+        self.modules_dir = modules_dir or DNF_MODULES_DIR
+        self.cacheonly = cacheonly
+        self.timeout = timeout or YUM_REPO_AUDIT_TIMEOUT
+        self._index = None
+
+    def _get_cached_modules_file(self, repo_id):
+        """Returns the most recent modules metadata file cached by dnf."""
+        # dnf caches each repo in a '<repo_id>-<16 hex digits>' directory
+        dir_regex = re.compile(r"^{0}-[0-9a-f]{{16}}$".format(re.escape(repo_id)))
+        candidates = [
+            path
+            for path in glob.glob(
+                os.path.join(
+                    self.cache_dir,
+                    glob.escape(repo_id) + "-*",
+                    "repodata",
+                    "*" + MODULEMD_METADATA_TYPE + ".yaml*",
+                )
+            )
+            if dir_regex.match(os.path.basename(os.path.dirname(os.path.dirname(path))))
+        ]
+        if not candidates:
+            return None
+        return max(candidates, key=os.path.getmtime)
+
+    def _get_remote_modules_url(self, base_url):
+        """Returns the url of the modules metadata of a remote repo."""
+        content, _ = fetch_repomd(base_url, self.timeout)
+        location = parse_repomd_locations(content).get(MODULEMD_METADATA_TYPE)
+        if location is None:
+            return None
+        return "/".join([base_url.rstrip("/"), location])
+
+    @staticmethod
+    def _open_modules_file(file_obj, name):
+        """Wraps a modules metadata file object according to its compression.
+
+        zstd compressed metadata needs Python >= 3.14 or the zstandard
+        module.
+
+        :raises YumConfigFileParseError: if the compression isn't supported.
+        """
+        if name.endswith(".gz"):
+            import gzip
+
+            return gzip.GzipFile(fileobj=file_obj)
+        if name.endswith(".xz"):
+            import lzma
+
+            return lzma.LZMAFile(file_obj)
+        if name.endswith(".bz2"):
+            import bz2
+
+            return bz2.BZ2File(file_obj)
+        if name.endswith(".zst"):
+            try:
+                from compression import zstd
+
+                return zstd.ZstdFile(file_obj)
+            except ImportError:
+                pass
+            try:
+                import io
+
+                import zstandard
+
+                return io.BufferedReader(
+                    zstandard.ZstdDecompressor().stream_reader(file_obj)
+                )
+            except ImportError:
+                msg = (
+                    "Reading the zstd compressed '{0}' requires Python >= 3.14 "
+                    "or the zstandard module."
+                ).format(name)
+                raise YumConfigFileParseError(error_msg=msg)
+        if name.endswith(".yaml"):
+            return file_obj
+        msg = "Unsupported compression for '{0}'.".format(name)
+        raise YumConfigFileParseError(error_msg=msg)
+
+    def _get_repo_modules(self, repo):
+        """Reads the module streams and defaults provided by a repo.
+
+        :param repo: dict with repo name and base url.
+        :return: a list of dicts returned by 'iter_modulemd'.
+        """
+        cached_file = self._get_cached_modules_file(repo["repo"])
+        if cached_file is not None:
+            logging.debug(
+                "Reading modules of repo '%s' from %s.", repo["repo"], cached_file
+            )
+            try:
+                with open(cached_file, "rb") as f:
+                    with self._open_modules_file(f, cached_file) as lines:
+                        return list(iter_modulemd(lines))
+            except YumConfigFileParseError as e:
+                if self.cacheonly or not repo["url"]:
+                    raise
+                logging.warning("%s Reading the remote repo metadata instead.", e)
+
+        if self.cacheonly or not repo["url"]:
+            logging.debug("No cached module metadata for repo '%s'.", repo["repo"])
+            return []
+
+        modules_url = self._get_remote_modules_url(repo["url"])
+        if modules_url is None:
+            return []
+        logging.debug(
+            "Reading modules of repo '%s' from %s.", repo["repo"], modules_url
+        )
+        response = repos_utils.http_open(modules_url, timeout=self.timeout)
+        try:
+            with self._open_modules_file(response, modules_url) as lines:
+                return list(iter_modulemd(lines))
+        finally:
+            response.close()
+
+    def _safe_get_repo_modules(self, repo):
+        try:
+            return self._get_repo_modules(repo)
+        except YumConfigFileParseError:
+            # the repo would be missing from the index, without its streams
+            raise
+        except Exception as e:
+            logging.warning(
+                "Unable to read module metadata of repo '%s': %s", repo["repo"], e
+            )
+            return []
+
+    def get_index(self):
+        """Returns the modules index of all enabled repos.
+
+        Repos are read in parallel and the index is built only once per
+        object.
+        """
+        if self._index is not None:
+            return self._index
+        repos = self.repo_config.get_enabled_repos()
+        index = {}
+        if repos:
+            pool = ThreadPool(min(YUM_REPO_AUDIT_MAX_WORKERS, len(repos)))
+            try:
+                for documents in pool.imap(self._safe_get_repo_modules, repos):
+                    build_modules_index(documents, index)
+            finally:
+                pool.close()
+                pool.join()
+        self._index = index
+        return index
+
+    def get_modules_state(self):
+        """Reads the modules state from the dnf modules.d directory.
+
+        :return: dict in the format {name: {'stream', 'profiles', 'state'}}.
+        """
+        states = {}
+        if not os.path.isdir(self.modules_dir):
+            return states
+        for file in sorted(os.listdir(self.modules_dir)):
+            if not file.endswith(".module"):
+                continue
+            config = cfg_parser.ConfigParser()
+            try:
+                config.read(os.path.join(self.modules_dir, file))
+            except cfg_parser.Error:
+                logging.warning("Unable to parse module state file %s.", file)
+                continue
+            for section in config.sections():
+                profiles = config.get(section, "profiles", fallback="")
+                states[config.get(section, "name", fallback=section)] = {
+                    "stream": config.get(section, "stream", fallback="") or None,
+                    "profiles": [p for p in re.split(r"[\s,]+", profiles) if p],
+                    "state": config.get(section, "state", fallback="") or None,
+                }
+        return states
+
+    def list_modules(self, names=None):
+        """Lists the available module streams and their state.
+
+        :param names: list of module names to be listed. All modules are
+            listed when not provided.
+        :return: list of dicts with module name, stream, profiles, default
+            flag, default profiles, state and installed profiles, sorted by
+            name and stream.
+        """
+        index = self.get_index()
+        states = self.get_modules_state()
+        modules = []
+        for name in sorted(names or index):
+            module = index.get(name)
+            if module is None:
+                continue
+            module_state = states.get(name, {})
+            for stream in sorted(module["streams"]):
+                state = None
+                installed_profiles = []
+                if module_state.get("state") == MODULE_STATE_DISABLED:
+                    state = MODULE_STATE_DISABLED
+                elif (
+                    module_state.get("state") == MODULE_STATE_ENABLED
+                    and module_state.get("stream") == stream
+                ):
+                    state = MODULE_STATE_ENABLED
+                    installed_profiles = module_state["profiles"]
+                modules.append(
+                    {
+                        "name": name,
+                        "stream": stream,
+                        "profiles": module["streams"][stream],
+                        "default": stream == module["default_stream"],
+                        "default_profiles": module["default_profiles"].get(
+                            stream, []
+                        ),
+                        "state": state,
+                        "installed_profiles": installed_profiles,
+                    }
+                )
+        return modules
+
+    def get_enabled_stream(self, name):
+        """Returns the enabled stream of a module, or None if not enabled."""
+        module_state = self.get_modules_state().get(name, {})
+        if module_state.get("state") == MODULE_STATE_ENABLED:
+            return module_state.get("stream")
+        return None
@@ -0,0 +1,271 @@
+#  Copyright 2021 Red Hat, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+#
+from __future__ import absolute_import, division, print_function
+
+import logging
+import os
+import re
+import socket
+import time
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
+from xml.etree import ElementTree
+
+from .constants import (
+    YUM_REPO_AUDIT_MAX_WORKERS,
+    YUM_REPO_AUDIT_TIMEOUT,
+)
+from .utils import fetch_repomd, get_repo_vars, substitute_repo_vars
+from .yum_config import YumRepoConfig, cfg_parser, get_section_options
+
+__metaclass__ = type
+
+REPOMD_NAMESPACE = "{http://linux.duke.edu/metadata/repo}"
+
+AUDIT_STATUS_OK = "ok"
+AUDIT_STATUS_STALE = "stale"
+AUDIT_STATUS_TIMEOUT = "timeout"
+AUDIT_STATUS_UNREACHABLE = "unreachable"
+AUDIT_STATUS_ERROR = "error"
+AUDIT_STATUS_SKIPPED = "skipped"
+
+AUDIT_TABLE_COLUMNS = ["repo", "status", "latency", "size", "timestamp", "url"]
+
+
+def parse_repomd(content):
+    """Parses a repomd.xml content.
+
+    :param content: repomd.xml content.
+    :return: a tuple with the most recent metadata timestamp and the total
+        size of all metadata files, in bytes.
+    """
+    root = ElementTree.fromstring(content)
+    timestamps = []
+    size = 0
+    for data in root.findall(REPOMD_NAMESPACE + "data"):
+        data_timestamp = data.find(REPOMD_NAMESPACE + "timestamp")
+        if data_timestamp is not None and data_timestamp.text:
+            timestamps.append(int(float(data_timestamp.text)))
+        data_size = data.find(REPOMD_NAMESPACE + "size")
+        if data_size is not None and data_size.text:
+            size += int(data_size.text)
+    if not timestamps:
+        revision = root.find(REPOMD_NAMESPACE + "revision")
+        if revision is not None and revision.text and revision.text.isdigit():
+            timestamps.append(int(revision.text))
+    return (max(timestamps) if timestamps else None), size
+
+
+def probe_repomd(base_url, timeout):
+    """Downloads and parses the repomd.xml of a repo base url.
+
+    :param base_url: repo base url.
+    :param timeout: timeout in seconds for the request.
+    :return: dict with the probe status, latency, size and timestamp. A
+        request timing out has the 'timeout' status, other connection
+        errors the 'unreachable' status.
+    """
+    import urllib.error
+
+    result = {
+        "status": AUDIT_STATUS_OK,
+        "latency": None,
+        "size": None,
+        "timestamp": None,
+        "error": None,
+    }
+    try:
+        content, result["latency"] = fetch_repomd(base_url, timeout)
+    except urllib.error.HTTPError as e:
+        result["status"] = AUDIT_STATUS_ERROR
+        result["error"] = "HTTP {0}".format(e.code)
+        return result
+    except socket.timeout as e:
+        result["status"] = AUDIT_STATUS_TIMEOUT
+        result["error"] = str(e) or "No response after {0}s".format(timeout)
+        return result
+    except urllib.error.URLError as e:
+        if isinstance(e.reason, socket.timeout):
+            result["status"] = AUDIT_STATUS_TIMEOUT
+        else:
+            result["status"] = AUDIT_STATUS_UNREACHABLE
+        result["error"] = str(e)
+        return result
+    except Exception as e:
+        result["status"] = AUDIT_STATUS_UNREACHABLE
+        result["error"] = str(e)
+        return result
+
+    try:
+        result["timestamp"], result["size"] = parse_repomd(content)
+    except (ElementTree.ParseError, ValueError):
+        result["status"] = AUDIT_STATUS_ERROR
+        result["error"] = "Invalid repomd.xml"
+    return result
+
+
+def format_audit_table(results):
+    """Formats a list of audit results as a text table."""
+    rows = [[c.upper() for c in AUDIT_TABLE_COLUMNS]]
+    for result in results:
+        row = []
+        for column in AUDIT_TABLE_COLUMNS:
+            value = result.get(column)
+            if value is None:
+                value = "-"
+            elif column == "latency":
+                value = "%.3fs" % value
+            elif column == "timestamp":
+                value = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(value))
+            row.append(str(value))
+        rows.append(row)
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    return "\n".join(
+        "  ".join(value.ljust(widths[i]) for i, value in enumerate(row)).rstrip()
+        for row in rows
+    )
+
+
+class YumRepoAudit(YumRepoConfig):
+    """Checks reachability and freshness of all configured yum repos."""
+
+    def __init__(
+        self, dir_path=None, environment_file=None, dry_run=False, repo_vars=None
+    ):
+        super(YumRepoAudit, self).__init__(
+            dir_path=dir_path, environment_file=environment_file, dry_run=dry_run
+        )
+        self.repo_vars = get_repo_vars()
+        self.repo_vars.update(repo_vars or {})
+
+    def get_enabled_repos(self):
+        """Gets all enabled repos from the configuration directory.
+
+        :return: A list of dicts with repo name, file path and base url. The
+            base url is None when the repo only has a mirrorlist or metalink.
+        """
+        repos = []
+        for file in sorted(os.listdir(self.dir_path)):
+            if self.file_extension and not file.endswith(self.file_extension):
+                continue
+            file_path = os.path.join(self.dir_path, file)
+            config = cfg_parser.ConfigParser()
+            try:
+                config.read(file_path)
+            except cfg_parser.Error:
+                logging.warning("Unable to parse configuration file %s.", file_path)
+                continue
+            for section in config.sections():
+                options = get_section_options(config, section)
+                if options.get("enabled", "1").lower() in ("0", "false", "no"):
+                    continue
+                # 'baseurl' may have a list of urls, but dnf starts with the
+                # first one.
+                base_urls = re.split(r"[\s,]+", options.get("baseurl", "").strip())
+                base_url = base_urls[0] or None
+                if base_url:
+                    base_url = substitute_repo_vars(base_url, self.repo_vars)
+                repos.append({"repo": section, "file": file_path, "url": base_url})
+        return repos
+
+    def audit(self, timeout=None, max_age=None, workers=None):
+        """Probes the metadata of all enabled repos at the same time.
+
+        :param timeout: deadline in seconds for all probes to finish.
+        :param max_age: maximum age in seconds of the repo metadata. Repos
+            with older metadata are reported as stale.
+        :param workers: maximum number of repos probed at the same time.
+        :return: A list of dicts with the audit result for each repo.
+        """
+        timeout = timeout or YUM_REPO_AUDIT_TIMEOUT
+        repos = self.get_enabled_repos()
+        to_probe = [repo for repo in repos if repo["url"]]
+        results = []
+        pool = None
+        if to_probe:
+            pool = ThreadPool(
+                min(workers or YUM_REPO_AUDIT_MAX_WORKERS, len(to_probe))
+            )
+        deadline = time.time() + timeout
+        async_results = {}
+        for repo in to_probe:
+            async_results[(repo["file"], repo["repo"])] = pool.apply_async(
+                probe_repomd, (repo["url"], timeout)
+            )
+
+        now = time.time()
+        for repo in repos:
+            result = dict(repo)
+            async_result = async_results.get((repo["file"], repo["repo"]))
+            if async_result is None:
+                result.update(
+                    status=AUDIT_STATUS_SKIPPED,
+                    latency=None,
+                    size=None,
+                    timestamp=None,
+                    error="No baseurl available",
+                )
+            else:
+                try:
+                    result.update(
+                        async_result.get(max(0, deadline - time.time()))
+                    )
+                except TimeoutError:
+                    result.update(
+                        status=AUDIT_STATUS_TIMEOUT,
+                        latency=None,
+                        size=None,
+                        timestamp=None,
+                        error="No response after {0}s".format(timeout),
+                    )
+            if (
+                max_age
+                and result["status"] == AUDIT_STATUS_OK
+                and result["timestamp"] is not None
+                and now - result["timestamp"] > max_age
+            ):
+                result["status"] = AUDIT_STATUS_STALE
+            results.append(result)
+
+        if pool is not None:
+            # Don't wait for probes that didn't finish before the deadline
+            pool.terminate()
+        return results
+
+    def disable_failed_repos(self, results):
+        """Disables all repos that failed the audit.
+
+        :param results: List of results returned by 'audit'.
+        :return: A list with the names of the disabled repos.
+        """
+        failed_status = [
+            AUDIT_STATUS_STALE,
+            AUDIT_STATUS_TIMEOUT,
+            AUDIT_STATUS_UNREACHABLE,
+            AUDIT_STATUS_ERROR,
+        ]
+        disabled = []
+        for result in results:
+            if result["status"] not in failed_status:
+                continue
+            logging.warning(
+                "Disabling repo '%s' (%s): %s",
+                result["repo"],
+                result["status"],
+                result.get("error") or "metadata is too old",
+            )
+            self.update_section(result["repo"], file_path=result["file"], enabled=False)
+            disabled.append(result["repo"])
+        return disabled
@@ -12,9 +12,20 @@
 #  License for the specific language governing permissions and limitations
 #  under the License.
 from __future__ import absolute_import, division, print_function
+import contextlib
 import os
 import platform
 import subprocess
+import tempfile
+import time
+from xml.etree import ElementTree
+
+from .constants import DNF_VARS_DIR, YUM_REPO_METADATA_PATH
+
+try:
+    import repo_setup.utils as repos_utils
+except ImportError:
+    import ansible_collections.repo_setup.repos.plugins.module_utils.repo_setup.utils as repos_utils
 
 __metaclass__ = type
 
@@ -49,3 +60,154 @@ def get_distro_info():
         distro_id = "ubi"
 
     return distro_id, distro_major_version_id, distro_name
+
+
+def get_repo_vars():
+    """Gets the variables available for substitution in repo files.
+
+    :return: dict with 'arch', 'basearch', 'releasever' and all custom
+        variables defined in the dnf vars dir.
+    """
+    __, major_version, __ = get_distro_info()
+    arch = platform.machine()
+    repo_vars = {
+        "arch": arch,
+        "basearch": arch,
+        "releasever": major_version,
+    }
+    if os.path.isdir(DNF_VARS_DIR):
+        for name in os.listdir(DNF_VARS_DIR):
+            var_file = os.path.join(DNF_VARS_DIR, name)
+            if not os.path.isfile(var_file):
+                continue
+            with open(var_file) as f:
+                repo_vars[name] = f.read().strip()
+    return repo_vars
+
+
+def substitute_repo_vars(value, repo_vars):
+    """Replaces all '$var' and '${var}' occurrences in a repo option value."""
+    # longer names first, to not replace a prefix of another variable
+    for name in sorted(repo_vars, key=len, reverse=True):
+        value = value.replace("${%s}" % name, repo_vars[name])
+        value = value.replace("$" + name, repo_vars[name])
+    return value
+
+
+def fetch_repomd(base_url, timeout):
+    """Downloads the repomd.xml of a repo base url.
+
+    :param base_url: repo base url.
+    :param timeout: timeout in seconds for the request.
+    :return: a tuple with the repomd.xml content and the download latency,
+        in seconds.
+    """
+    url = "/".join([base_url.rstrip("/"), YUM_REPO_METADATA_PATH])
+    start = time.time()
+    response = repos_utils.http_open(url, timeout=timeout)
+    content = response.read()
+    return content, round(time.time() - start, 3)
+
+
+@contextlib.contextmanager
+def file_lock(lock_path):
+    """Holds an exclusive lock on 'lock_path' while in this context.
+
+    Used to share a download between processes running on the same host.
+    """
+    import fcntl
+
+    with open(lock_path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def write_file_atomic(file_path, content):
+    """Writes a file, so readers never see it partially written."""
+    mode = "wb" if isinstance(content, bytes) else "w"
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path) or ".")
+    try:
+        with os.fdopen(fd, mode) as f:
+            f.write(content)
+        os.rename(tmp_path, file_path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+def run_detached(target, status_file):
+    """Runs 'target' in a detached background process and returns at once.
+
+    The process is double forked, so it isn't killed nor left as a zombie
+    when the caller exits. Its status is written as JSON to 'status_file':
+    'running' while it runs, then 'done' with the value returned by
+    'target', or 'failed' with the error message.
+
+    :param target: callable, without arguments, to be run.
+    :param status_file: path of the status file.
+    """
+    import json
+
+    status_dir = os.path.dirname(status_file)
+    if status_dir and not os.path.isdir(status_dir):
+        os.makedirs(status_dir)
+    status = {"status": "running", "pid": None, "started": time.time()}
+    write_file_atomic(status_file, json.dumps(status))
+
+    pid = os.fork()
+    if pid:
+        os.waitpid(pid, 0)
+        return
+    try:
+        os.setsid()
+        if os.fork():
+            os._exit(0)
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+        status["pid"] = os.getpid()
+        write_file_atomic(status_file, json.dumps(status))
+        try:
+            status.update(status="done", result=target())
+        except Exception as e:
+            status.update(status="failed", error=str(e))
+        status["finished"] = time.time()
+        write_file_atomic(status_file, json.dumps(status))
+    finally:
+        os._exit(0)
+
+
+def parse_repomd_checksums(content):
+    """Returns the checksum of each metadata file listed in a repomd.xml.
+
+    Unlike the repomd.xml checksum itself, these checksums don't change
+    when the same repodata is regenerated with a new timestamp.
+
+    :param content: repomd.xml content.
+    :return: dict in the format {metadata_type: checksum}.
+    """
+    namespace = "{http://linux.duke.edu/metadata/repo}"
+    checksums = {}
+    for data in ElementTree.fromstring(content).findall(namespace + "data"):
+        checksum = data.find(namespace + "checksum")
+        if checksum is not None and checksum.text:
+            checksums[data.get("type")] = checksum.text.strip()
+    return checksums
+
+
+def parse_repomd_locations(content):
+    """Returns the location of each metadata file listed in a repomd.xml.
+
+    :param content: repomd.xml content.
+    :return: dict in the format {metadata_type: relative_path}.
+    """
+    namespace = "{http://linux.duke.edu/metadata/repo}"
+    locations = {}
+    for data in ElementTree.fromstring(content).findall(namespace + "data"):
+        location = data.find(namespace + "location")
+        if location is not None and location.get("href"):
+            locations[data.get("type")] = location.get("href")
+    return locations
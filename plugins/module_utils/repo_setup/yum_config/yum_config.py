@@ -15,16 +15,20 @@
 from __future__ import absolute_import, division, print_function
 
 
+import contextlib
 import io
 import logging
 import os
 import subprocess
 import sys
+import time
 
 from .constants import (
     YUM_GLOBAL_CONFIG_FILE_PATH,
     YUM_REPO_DIR,
     YUM_REPO_FILE_EXTENSION,
+    YUM_REPO_MIRRORS_CACHE_FILE,
+    YUM_REPO_MIRRORS_TTL,
     YUM_REPO_SUPPORTED_OPTIONS,
 )
 from .exceptions import (
@@ -34,6 +38,13 @@ from .exceptions import (
     YumConfigNotFound,
     YumConfigUrlError,
 )
+from .mirrors import (
+    get_mirror_urls,
+    load_mirrors_cache,
+    rank_mirrors,
+    save_mirrors_cache,
+)
+from .utils import get_repo_vars, substitute_repo_vars
 
 try:
     import repo_setup.utils as repos_utils
@@ -45,17 +56,30 @@ py_version = sys.version_info.major
 if py_version < 3:
     import ConfigParser as cfg_parser
 
-    def save_section_to_file(file_path, config, section, updates):
-        """Updates a specific 'section' in a 'config' and write to disk.
+    def get_section_options(config, section):
+        """Returns a dict with all raw options of a 'section' in a 'config'.
+
+        :param config: configparser object created from the file.
+        :param section: section name to be read.
+        """
+        return dict(config.items(section, raw=True))
+
+    def set_section_options(config, section, updates):
+        """Updates a specific 'section' in a 'config' object in memory.
 
-        :param file_path: Absolute path to the file to be updated.
         :param config: configparser object created from the file.
         :param section: section name to be updated.
         :param updates: dict with options to update in section.
         """
-
         for k, v in updates.items():
             config.set(section, k, v)
+
+    def write_config_file(file_path, config):
+        """Writes a 'config' object to disk.
+
+        :param file_path: Absolute path to the file to be written.
+        :param config: configparser object to be written.
+        """
         with open(file_path, "w") as f:
             config.write(f)
 
@@ -78,19 +102,45 @@ if py_version < 3:
 else:
     import configparser as cfg_parser
 
-    def save_section_to_file(file_path, config, section, updates):
-        """Updates a specific 'section' in a 'config' and write to disk.
+    def get_section_options(config, section):
+        """Returns a dict with all raw options of a 'section' in a 'config'.
+
+        :param config: configparser object created from the file.
+        :param section: section name to be read.
+        """
+        return dict(config.items(section, raw=True))
+
+    def set_section_options(config, section, updates):
+        """Updates a specific 'section' in a 'config' object in memory.
 
-        :param file_path: Absolute path to the file to be updated.
         :param config: configparser object created from the file.
         :param section: section name to be updated.
         :param updates: dict with options to update in section.
         """
         config[section].update(updates)
+
+    def write_config_file(file_path, config):
+        """Writes a 'config' object to disk.
+
+        :param file_path: Absolute path to the file to be written.
+        :param config: configparser object to be written.
+        """
         with open(file_path, "w") as f:
             config.write(f, space_around_delimiters=False)
 
 
+def save_section_to_file(file_path, config, section, updates):
+    """Updates a specific 'section' in a 'config' and write to disk.
+
+    :param file_path: Absolute path to the file to be updated.
+    :param config: configparser object created from the file.
+    :param section: section name to be updated.
+    :param updates: dict with options to update in section.
+    """
+    set_section_options(config, section, updates)
+    write_config_file(file_path, config)
+
+
 __metaclass__ = type
 
 
@@ -129,6 +179,7 @@ class YumConfig:
         dir_path=None,
         file_extension=None,
         environment_file=None,
+        dry_run=False,
     ):
         """
         Creates a YumConfig object that holds configuration file
@@ -142,11 +193,25 @@ class YumConfig:
             in the search directory.
         :param environment_file: File to be read before updating environment
             variables.
+        :param dry_run: If True, compute all changes but don't write any
+            configuration file to disk.
         """
         self.dir_path = dir_path
         self.file_extension = file_extension
         self.valid_options = valid_options
         self.env_file = environment_file
+        self.dry_run = dry_run
+        # Effective changes, in the format:
+        #   {file_path: {section: {option: (old_value, new_value)}}}
+        self.changes = {}
+        self.added_sections = set()
+        # In-memory configs used in dry-run mode, or until the end of a write
+        # transaction, instead of writing them
+        self._pending_configs = {}
+        self._in_transaction = False
+        # Directory where repo files downloaded from DLRN are reused while
+        # their .md5 sidecar matches, or None to always download them
+        self.repo_files_cache_dir = None
 
         # Sanity checks
         if dir_path:
@@ -159,6 +224,11 @@ class YumConfig:
         if self.env_file:
             source_env_file(os.path.expanduser(self.env_file), update=True)
 
+    @property
+    def changed(self):
+        """True if any configuration file was (or would be) changed."""
+        return bool(self.changes)
+
     def _read_config_file(self, file_path, section=None):
         """Reads a configuration file.
 
@@ -174,6 +244,11 @@ class YumConfig:
 
         valid_file_path = None
         for file in file_paths:
+            if file in self._pending_configs:
+                # dry-run: use the in-memory version of this file
+                config = self._pending_configs[file]
+                valid_file_path = file
+                break
             if validated_file_path(file):
                 valid_file_path = file
                 break
@@ -181,11 +256,13 @@ class YumConfig:
             msg = 'The configuration file "{0}" was ' "not found.".format(file_path)
             raise YumConfigNotFound(error_msg=msg)
 
-        try:
-            config.read(valid_file_path)
-        except cfg_parser.Error:
-            msg = "Unable to parse configuration file {0}.".format(valid_file_path)
-            raise YumConfigFileParseError(error_msg=msg)
+        if valid_file_path not in self._pending_configs:
+            try:
+                config.read(valid_file_path)
+            except cfg_parser.Error:
+                msg = "Unable to parse configuration file {0}.".format(
+                    valid_file_path)
+                raise YumConfigFileParseError(error_msg=msg)
 
         if section and section not in config.sections():
             msg = (
@@ -196,6 +273,155 @@ class YumConfig:
 
         return config, valid_file_path
 
+    def _create_config_file(self, file_path, config=None):
+        """Creates a new configuration file.
+
+        In dry-run mode, or in a write transaction, the file is only created
+        in memory, so that further operations can still be evaluated against
+        it.
+
+        :param file_path: Path of the configuration file to be created.
+        :param config: Optional configparser object with the initial content.
+        """
+        if config is None:
+            config = cfg_parser.ConfigParser()
+        if self.dry_run or self._in_transaction:
+            self._pending_configs[file_path] = config
+            return
+        with open(file_path, "w+") as file:
+            config.write(file)
+
+    def _get_section_changes(self, config, section, updates):
+        """Returns only the options that would change a section.
+
+        :param config: configparser object created from the file.
+        :param section: Name of the section to be compared.
+        :param updates: Dict with all options and values to be set.
+        :return: A dict with the options that differ, in the format
+            {option: (old_value, new_value)}.
+        """
+        current = {}
+        if section in config.sections():
+            current = get_section_options(config, section)
+        return dict(
+            (k, (current.get(k), v))
+            for k, v in updates.items()
+            if current.get(k) != v
+        )
+
+    def _save_changes(self, file_path, config, section_changes):
+        """Applies and records a set of section changes in a config file.
+
+        :param file_path: Path to the configuration file to be updated.
+        :param config: configparser object created from the file.
+        :param section_changes: Dict in the format
+            {section: {option: (old_value, new_value)}}.
+        :return: True if the file was (or would be) changed.
+        """
+        section_changes = dict(
+            (section, changes)
+            for section, changes in section_changes.items()
+            if changes
+        )
+        if not section_changes:
+            return False
+
+        for section, changes in section_changes.items():
+            set_section_options(
+                config, section, dict((k, v[1]) for k, v in changes.items())
+            )
+            file_changes = self.changes.setdefault(file_path, {})
+            sect_changes = file_changes.setdefault(section, {})
+            for k, (old, new) in changes.items():
+                # keep the original value if the option was changed before
+                old = sect_changes.get(k, (old, None))[0]
+                if old == new:
+                    # option was restored to its original value
+                    sect_changes.pop(k, None)
+                else:
+                    sect_changes[k] = (old, new)
+            if not sect_changes:
+                del file_changes[section]
+            if not file_changes:
+                del self.changes[file_path]
+
+        self._write_config(file_path, config)
+        return True
+
+    def _write_config(self, file_path, config):
+        """Writes a config to disk, or keeps it in memory in dry-run mode."""
+        if self.dry_run or self._in_transaction:
+            self._pending_configs[file_path] = config
+        else:
+            write_config_file(file_path, config)
+
+    @contextlib.contextmanager
+    def _write_transaction(self):
+        """Keeps all the writes in memory and writes them at the end.
+
+        The files are only written if the whole transaction succeeds, so an
+        error doesn't leave part of the files updated. Nothing is written in
+        dry-run mode.
+        """
+        if self.dry_run or self._in_transaction:
+            yield
+            return
+        self._in_transaction = True
+        try:
+            yield
+            pending = self._pending_configs
+        finally:
+            self._in_transaction = False
+            self._pending_configs = {}
+        for file_path in sorted(pending):
+            write_config_file(file_path, pending[file_path])
+
+    def get_diff(self):
+        """Returns the list of changes in the Ansible 'diff' format.
+
+        Each changed file has its own entry, with 'before' and 'after'
+        containing only the sections and options that were modified.
+        """
+        diff_list = []
+        for file_path in sorted(self.changes):
+            before, after = [], []
+            for section in sorted(self.changes[file_path]):
+                options = self.changes[file_path][section]
+                if (file_path, section) not in self.added_sections:
+                    before.append("[%s]" % section)
+                after.append("[%s]" % section)
+                for k in sorted(options):
+                    old, new = options[k]
+                    if old is not None:
+                        before.append("%s=%s" % (k, old))
+                    after.append("%s=%s" % (k, new))
+            diff_list.append(
+                {
+                    "before_header": file_path,
+                    "after_header": file_path,
+                    "before": "\n".join(before) + "\n" if before else "",
+                    "after": "\n".join(after) + "\n",
+                }
+            )
+        return diff_list
+
+    def get_changed_repos(self):
+        """Returns the names of all changed sections that are enabled.
+
+        For repo configuration files, this is the list of repo ids that need
+        to have their metadata refreshed.
+        """
+        repo_ids = set()
+        for file_path, sections in self.changes.items():
+            config, file_path = self._read_config_file(file_path)
+            for section in sections:
+                if section not in config.sections():
+                    continue
+                options = get_section_options(config, section)
+                if options.get("enabled", "1").lower() not in ("0", "false", "no"):
+                    repo_ids.add(section)
+        return sorted(repo_ids)
+
     def _get_config_files(self, section):
         """Gets all configuration file paths for a given section.
 
@@ -205,39 +431,62 @@ class YumConfig:
         :param section: Section to be found inside configuration files.
         :return: A list of config file paths.
         """
-        # Search for a configuration file that has the provided section
-        config_files_path = []
-        if section and self.dir_path:
-            for file in os.listdir(self.dir_path):
-                # Skip files that don't match the file extension or are not
-                # writable
-                if self.file_extension and not file.endswith(self.file_extension):
-                    continue
-                if not os.access(os.path.join(self.dir_path, file), os.W_OK):
-                    continue
+        if not section:
+            return []
+        return self._get_sections_config_files([section]).get(section, [])
 
-                tmp_config = cfg_parser.ConfigParser()
-                try:
-                    tmp_config.read(os.path.join(self.dir_path, file))
-                except cfg_parser.Error:
-                    continue
-                if section in tmp_config.sections():
-                    config_files_path.append(os.path.join(self.dir_path, file))
+    def _get_sections_config_files(self, sections, dir_path=None):
+        """Gets all configuration file paths for a list of sections.
+
+        All files inside the configuration directory are parsed only once,
+        no matter how many sections are being searched.
 
-        return config_files_path
+        :param sections: Sections to be found inside configuration files.
+        :param dir_path: Directory to search in, instead of the configuration
+            directory.
+        :return: A dict with each found section and its list of config file
+            paths.
+        """
+        dir_path = dir_path or self.dir_path
+        sections = set(sections)
+        sections_files = {}
+        if not sections or not dir_path or not os.path.isdir(dir_path):
+            return sections_files
+
+        for file in sorted(os.listdir(dir_path)):
+            # Skip files that don't match the file extension or are not
+            # writable
+            if self.file_extension and not file.endswith(self.file_extension):
+                continue
+            if not os.access(os.path.join(dir_path, file), os.W_OK):
+                continue
+
+            tmp_config = cfg_parser.ConfigParser()
+            try:
+                tmp_config.read(os.path.join(dir_path, file))
+            except cfg_parser.Error:
+                continue
+            for section in sections.intersection(tmp_config.sections()):
+                sections_files.setdefault(section, []).append(
+                    os.path.join(dir_path, file)
+                )
+
+        return sections_files
 
     def update_section(self, section, set_dict, file_path=None):
         """Updates a set of options of a section.
 
         If a file path is not provided by the caller, this function will search
         for the section in all files located in the working directory and
-        update each one of them.
+        update each one of them. Files are only written when at least one
+        option has a different value.
 
         :param section: Name of the section on the configuration file that will
             be updated.
         :param set_dict: Dict with all options and values to be updated in the
             configuration file section.
         :param file_path: Path to the configuration file to be updated.
+        :return: True if any file was (or would be) changed.
         """
         if self.valid_options:
             if not all(key in self.valid_options for key in set_dict.keys()):
@@ -254,12 +503,18 @@ class YumConfig:
 
         for k, v in set_dict.items():
             set_dict[k] = os.path.expandvars(v)
+        changed = False
         for file in files:
             config, file = self._read_config_file(file, section=section)
-            # Update configuration file with dict updates
-            save_section_to_file(file, config, section, set_dict)
+            # Update configuration file only with effective changes
+            changes = self._get_section_changes(config, section, set_dict)
+            changed |= self._save_changes(file, config, {section: changes})
 
-        logging.info("Section '%s' was successfully " "updated.", section)
+        if changed:
+            logging.info("Section '%s' was successfully " "updated.", section)
+        else:
+            logging.info("Section '%s' is already up to date.", section)
+        return changed
 
     def add_section(self, section, add_dict, file_path):
         """Adds a new section with options in a provided config file.
@@ -268,6 +523,7 @@ class YumConfig:
         :param add_dict: Dict with all options and values to be added into the
             new section.
         :param file_path: Path to the configuration file to be updated.
+        :return: True, since a new section always changes the file.
         """
         if self.valid_options:
             if not all(key in self.valid_options for key in add_dict.keys()):
@@ -284,10 +540,51 @@ class YumConfig:
             add_dict[k] = os.path.expandvars(v)
         # Add new section
         config.add_section(section)
+        self.added_sections.add((file_path, section))
         # Update configuration file with dict updates
-        save_section_to_file(file_path, config, section, add_dict)
+        changes = self._get_section_changes(config, section, add_dict)
+        self.changes.setdefault(file_path, {}).setdefault(section, {})
+        if not self._save_changes(file_path, config, {section: changes}):
+            # an empty section still needs to be written
+            self._write_config(file_path, config)
 
         logging.info("Section '%s' was successfully " "added.", section)
+        return True
+
+    def update_sections(self, sections_dict, file_path):
+        """Updates a set of options of multiple sections of the same file.
+
+        All sections are updated with a single write to the file.
+
+        :param sections_dict: Dict in the format {section: set_dict}.
+        :param file_path: Path to the configuration file to be updated.
+        :return: True if the file was (or would be) changed.
+        """
+        if self.valid_options:
+            for set_dict in sections_dict.values():
+                if not all(key in self.valid_options for key in set_dict.keys()):
+                    msg = "One or more provided options are not valid."
+                    raise YumConfigInvalidOption(error_msg=msg)
+
+        config, file_path = self._read_config_file(file_path)
+        section_changes = {}
+        for section, set_dict in sections_dict.items():
+            if section not in config.sections():
+                msg = (
+                    'The provided section "{0}" was not found in the '
+                    "configuration file {1}."
+                ).format(section, file_path)
+                raise YumConfigInvalidSection(error_msg=msg)
+            section_changes[section] = self._get_section_changes(
+                config, section, set_dict
+            )
+        changed = self._save_changes(file_path, config, section_changes)
+
+        if changed:
+            logging.info("Sections of '%s' were successfully updated.", file_path)
+        else:
+            logging.info("Sections of '%s' are already up to date.", file_path)
+        return changed
 
     def update_all_sections(self, set_dict, file_path):
         """Updates all section of a given configuration file.
@@ -295,6 +592,7 @@ class YumConfig:
         :param set_dict: Dict with all options and values to be updated in
             the configuration file.
         :param file_path: Path to the configuration file to be updated.
+        :return: True if the file was (or would be) changed.
         """
         if self.valid_options:
             if not all(key in self.valid_options for key in set_dict.keys()):
@@ -302,12 +600,21 @@ class YumConfig:
                 raise YumConfigInvalidOption(error_msg=msg)
 
         config, file_path = self._read_config_file(file_path)
-        for section in config.sections():
-            save_section_to_file(file_path, config, section, set_dict)
+        section_changes = dict(
+            (section, self._get_section_changes(config, section, set_dict))
+            for section in config.sections()
+        )
+        changed = self._save_changes(file_path, config, section_changes)
 
-        logging.info("All sections for '%s' were successfully " "updated.", file_path)
+        if changed:
+            logging.info(
+                "All sections for '%s' were successfully " "updated.", file_path
+            )
+        else:
+            logging.info("All sections for '%s' are already up to date.", file_path)
+        return changed
 
-    def get_config_from_url(self, url):
+    def _download_from_url(self, url):
         content, status = repos_utils.http_get(url)
         if status != 200:
             msg = (
@@ -316,6 +623,17 @@ class YumConfig:
             ).format(url, status)
             logging.error(msg)
             raise YumConfigUrlError(error_msg=msg)
+        return content
+
+    def get_config_from_url(self, url):
+        if self.repo_files_cache_dir:
+            content = repos_utils.get_repo_file(
+                url,
+                lambda: self._download_from_url(url),
+                cache_dir=self.repo_files_cache_dir,
+            )
+        else:
+            content = self._download_from_url(url)
         config = cfg_parser.ConfigParser()
         if py_version < 3:
             sfile = io.StringIO(content)
@@ -338,7 +656,7 @@ class YumConfig:
 class YumRepoConfig(YumConfig):
     """Manages yum repo configuration files."""
 
-    def __init__(self, dir_path=None, environment_file=None):
+    def __init__(self, dir_path=None, environment_file=None, dry_run=False):
         conf_dir_path = dir_path or YUM_REPO_DIR
 
         super(YumRepoConfig, self).__init__(
@@ -346,7 +664,9 @@ class YumRepoConfig(YumConfig):
             dir_path=conf_dir_path,
             file_extension=YUM_REPO_FILE_EXTENSION,
             environment_file=environment_file,
+            dry_run=dry_run,
         )
+        self.repo_files_cache_dir = repos_utils.REPO_FILES_CACHE_DIR
 
     def update_section(
         self, section, set_dict=None, file_path=None, enabled=None, from_url=None
@@ -357,9 +677,10 @@ class YumRepoConfig(YumConfig):
         if enabled is not None:
             update_dict["enabled"] = "1" if enabled else "0"
         if update_dict:
-            super(YumRepoConfig, self).update_section(
+            return super(YumRepoConfig, self).update_section(
                 section, update_dict, file_path=file_path
             )
+        return False
 
     def add_section(self, section, add_dict, file_path, enabled=None, from_url=None):
         update_dict = self.get_options_from_url(from_url, section) if from_url else {}
@@ -367,7 +688,9 @@ class YumRepoConfig(YumConfig):
 
         if enabled is not None:
             update_dict["enabled"] = "1" if enabled else "0"
-        super(YumRepoConfig, self).add_section(section, update_dict, file_path)
+        return super(YumRepoConfig, self).add_section(
+            section, update_dict, file_path
+        )
 
     def add_or_update_section(
         self,
@@ -377,15 +700,30 @@ class YumRepoConfig(YumConfig):
         enabled=None,
         create_if_not_exists=True,
         from_url=None,
+        mirrors=None,
     ):
+        """Updates a section, or adds it if it doesn't exist.
+
+        :param mirrors: Dict with the options of resolve_mirrors, except
+            file_path, to replace the mirrorlist or metalink of the repo by
+            ranked baseurls in the same write. Mirrors aren't resolved if
+            None.
+        :return: True if any file was (or would be) changed.
+        """
         new_set_dict = self.get_options_from_url(from_url, section) if from_url else {}
         new_set_dict.update(set_dict)
         # make sure that it has a name
         if "name" not in new_set_dict.keys():
             new_set_dict["name"] = section
+        if mirrors is not None:
+            options = self._get_current_options(section, file_path)
+            options.update(new_set_dict)
+            new_set_dict.update(
+                self.get_mirror_updates({section: options}, **mirrors)[section]
+            )
         # Try to update existing repos
         try:
-            self.update_section(
+            return self.update_section(
                 section, set_dict=new_set_dict, file_path=file_path, enabled=enabled
             )
         except YumConfigNotFound:
@@ -393,12 +731,15 @@ class YumRepoConfig(YumConfig):
                 # there is nothing to do, we can't create a new config file
                 raise
             # Create a new file if it does not exists
-            with open(file_path, "w+"):
-                pass
-            self.add_section(section, new_set_dict, file_path, enabled=enabled)
+            self._create_config_file(file_path)
+            return self.add_section(
+                section, new_set_dict, file_path, enabled=enabled
+            )
 
         except YumConfigInvalidSection:
-            self.add_section(section, new_set_dict, file_path, enabled=enabled)
+            return self.add_section(
+                section, new_set_dict, file_path, enabled=enabled
+            )
 
     def add_or_update_all_sections_from_url(
         self,
@@ -407,8 +748,16 @@ class YumRepoConfig(YumConfig):
         set_dict=None,
         enabled=None,
         create_if_not_exists=True,
+        mirrors=None,
     ):
-        """Adds or updates all sections based on repo file from a URL."""
+        """Adds or updates all sections based on repo file from a URL.
+
+        :param mirrors: Dict with the options of resolve_mirrors, except
+            file_path, to replace the mirrorlist or metalink of the repos by
+            ranked baseurls in the same write. Mirrors aren't resolved if
+            None.
+        :return: True if any file was (or would be) changed.
+        """
         tmp_config = self.get_config_from_url(from_url)
         if file_path is None:
             # Build a file_path based on download url. If not compatible,
@@ -420,26 +769,187 @@ class YumRepoConfig(YumConfig):
                 # created with a different extension
                 file_path = os.path.join(self.dir_path, file_name)
 
+        update_dicts = {}
         for section in tmp_config.sections():
-            update_dict = dict(tmp_config.items(section))
-            update_dict.update(set_dict)
-            self.add_or_update_section(
-                section,
-                set_dict=update_dict,
-                file_path=file_path,
-                enabled=enabled,
-                create_if_not_exists=create_if_not_exists,
+            update_dicts[section] = dict(tmp_config.items(section))
+            update_dicts[section].update(set_dict)
+        if mirrors is not None:
+            for section, updates in self.get_mirror_updates(
+                update_dicts, **mirrors
+            ).items():
+                update_dicts[section].update(updates)
+
+        changed = False
+        for section in tmp_config.sections():
+            update_dict = update_dicts[section]
+            changed |= bool(
+                self.add_or_update_section(
+                    section,
+                    set_dict=update_dict,
+                    file_path=file_path,
+                    enabled=enabled,
+                    create_if_not_exists=create_if_not_exists,
+                )
             )
+        return changed
+
+    def _get_current_options(self, section, file_path=None):
+        """Returns the options of a section, or {} if it doesn't exist."""
+        files = [file_path] if file_path else self._get_config_files(section)
+        for file in files:
+            try:
+                config, file = self._read_config_file(file)
+            except YumConfigNotFound:
+                continue
+            if section in config.sections():
+                return get_section_options(config, section)
+        return {}
+
+    def get_mirror_updates(
+        self,
+        sections_options,
+        ttl=None,
+        verify=False,
+        max_mirrors=None,
+        timeout=None,
+        cache_file=None,
+    ):
+        """Returns the options replacing the mirror source of repos.
+
+        The mirrorlist or metalink of each repo is downloaded once and all
+        its mirrors are measured at the same time, unless the resolution
+        cached for the same source is less than 'ttl' seconds old. See
+        resolve_mirrors for the options.
+
+        :param sections_options: Dict in the format {section: options} with
+            the options of each repo, where its mirror source is found.
+        :return: A dict in the format {section: updates}, with the ranked
+            'baseurl' and an empty mirrorlist or metalink. Repos without a
+            mirror source have no updates.
+        """
+        ttl = YUM_REPO_MIRRORS_TTL if ttl is None else ttl
+        cache_file = cache_file or YUM_REPO_MIRRORS_CACHE_FILE
+        cache = load_mirrors_cache(cache_file)
+        repo_vars = get_repo_vars()
+
+        sections_updates = {}
+        cache_updated = False
+        for section, options in sorted(sections_options.items()):
+            sections_updates[section] = {}
+            entry = cache.get(section, {})
+            source_type, source = entry.get("type"), entry.get("source")
+            for opt in ("metalink", "mirrorlist"):
+                if options.get(opt):
+                    source_type = opt
+                    source = substitute_repo_vars(options[opt], repo_vars)
+                    break
+            if not source:
+                logging.warning(
+                    "Repo '%s' has no mirrorlist or metalink to be resolved.",
+                    section,
+                )
+                continue
+
+            if entry.get("source") != source or (
+                time.time() - entry.get("resolved_at", 0) >= ttl
+            ):
+                urls, hashes = get_mirror_urls(source, source_type, timeout=timeout)
+                base_urls = rank_mirrors(
+                    urls,
+                    timeout=timeout,
+                    hashes=hashes if verify else None,
+                    max_mirrors=max_mirrors,
+                )
+                if not base_urls:
+                    msg = "No reachable mirrors were found for repo {0}.".format(
+                        section
+                    )
+                    raise YumConfigUrlError(error_msg=msg)
+                entry = {
+                    "type": source_type,
+                    "source": source,
+                    "baseurls": base_urls,
+                    "resolved_at": time.time(),
+                }
+                cache[section] = entry
+                cache_updated = True
+            else:
+                logging.info("Using cached mirrors for repo '%s'.", section)
+
+            updates = {"baseurl": ",".join(entry["baseurls"])}
+            if options.get(source_type):
+                # An empty mirrorlist/metalink is ignored by dnf
+                updates[source_type] = ""
+            sections_updates[section] = updates
+
+        if cache_updated and not self.dry_run:
+            save_mirrors_cache(cache_file, cache)
+        return sections_updates
+
+    def resolve_mirrors(
+        self,
+        section,
+        file_path=None,
+        ttl=None,
+        verify=False,
+        max_mirrors=None,
+        timeout=None,
+        cache_file=None,
+    ):
+        """Replaces the mirrorlist or metalink of a repo by ranked baseurls.
+
+        The mirrorlist or metalink is downloaded once and all mirrors are
+        measured at the same time. The fastest ones are written as the repo
+        'baseurl', so dnf doesn't need to resolve and probe mirrors again on
+        every run. The original mirror source is kept in a cache file, and
+        the resolution is only refreshed after 'ttl' seconds.
+
+        :param section: Name of the repo to be resolved.
+        :param file_path: Path to the repo configuration file.
+        :param ttl: Time in seconds before a resolution needs to be refreshed.
+        :param verify: If True, discard metalink mirrors whose repomd.xml
+            doesn't match the metalink checksum.
+        :param max_mirrors: Maximum number of mirrors written to 'baseurl'.
+        :param timeout: Deadline in seconds for all mirrors to be measured.
+        :param cache_file: Path to the mirror resolution cache file.
+        :return: True if any file was (or would be) changed.
+        """
+        files = [file_path] if file_path else self._get_config_files(section)
+        if not files:
+            msg = (
+                "No configuration files were found for the provided "
+                "section {0}".format(section)
+            )
+            raise YumConfigNotFound(error_msg=msg)
+
+        changed = False
+        for file in files:
+            config, file = self._read_config_file(file, section=section)
+            updates = self.get_mirror_updates(
+                {section: get_section_options(config, section)},
+                ttl=ttl,
+                verify=verify,
+                max_mirrors=max_mirrors,
+                timeout=timeout,
+                cache_file=cache_file,
+            )[section]
+            changes = self._get_section_changes(config, section, updates)
+            changed |= self._save_changes(file, config, {section: changes})
+        return changed
 
 
 class YumGlobalConfig(YumConfig):
     """Manages yum global configuration file."""
 
-    def __init__(self, file_path=None, environment_file=None):
+    def __init__(self, file_path=None, environment_file=None, dry_run=False):
         self.conf_file_path = file_path or YUM_GLOBAL_CONFIG_FILE_PATH
         logging.info(
             "Using '%s' as yum global configuration " "file.", self.conf_file_path
         )
+        super(YumGlobalConfig, self).__init__(
+            environment_file=environment_file, dry_run=dry_run
+        )
+
         if file_path is not None:
             # validate user provided file path
             validated_file_path(file_path)
@@ -451,18 +961,15 @@ class YumGlobalConfig(YumConfig):
                 config = cfg_parser.ConfigParser()
                 config.read(self.conf_file_path)
                 config.add_section("main")
-                with open(self.conf_file_path, "w+") as file:
-                    config.write(file)
-
-        super(YumGlobalConfig, self).__init__(environment_file=environment_file)
+                self._create_config_file(self.conf_file_path, config)
 
     def update_section(self, section, set_dict, file_path=None):
-        super(YumGlobalConfig, self).update_section(
+        return super(YumGlobalConfig, self).update_section(
             section, set_dict, file_path=(file_path or self.conf_file_path)
         )
 
     def add_section(self, section, add_dict, file_path=None):
         add_file_path = file_path or self.conf_file_path
-        super(YumGlobalConfig, self).add_section(
+        return super(YumGlobalConfig, self).add_section(
             section, add_dict, add_file_path
         )
@@ -16,7 +16,12 @@ short_description: Resolve rdo named tag to commit, full and distro hashes
 
 version_added: "1.0.0"
 
-description: ""
+description:
+    - Resolves a named tag of a delorean server to its hashes.
+    - The action plugin of this module resolves the tag once on the
+      controller for all the hosts of the play, sharing the result between
+      the forks of the run, and only hands the result to each host. Use
+      I(resolve_on=target) to resolve it on each host instead.
 
 options:
     os_version:
@@ -43,6 +48,26 @@ options:
         required: false
         type: str
         default: https://trunk.rdoproject.org
+    queries:
+        description:
+            - List of queries resolved at once instead of the single query
+              given by the options above. Each query is a dict with any of
+              the os_version, release, component, tag and dlrn_url keys,
+              defaulting to the values of those options, and an optional
+              fact_name. Other keys are rejected. The full hash of a query
+              is set as a fact named fact_name on the host.
+        required: false
+        type: list
+        elements: dict
+    resolve_on:
+        description:
+            - Where the hashes are resolved. Each unique query is resolved
+              only once per run with C(controller). C(target) resolves them
+              on every host.
+        required: false
+        type: str
+        choices: [controller, target]
+        default: controller
 
 author:
     - Marios Andreou (@marios)
@@ -55,6 +80,16 @@ EXAMPLES = r"""
     release: victoria
     component: tripleo
     dlrn_url: 'https://foo.bar.baz'
+
+- name: Get the current-podified and podified-ci-testing hashes at once
+  repo_setup_get_hash:
+    os_version: centos9
+    release: master
+    queries:
+      - tag: current-podified
+        fact_name: dlrn_hash
+      - tag: podified-ci-testing
+        fact_name: dlrn_hash_newest
 """
 
 RETURN = r"""
@@ -83,6 +118,11 @@ dlrn_url:
     type: str
     returned: always
     sample: 'https://trunk.rdoproject.org/centos8-master/current-podified/delorean.repo.md5'  # noqa E501
+hashes:
+    description: The query and hashes of each query, in the same order.
+    type: list
+    elements: dict
+    returned: when queries is used
 """
 
 from ansible.module_utils.basic import AnsibleModule  # noqa: E402
@@ -103,6 +143,13 @@ def run_module():
         dlrn_url=dict(
             type="str", required=False, default="https://trunk.rdoproject.org"
         ),
+        queries=dict(type="list", elements="dict", required=False, default=None),
+        resolve_on=dict(
+            type="str",
+            required=False,
+            default="controller",
+            choices=["controller", "target"],
+        ),
     )
 
     module = AnsibleModule(argument_spec, supports_check_mode=False)
@@ -110,8 +157,28 @@ def run_module():
     try:
         from ansible_collections.repo_setup.repos.plugins.module_utils.repo_setup.get_hash.hash_info import (
             HashInfo,
+            resolve_hash_queries,
         )
 
+        if module.params.get("queries") is not None:
+            query_args = ("os_version", "release", "component", "tag", "dlrn_url")
+            for query in module.params["queries"]:
+                unknown = sorted(set(query) - set(query_args + ("fact_name",)))
+                if unknown:
+                    module.fail_json(
+                        msg="Unsupported keys in queries: %s" % ", ".join(unknown)
+                    )
+            defaults = dict((k, module.params.get(k)) for k in query_args)
+            queries = [dict(defaults, **query) for query in module.params["queries"]]
+            result["hashes"] = resolve_hash_queries(queries)
+            result["ansible_facts"] = dict(
+                (query["fact_name"], hashes["full_hash"])
+                for query, hashes in zip(queries, result["hashes"])
+                if query.get("fact_name")
+            )
+            result["success"] = True
+            module.exit_json(**result)
+
         os_version = module.params.get("os_version")
         release = module.params.get("release")
         component = module.params.get("component")
@@ -0,0 +1,196 @@
+#!/usr/bin/python
+# Copyright 2021 Red Hat, Inc.
+# GNU General Public License v3.0+ (see COPYING or
+# https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import absolute_import, division, print_function
+
+
+__metaclass__ = type
+
+
+DOCUMENTATION = r"""
+---
+module: repo_setup
+
+short_description: Install the repos necessary for OpenStack
+
+version_added: "1.0.0"
+
+description:
+    - Installs the same repo files as the repo-setup command. Repo files
+      with the same content are not written again.
+    - The action plugin of this module renders the repo files on the
+      controller, once per unique set of options and distro in the run, and
+      only sends the rendered files to each host. The distro of the host is
+      taken from its facts. Use I(resolve_on=target) to download and render
+      the repo files on each host instead.
+
+options:
+    repos:
+        description:
+            - List of repos to be installed, like current-podified, deps,
+              ceph or opstools. See repo-setup --help.
+        required: true
+        type: list
+        elements: str
+    distro:
+        description:
+            - Target distro, like centos9 or rhel9. If omitted, CentOS and
+              Fedora are detected from the host facts, and other distros,
+              like RHEL and UBI, on the host itself, so their repo files are
+              rendered on the host.
+        required: false
+        type: str
+    branch:
+        description: Target branch, the lowercase name of the OpenStack release
+        required: false
+        type: str
+        default: master
+    output_path:
+        description: Directory in which to save the selected repos
+        required: false
+        type: str
+        default: /etc/yum.repos.d
+    mirror:
+        description:
+            - Server from which to install base OS packages. Default value is
+              based on the distro.
+        required: false
+        type: str
+    rdo_mirror:
+        description: Server from which to install RDO packages
+        required: false
+        type: str
+        default: https://trunk.rdoproject.org
+    stream:
+        description: Enable stream support for CentOS repos
+        required: false
+        type: bool
+        default: true
+    pin:
+        description:
+            - Point the DLRN repos at the hashed path their named tag resolves
+              to, instead of the tag, and never expire their metadata.
+        required: false
+        type: bool
+        default: false
+    resolve_on:
+        description:
+            - Where the repo files are downloaded and rendered. With
+              C(controller) this is done once for all the hosts with the
+              same options and distro. UBI repo files are always rendered
+              on the target, from its distro repos.
+        required: false
+        type: str
+        choices: [controller, target]
+        default: controller
+    rendered_files:
+        description:
+            - Content of each repo file, by path, as rendered by the action
+              plugin. Not meant to be set in tasks.
+        required: false
+        type: dict
+
+author:
+    - Red Hat
+"""
+
+EXAMPLES = r"""
+- name: Install the current-podified repos
+  become: true
+  repo_setup.repos.repo_setup:
+    repos:
+      - current-podified
+      - ceph
+    branch: master
+"""
+
+RETURN = r"""
+repo_files:
+    description: All the repo files installed
+    type: list
+    returned: always
+written:
+    description: Repo files written because their content changed
+    type: list
+    returned: always
+removed:
+    description: Old repo files removed
+    type: list
+    returned: always
+timings:
+    description: Seconds spent on each step, like render, write and total
+    type: dict
+    returned: always
+"""
+
+import contextlib  # noqa: E402
+import io  # noqa: E402
+
+from ansible.module_utils.basic import AnsibleModule  # noqa: E402
+
+
+def run_module():
+    argument_spec = dict(
+        repos=dict(type="list", elements="str", required=True),
+        distro=dict(type="str", required=False, default=None),
+        branch=dict(type="str", required=False, default="master"),
+        output_path=dict(type="str", required=False, default="/etc/yum.repos.d"),
+        mirror=dict(type="str", required=False, default=None),
+        rdo_mirror=dict(
+            type="str", required=False, default="https://trunk.rdoproject.org"
+        ),
+        stream=dict(type="bool", required=False, default=True),
+        pin=dict(type="bool", required=False, default=False),
+        resolve_on=dict(
+            type="str",
+            required=False,
+            default="controller",
+            choices=["controller", "target"],
+        ),
+        rendered_files=dict(type="dict", required=False, default=None),
+    )
+
+    module = AnsibleModule(argument_spec, supports_check_mode=False)
+    output = io.StringIO()
+
+    try:
+        from ansible_collections.repo_setup.repos.plugins.module_utils.repo_setup import (
+            setup_repos,
+        )
+
+        # keep anything printed out of the module output
+        with contextlib.redirect_stdout(output):
+            result = setup_repos(
+                module.params["repos"],
+                distro=module.params["distro"],
+                branch=module.params["branch"],
+                output_path=module.params["output_path"],
+                mirror=module.params["mirror"],
+                rdo_mirror=module.params["rdo_mirror"],
+                stream=module.params["stream"],
+                rendered_files=module.params["rendered_files"],
+                pin=module.params["pin"],
+            )
+    except Exception as exc:
+        module.fail_json(
+            msg="Failed to install repos: %s" % exc,
+            stdout_lines=output.getvalue().splitlines(),
+        )
+
+    module.exit_json(
+        changed=result.changed,
+        repo_files=result.repo_files,
+        written=result.written,
+        removed=result.removed,
+        timings=result.timings,
+        stdout_lines=output.getvalue().splitlines(),
+    )
+
+
+def main():
+    run_module()
+
+
+if __name__ == "__main__":
+    main()
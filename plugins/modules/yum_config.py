@@ -18,6 +18,9 @@ version_added: "1.0.0"
 description:
     - Update specific options for different yum configuration files like
       yum repos, yum modules and yum global configuration.
+    - Configuration files are only written when at least one option changes.
+    - Check mode and diff mode are supported for all types, except for
+      'module'.
 
 options:
     type:
@@ -30,7 +33,8 @@ options:
         description:
           - Name of the repo or module to be changed. This options is
             mandatory only for 'repo' when no 'down_url' is provided. This
-            options is always mandatory for 'module' type.
+            options is mandatory for 'module' type when no 'modules' list
+            is provided, unless 'operation' is 'list'.
         type: str
     enabled:
         description:
@@ -48,8 +52,26 @@ options:
     operation:
         description:
           - Operation to be execute within a dnf module.
+          - C(list) doesn't change anything, it returns the available streams
+            and profiles, and their state, of all modules or of the module
+            'name'. Module metadata is read straight from the repos, without
+            starting dnf.
+          - C(prefetch) downloads the packages of the module profiles into
+            the dnf cache without installing them, so a later C(install)
+            finds them already cached.
         type: str
-        choices: [install, remove, reset]
+        choices: [install, remove, reset, list, prefetch]
+    background:
+        description:
+          - Run the C(prefetch) operation in a detached background process,
+            returning at once. Its progress is written to 'status_file'.
+        type: bool
+        default: false
+    status_file:
+        description:
+          - JSON file with the status of a background C(prefetch).
+          - Defaults to /var/cache/repo-setup/prefetch-status.json.
+        type: path
     stream:
         description:
           - Sets a module stream. This options is recommended when enabling a
@@ -60,6 +82,41 @@ options:
           - Sets a module profile. This options is recommended when installing
             a module that doesn't have a default profile.
         type: str
+    modules:
+        description:
+          - List of dnf modules to be changed in a single transaction, as an
+            alternative to 'name'. Packages of all modules are resolved and
+            downloaded at once.
+        type: list
+        elements: dict
+        suboptions:
+            name:
+                description:
+                  - Name of the module.
+                type: str
+                required: true
+            stream:
+                description:
+                  - Sets the module stream.
+                type: str
+            profile:
+                description:
+                  - Sets the module profile.
+                type: str
+            operation:
+                description:
+                  - Operation to be executed for this module.
+                type: str
+                choices: [enable, disable, install, remove, reset]
+                default: enable
+    cacheonly:
+        description:
+          - Use repo metadata from the dnf cache while it isn't expired, for
+            'module' operations, without checking the repos for newer
+            metadata. Metadata is downloaded if it isn't cached yet or
+            expired.
+        type: bool
+        default: false
     set_options:
         description:
           - Dictionary with options to be updated. All dictionary values must
@@ -91,16 +148,37 @@ options:
         choices: [centos-stream-8, centos-stream-9]
     arch:
         description:
-          - System architecture which the repos will be configure.
-        type: str
+          - System architectures which the repos will be configure. More
+            than one architecture requires 'output_dir_template'.
+        type: list
+        elements: str
         choices: [aarch64, ppc64le, x86_64]
-        default: x86_64
+        default: [x86_64]
+    output_dir_template:
+        description:
+          - Directory where the compose repos of each architecture are
+            written, with '{arch}' replaced by the architecture name. Only
+            used by 'enable-compose-repos' type.
+        type: path
     variants:
         description:
           - Repository variants that should be configured. If not provided,
             all available variants will be configured.
         type: list
         elements: str
+    for_packages:
+        description:
+          - List of package names. Only the variants that provide these
+            packages are configured. Mutually exclusive with 'variants'.
+        type: list
+        elements: str
+    incremental:
+        description:
+          - Keep the current repos of variants whose repodata didn't change
+            in the new compose. The variants that really changed are
+            returned in 'changed_variants'.
+        type: bool
+        default: false
     disable_conflicting_variants:
         description:
           - Disable all repos from the same directory that match variants'
@@ -113,6 +191,13 @@ options:
             successfully enabling all compose repos.
         type: list
         elements: str
+    prewarm:
+        description:
+          - Download the metadata of all changed and enabled repos in
+            parallel into the dnf cache. Only used by 'repo' and
+            'enable-compose-repos' types.
+        type: bool
+        default: false
 
 author:
     - Douglas Viroel (@viroel)
@@ -151,6 +236,37 @@ EXAMPLES = r"""
     operation: install
     profile: common
 
+- name: Enable and install several modules in a single transaction
+  become: true
+  become_user: root
+  repo_setup_yum_config:
+    type: module
+    modules:
+      - name: nodejs
+        stream: "18"
+      - name: nginx
+        operation: install
+        profile: common
+      - name: php
+        operation: reset
+
+- name: Check the available nodejs module streams
+  repo_setup_yum_config:
+    type: module
+    name: nodejs
+    operation: list
+  register: nodejs_streams
+
+- name: Download the nginx packages while other tasks run
+  become: true
+  repo_setup_yum_config:
+    type: module
+    name: nginx
+    stream: "1.20"
+    profile: common
+    operation: prefetch
+    background: true
+
 # Set yum global configuration options
 - name: Set yum global options
   become: true
@@ -175,9 +291,45 @@ EXAMPLES = r"""
     disable_repos:
       - /etc/yum.repos.d/CentOS-Linux-AppStream.repo
       - /etc/yum.repos.d/CentOS-Linux-BaseOS.repo
+
+- name: Generate CentOS Stream 9 compose repos for all image architectures
+  repo_setup_yum_config:
+    type: enable-compose-repos
+    compose_url: https://composes.stream.centos.org/production/latest-CentOS-Stream/compose/
+    centos_release: centos-stream-9
+    arch:
+      - x86_64
+      - aarch64
+      - ppc64le
+    output_dir_template: /srv/images/{arch}/yum.repos.d
 """
 
-RETURN = r""" # """
+RETURN = r"""
+changed:
+    description: True if any configuration file was (or would be) changed.
+    type: bool
+    returned: always
+changed_variants:
+    description: Compose variants, per architecture, whose repos were
+        enabled or updated to point to the new compose.
+    type: dict
+    returned: when type is 'enable-compose-repos'
+    sample: {"x86_64": ["AppStream", "BaseOS"]}
+modules:
+    description: Available module streams, with their profiles and state.
+    type: list
+    elements: dict
+    returned: when type is 'module' and operation is 'list'
+    sample: [{"name": "nodejs", "stream": "12", "profiles": ["common"],
+              "default": true, "default_profiles": ["common"],
+              "state": "enabled", "installed_profiles": ["common"]}]
+prefetch:
+    description: Number of packages and download size of the prefetched
+        install set. Not returned when running in background.
+    type: dict
+    returned: when type is 'module' and operation is 'prefetch'
+    sample: {"packages": 12, "download_size": 3145728}
+"""
 
 import os  # noqa: E402
 
@@ -202,9 +354,28 @@ def run_module():
         name=dict(type="str"),
         enabled=dict(type="bool", default=True),
         down_url=dict(type="str"),
-        operation=dict(type="str", choices=supported_module_operations),
+        operation=dict(
+            type="str", choices=supported_module_operations + ["list", "prefetch"]
+        ),
+        background=dict(type="bool", default=False),
+        status_file=dict(type="path"),
         stream=dict(type="str"),
         profile=dict(type="str"),
+        modules=dict(
+            type="list",
+            elements="dict",
+            options=dict(
+                name=dict(type="str", required=True),
+                stream=dict(type="str"),
+                profile=dict(type="str"),
+                operation=dict(
+                    type="str",
+                    choices=["enable", "disable"] + supported_module_operations,
+                    default="enable",
+                ),
+            ),
+        ),
+        cacheonly=dict(type="bool", default=False),
         set_options=dict(type="dict", default={}),
         file_path=dict(type="path"),
         dir_path=dict(type="path", default=const.YUM_REPO_DIR),
@@ -212,21 +383,28 @@ def run_module():
         compose_url=dict(type="str"),
         centos_release=dict(type="str", choices=const.COMPOSE_REPOS_RELEASES),
         arch=dict(
-            type="str", choices=const.COMPOSE_REPOS_SUPPORTED_ARCHS, default="x86_64"
+            type="list",
+            elements="str",
+            choices=const.COMPOSE_REPOS_SUPPORTED_ARCHS,
+            default=["x86_64"],
         ),
+        output_dir_template=dict(type="path"),
         variants=dict(type="list", default=[], elements="str"),
+        for_packages=dict(type="list", default=[], elements="str"),
+        incremental=dict(type="bool", default=False),
         disable_conflicting_variants=dict(type="bool", default=False),
         disable_repos=dict(type="list", default=[], elements="str"),
+        prewarm=dict(type="bool", default=False),
     )
     required_if_params = [
-        ["type", "module", ["name"]],
         ["type", "enable-compose-repos", ["compose_url"]],
     ]
 
     module = AnsibleModule(
         argument_spec=module_args,
         required_if=required_if_params,
-        supports_check_mode=False,
+        mutually_exclusive=[["variants", "for_packages"], ["name", "modules"]],
+        supports_check_mode=True,
     )
 
     operations_not_supp_in_py2 = ["module", "enable-compose-repos"]
@@ -247,6 +425,18 @@ def run_module():
         ).format(module.params["type"])
         module.fail_json(msg=msg)
 
+    if (
+        module.params["type"] == "module"
+        and module.params["operation"] != "list"
+        and not module.params["name"]
+        and not module.params["modules"]
+    ):
+        msg = (
+            "When using configuration type '{0}' you must provide a module "
+            "'name' or a list of 'modules'."
+        ).format(module.params["type"])
+        module.fail_json(msg=msg)
+
     distro, major_version, __ = utils.get_distro_info()
     dnf_module_support = False
     for min_distro_ver in const.DNF_MODULE_MINIMAL_DISTRO_VERSIONS:
@@ -263,6 +453,31 @@ def run_module():
         )
         module.fail_json(msg=msg)
 
+    if module.params["type"] == "module" and module.params["operation"] == "list":
+        try:
+            import ansible_collections.repo_setup.repos.plugins.module_utils.repo_setup.yum_config.module_query as module_query
+        except ImportError:
+            import repo_setup.yum_config.module_query as module_query
+
+        try:
+            query = module_query.DnfModuleQuery(
+                dir_path=module.params["dir_path"],
+                environment_file=module.params["environment_file"],
+                cacheonly=module.params["cacheonly"],
+            )
+            names = [module.params["name"]] if module.params["name"] else None
+            modules = query.list_modules(names=names)
+        except Exception as exc:
+            module.fail_json(msg=str(exc))
+        module.exit_json(changed=False, modules=modules)
+
+    if module.params["type"] == "module" and module.check_mode:
+        module.exit_json(
+            changed=False,
+            skipped=True,
+            msg="Check mode is not supported for configuration type 'module'.",
+        )
+
     # 'set_options' expects a dict that can also contains a list of values.
     # List of elements will be converted to a comma-separated list
     m_set_opts = module.params.get("set_options")
@@ -274,6 +489,8 @@ def run_module():
                 m_set_opts[k] = str(v)
 
     # Module execution
+    config_obj = None
+    prefetch_result = None
     try:
         try:
             import ansible_collections.repo_setup.repos.plugins.module_utils.repo_setup.yum_config.yum_config as cfg
@@ -284,6 +501,7 @@ def run_module():
             config_obj = cfg.YumRepoConfig(
                 dir_path=module.params["dir_path"],
                 environment_file=module.params["environment_file"],
+                dry_run=module.check_mode,
             )
             if module.params["name"]:
                 config_obj.add_or_update_section(
@@ -305,6 +523,7 @@ def run_module():
             config_obj = cfg.YumGlobalConfig(
                 file_path=module.params["file_path"],
                 environment_file=module.params["environment_file"],
+                dry_run=module.check_mode,
             )
             config_obj.update_section("main", m_set_opts)
 
@@ -315,17 +534,25 @@ def run_module():
                 import repo_setup.yum_config.compose_repos as repos
 
             # 1. Create compose repo config object
-            repo_obj = repos.YumComposeRepoConfig(
+            config_obj = repos.YumComposeRepoConfig(
                 module.params["compose_url"],
                 module.params["centos_release"],
                 dir_path=module.params["dir_path"],
                 arch=module.params["arch"],
                 environment_file=module.params["environment_file"],
+                dry_run=module.check_mode,
+                output_dir_template=module.params["output_dir_template"],
             )
             # 2. enable CentOS compose repos
-            repo_obj.enable_compose_repos(
-                variants=module.params["variants"],
+            variants = module.params["variants"]
+            if module.params["for_packages"]:
+                variants = config_obj.get_variants_for_packages(
+                    module.params["for_packages"]
+                )
+            config_obj.enable_compose_repos(
+                variants=variants,
                 override_repos=module.params["disable_conflicting_variants"],
+                incremental=module.params["incremental"],
             )
             # 3. Disable all repos provided in disable_repos
             for file in module.params["disable_repos"]:
@@ -338,7 +565,7 @@ def run_module():
                     valid_path = rel_path
 
                 if valid_path is not None:
-                    repo_obj.update_all_sections(valid_path, enabled=False)
+                    config_obj.update_all_sections(valid_path, enabled=False)
 
         elif module.params["type"] == "module":
             try:
@@ -346,39 +573,102 @@ def run_module():
             except ImportError:
                 import repo_setup.yum_config.dnf_manager as dnf_mgr
 
-            dnf_mod_mgr = dnf_mgr.DnfModuleManager()
-            if module.params["enabled"]:
-                dnf_mod_mgr.enable_module(
-                    module.params["name"],
-                    stream=module.params["stream"],
-                    profile=module.params["profile"],
-                )
+            if module.params["operation"] == "prefetch":
+                if module.params["modules"]:
+                    modules = [
+                        (m["name"], m["stream"], m["profile"])
+                        for m in module.params["modules"]
+                    ]
+                else:
+                    modules = [
+                        (
+                            module.params["name"],
+                            module.params["stream"],
+                            module.params["profile"],
+                        )
+                    ]
+                if module.params["background"]:
+                    dnf_mgr.prefetch_in_background(
+                        modules,
+                        status_file=module.params["status_file"],
+                        cacheonly=module.params["cacheonly"],
+                    )
+                else:
+                    prefetch_result = dnf_mgr.DnfModuleManager(
+                        cacheonly=module.params["cacheonly"]
+                    ).prefetch_modules(modules)
             else:
-                dnf_mod_mgr.disable_module(
-                    module.params["name"],
-                    stream=module.params["stream"],
-                    profile=module.params["profile"],
+                if module.params["modules"]:
+                    operations = [
+                        (m["operation"], m["name"], m["stream"], m["profile"])
+                        for m in module.params["modules"]
+                    ]
+                else:
+                    mod_args = (
+                        module.params["name"],
+                        module.params["stream"],
+                        module.params["profile"],
+                    )
+                    operations = [
+                        ("enable" if module.params["enabled"] else "disable",)
+                        + mod_args
+                    ]
+                    if module.params["operation"]:
+                        operations.append((module.params["operation"],) + mod_args)
+
+                dnf_mod_mgr = dnf_mgr.DnfModuleManager(
+                    cacheonly=module.params["cacheonly"]
                 )
-            if module.params["operation"]:
-                dnf_method = getattr(
-                    dnf_mod_mgr, module.params["operation"] + "_module"
-                )
-                dnf_method(
-                    module.params["name"],
-                    stream=module.params["stream"],
-                    profile=module.params["profile"],
+                dnf_mod_mgr.run_operations(operations)
+
+        if (
+            module.params["prewarm"]
+            and config_obj is not None
+            and module.params["type"] != "global"
+            and not module.check_mode
+        ):
+            try:
+                from ansible_collections.repo_setup.repos.plugins.module_utils.repo_setup.utils import (
+                    prewarm_dnf_cache,
                 )
+            except ImportError:
+                from repo_setup.utils import prewarm_dnf_cache
+
+            repo_ids = config_obj.get_changed_repos()
+            if repo_ids:
+                failed = prewarm_dnf_cache(repo_ids, reposdir=config_obj.dir_path)
+                if failed:
+                    module.warn(
+                        "Unable to pre-warm repos: {0}".format(", ".join(failed))
+                    )
 
     except Exception as exc:
         module.fail_json(msg=str(exc))
 
     # Successful module execution
+    if module.params["type"] == "module" and module.params["operation"] == "prefetch":
+        # prefetch only fills the dnf cache, nothing was configured
+        if prefetch_result is None:
+            module.exit_json(
+                changed=False, msg="Module packages are being prefetched."
+            )
+        module.exit_json(
+            changed=False,
+            msg="Module packages were prefetched.",
+            prefetch=prefetch_result,
+        )
+
     result = {
-        "changed": True,
+        # NOTE: dnf module operations don't report their changes yet
+        "changed": config_obj.changed if config_obj is not None else True,
         "msg": "Yum {0} configuration was successfully updated.".format(
             module.params["type"]
         ),
     }
+    if module.params["type"] == "enable-compose-repos":
+        result["changed_variants"] = config_obj.changed_variants
+    if config_obj is not None and module._diff:
+        result["diff"] = config_obj.get_diff()
     module.exit_json(**result)
 
 
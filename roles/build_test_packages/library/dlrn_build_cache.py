@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# see http://docs.ansible.com/developing_modules.html#common-module-boilerplate
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from ansible.module_utils.basic import *  # noqa
+
+
+DOCUMENTATION = '''
+---
+module: dlrn_build_cache
+version_added: "2.0"
+short_description: Local content-addressed cache of DLRN builds
+description:
+    - Caches the RPMs built by DLRN for a change, so the same change isn't
+      built again by the next jobs running on the same host.
+    - Builds are identified by a key computed from key_data, like the
+      project, refspec, distro and DLRN target. RPMs are stored once, by
+      their sha256, in the objects directory of the store and each build
+      key has a manifest with the RPMs it produced.
+options:
+  state:
+    description:
+      - C(lookup) links the RPMs of a cached build into dest_dir.
+        C(store) adds the RPMs built after newer_than in rpms_dir to the
+        cache.
+    required: True
+    choices: [lookup, store]
+  store_dir:
+    description:
+      - Directory of the RPM store.
+    required: True
+  key_data:
+    description:
+      - Dictionary with all the inputs of the build.
+    required: True
+  dest_dir:
+    description:
+      - Directory where the cached RPMs are linked to on a hit. Required
+        for C(lookup).
+    required: False
+  rpms_dir:
+    description:
+      - Directory, searched recursively, with the built RPMs. Required for
+        C(store).
+    required: False
+  newer_than:
+    description:
+      - Only RPMs modified after this epoch timestamp are stored, as
+        returned by C(lookup) in 'started'.
+    required: False
+    default: 0
+'''
+
+EXAMPLES = '''
+- dlrn_build_cache:
+    state: lookup
+    store_dir: /home/zuul/.cache/dlrn-builds
+    key_data:
+      project: openstack/nova
+      refspec: refs/changes/01/123401/3
+      distro: rpm-master
+      dlrn_target: centos9-stream
+    dest_dir: /home/zuul/DLRN/data/repos/build-cache
+  register: build_cache
+
+- dlrn_build_cache:
+    state: store
+    store_dir: /home/zuul/.cache/dlrn-builds
+    key_data: "{{ build_cache.key_data }}"
+    rpms_dir: /home/zuul/DLRN/data/repos
+    newer_than: "{{ build_cache.started }}"
+  when: not build_cache.hit
+'''
+
+
+def get_build_key(key_data):
+    '''Return the key of a build, a hash of all its inputs.'''
+    return hashlib.sha256(json.dumps(key_data, sort_keys=True).encode(
+        'utf-8')).hexdigest()
+
+
+def file_sha256(path):
+    '''Return the sha256 of a file.'''
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_object_path(store_dir, sha256):
+    '''Return the path of an RPM in the store.'''
+    return os.path.join(store_dir, 'objects', sha256[:2], sha256)
+
+
+def get_manifest_path(store_dir, key):
+    '''Return the path of the manifest of a build.'''
+    return os.path.join(store_dir, 'builds', key + '.json')
+
+
+def makedirs(path):
+    '''Create a directory, even if another job is creating it too.'''
+    if not os.path.isdir(path):
+        try:
+            os.makedirs(path)
+        except OSError:
+            if not os.path.isdir(path):
+                raise
+
+
+def link_or_copy(src, dest):
+    '''Hard link a file, or copy it when on another filesystem.'''
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copy2(src, dest)
+
+
+def write_atomic(path, write):
+    '''Write a file, so other jobs never see it partially written.'''
+    makedirs(os.path.dirname(path))
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.rename(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+def lookup_build(store_dir, key_data, dest_dir):
+    '''Link the RPMs of a cached build into dest_dir.
+
+    Returns the list of linked RPMs, or None if the build is not cached.
+    '''
+    key = get_build_key(key_data)
+    try:
+        with open(get_manifest_path(store_dir, key)) as manifest_file:
+            manifest = json.load(manifest_file)
+    except (IOError, OSError, ValueError):
+        return None
+    objects = [(rpm, get_object_path(store_dir, rpm['sha256']))
+               for rpm in manifest['rpms']]
+    if not all(os.path.isfile(path) for __, path in objects):
+        # objects were removed from the store, the build must be redone
+        return None
+    build_dir = os.path.join(dest_dir, key)
+    if os.path.isdir(build_dir):
+        shutil.rmtree(build_dir)
+    makedirs(build_dir)
+    for rpm, path in objects:
+        link_or_copy(path, os.path.join(build_dir, rpm['name']))
+    return [rpm['name'] for rpm in manifest['rpms']]
+
+
+def store_build(store_dir, key_data, rpms_dir, newer_than=0):
+    '''Add the RPMs built after newer_than to the store.
+
+    Returns the list of stored RPMs.
+    '''
+    rpms = []
+    for root, __, files in os.walk(rpms_dir):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            if name.endswith('.rpm') and os.path.getmtime(path) >= newer_than:
+                rpms.append(path)
+    if not rpms:
+        return []
+
+    manifest = {'key_data': key_data, 'created': time.time(), 'rpms': []}
+    for path in rpms:
+        sha256 = file_sha256(path)
+        object_path = get_object_path(store_dir, sha256)
+        if not os.path.isfile(object_path):
+            with open(path, 'rb') as rpm_file:
+                write_atomic(object_path,
+                             lambda f: shutil.copyfileobj(rpm_file, f))
+        manifest['rpms'].append({'name': os.path.basename(path),
+                                 'sha256': sha256})
+    write_atomic(get_manifest_path(store_dir, get_build_key(key_data)),
+                 lambda f: f.write(json.dumps(manifest).encode('utf-8')))
+    return [rpm['name'] for rpm in manifest['rpms']]
+
+
+def main():
+    module = AnsibleModule(  # noqa
+        argument_spec=dict(
+            state=dict(required=True, choices=['lookup', 'store']),
+            store_dir=dict(required=True, type='path'),
+            key_data=dict(required=True, type='dict'),
+            dest_dir=dict(required=False, default=None, type='path'),
+            rpms_dir=dict(required=False, default=None, type='path'),
+            newer_than=dict(required=False, default=0, type='float')
+        ),
+        required_if=[['state', 'lookup', ['dest_dir']],
+                     ['state', 'store', ['rpms_dir']]]
+    )
+    key_data = module.params['key_data']
+    result = {'key': get_build_key(key_data), 'key_data': key_data}
+    if module.params['state'] == 'lookup':
+        result['started'] = time.time()
+        rpms = lookup_build(module.params['store_dir'], key_data,
+                            module.params['dest_dir'])
+        result.update(changed=rpms is not None, hit=rpms is not None,
+                      rpms=rpms or [])
+    else:
+        rpms = store_build(module.params['store_dir'], key_data,
+                           module.params['rpms_dir'],
+                           newer_than=module.params['newer_than'])
+        result.update(changed=bool(rpms), rpms=rpms)
+    module.exit_json(**result)
+
+
+if __name__ == "__main__":
+    main()
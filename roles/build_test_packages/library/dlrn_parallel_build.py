@@ -0,0 +1,499 @@
+#!/usr/bin/env python
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# see http://docs.ansible.com/developing_modules.html#common-module-boilerplate
+import configparser
+import glob
+import os
+import re
+import shutil
+import subprocess
+from multiprocessing.pool import ThreadPool
+
+from ansible.module_utils.basic import *  # noqa
+
+
+DOCUMENTATION = '''
+---
+module: dlrn_parallel_build
+version_added: "2.0"
+short_description: Builds independent DLRN packages in parallel
+description:
+    - Builds a list of DLRN packages, like 'dlrn --order' does, but packages
+      that don't depend on each other are built at the same time.
+    - The dependencies between the packages come from the BuildRequires of
+      their specs. Specs are taken from the distgit checked out in the DLRN
+      data dir or from the distgit URL found in rdoinfo. Packages depending
+      on each other, directly or not, are built together with 'dlrn --order'
+      by the same worker.
+    - The packages are grouped by connected dependencies, not scheduled by
+      dependency level, as the RPMs built by a worker are only merged once
+      all workers are done. Packages sharing a dependency, like two packages
+      requiring the same library, are therefore built one after the other by
+      the same worker, even if they don't depend on each other.
+    - Each worker has its own DLRN data dir, database and mock root. The RPMs
+      built by all workers are merged into a single directory.
+    - All packages are built by a single worker when the spec of any of them
+      can't be found, as the dependencies are unknown.
+options:
+  packages:
+    description:
+      - List of DLRN package names to be built.
+    required: True
+  dlrn_dir:
+    description:
+      - Path to the DLRN checkout, with the projects.ini config file, the
+        scripts dir, the rdoinfo repo and the sources of the packages in its
+        data dir.
+    required: True
+  dlrn_cmd:
+    description:
+      - Path to the dlrn command.
+    required: False
+    default: dlrn
+  info_repo:
+    description:
+      - The rdoinfo repo, relative to dlrn_dir, passed to dlrn --info-repo.
+    required: True
+  distgits:
+    description:
+      - Distgit URLs of the packages, as returned by rdoinfo_pkg_map.
+    required: False
+    default: {}
+  distgit_branch:
+    description:
+      - Branch of the distgits with the specs, like the DLRN distro.
+    required: False
+    default: rpm-master
+  merge_dir:
+    description:
+      - Directory where the RPMs built by all the workers are merged.
+    required: True
+  log_file:
+    description:
+      - File where the output of every worker is appended once all of them
+        finished.
+    required: False
+  workers:
+    description:
+      - Maximum number of workers. The number of workers is also limited by
+        the CPUs and memory available, see build_cpus and build_memory.
+    required: False
+    default: 4
+  build_cpus:
+    description:
+      - Number of CPUs used by each worker.
+    required: False
+    default: 2
+  build_memory:
+    description:
+      - Memory, in MB, used by each worker.
+    required: False
+    default: 4096
+'''
+
+EXAMPLES = '''
+- dlrn_parallel_build:
+    packages:
+      - openstack-tripleo-common
+      - python-tripleoclient
+      - openstack-nova
+    dlrn_dir: /home/zuul/DLRN
+    dlrn_cmd: /home/zuul/dlrn-venv/bin/dlrn
+    info_repo: rdoinfo
+    distgits: "{{ rdoinfo_map.distgits }}"
+    distgit_branch: rpm-master
+    merge_dir: /home/zuul/DLRN/data/repos/parallel-build
+    log_file: /home/zuul/dlrn.log
+'''
+
+RETURN = '''
+groups:
+    description: Packages built by each worker, with the result of the build.
+    type: list
+    sample: [{"packages": ["openstack-tripleo-common",
+                           "python-tripleoclient"],
+              "rc": 0, "log": "/home/zuul/DLRN/workers/worker-0/dlrn.log"}]
+'''
+
+# dlrn exit code when the build must be retried
+DLRN_RETRY = 2
+# macros that can be used in Name, BuildRequires and %package lines
+MACRO_RE = re.compile(r'%(?:\{\??([\w]+)\}|([\w]+))')
+VERSION_OPERATORS = ['<', '<=', '=', '==', '>=', '>']
+
+
+def expand_macros(value, macros):
+    '''Expand the macros of a spec value, leaving unknown macros as is.'''
+    for __ in range(3):
+        expanded = MACRO_RE.sub(
+            lambda m: macros.get(m.group(1) or m.group(2), m.group(0)), value)
+        if expanded == value:
+            break
+        value = expanded
+    return value
+
+
+def parse_deps(value):
+    '''Return the names in a list of dependencies.
+
+    'python3-foo >= 1.0, bar' depends on python3-foo and bar.
+    '''
+    names = []
+    tokens = iter(value.replace(',', ' ').split())
+    for token in tokens:
+        if token in VERSION_OPERATORS:
+            # skip the version
+            next(tokens, None)
+        else:
+            names.append(token)
+    return names
+
+
+def parse_spec(spec_path):
+    '''Return the names provided and the BuildRequires of a spec.
+
+    Conditionals are ignored, so every BuildRequires of the spec is
+    returned, which at worst makes a package depend on too many others.
+    '''
+    macros = {}
+    provides = set()
+    requires = set()
+    name = None
+    with open(spec_path) as spec_file:
+        for line in spec_file:
+            line = line.strip()
+            match = re.match(r'%(?:global|define)\s+(\w+)\s+(.*)', line)
+            if match:
+                macros[match.group(1)] = expand_macros(match.group(2), macros)
+                continue
+            match = re.match(r'(Name|BuildRequires|Provides)\s*:\s*(.*)',
+                             line, re.IGNORECASE)
+            if match:
+                tag = match.group(1).lower()
+                value = expand_macros(match.group(2), macros)
+                if tag == 'name':
+                    name = value.strip()
+                    macros['name'] = name
+                    provides.add(name)
+                    continue
+                (provides if tag == 'provides' else requires).update(
+                    parse_deps(value))
+                continue
+            match = re.match(r'%package\s+(-n\s+)?(\S+)', line)
+            if match:
+                subpackage = expand_macros(match.group(2), macros)
+                if match.group(1):
+                    provides.add(subpackage)
+                elif name:
+                    provides.add('-'.join([name, subpackage]))
+    return provides, requires
+
+
+def run_git(args, cwd=None):
+    '''Run a git command, returning its exit code.'''
+    with open(os.devnull, 'w') as devnull:
+        return subprocess.call(['git'] + args, cwd=cwd, stdout=devnull,
+                               stderr=devnull)
+
+
+def find_spec(package, dlrn_dir, work_dir, distgits, distgit_branch):
+    '''Return the path of the spec of a package, or None if not found.
+
+    The distgit checked out in the DLRN data dir, for changes of the distgit,
+    is used first. Otherwise the distgit branch is cloned from rdoinfo.
+    '''
+    specs = glob.glob(os.path.join(dlrn_dir, 'data', package + '_distro',
+                                   '*.spec'))
+    if specs:
+        return specs[0]
+    urls = distgits.get(package) or {}
+    keys = ['distgit', 'master-distgit']
+    if distgit_branch == 'rpm-master':
+        keys.reverse()
+    for key in keys:
+        if not urls.get(key):
+            continue
+        dest = os.path.join(work_dir, 'specs', package)
+        shutil.rmtree(dest, ignore_errors=True)
+        if run_git(['clone', '--quiet', '--depth', '1', '--branch',
+                    distgit_branch, urls[key], dest]) == 0:
+            specs = glob.glob(os.path.join(dest, '*.spec'))
+            if specs:
+                return specs[0]
+    return None
+
+
+def get_build_groups(dependencies):
+    '''Group the packages that depend on each other, directly or not.
+
+    dependencies has the packages each package depends on. Each group is
+    sorted so that packages come after their dependencies, and the largest
+    groups come first, so they are started first.
+
+    Groups are the connected components of the dependency graph, ignoring
+    the direction, because a worker can't use the RPMs built by the others.
+    Packages sharing a dependency end up in the same group and are built
+    one after the other, even if they don't depend on each other.
+    '''
+    groups = []
+    seen = set()
+    for package in dependencies:
+        if package in seen:
+            continue
+        # connected component of the package, ignoring the direction
+        component = set()
+        pending = [package]
+        while pending:
+            current = pending.pop()
+            if current in component:
+                continue
+            component.add(current)
+            pending.extend(dependencies[current])
+            pending.extend(other for other, deps in dependencies.items()
+                           if current in deps)
+        seen.update(component)
+
+        ordered = []
+        remaining = [p for p in dependencies if p in component]
+        while remaining:
+            ready = [p for p in remaining
+                     if dependencies[p].issubset(ordered)]
+            # a dependency cycle otherwise, dlrn --order handles it
+            ready = ready or remaining
+            ordered.extend(ready)
+            remaining = [p for p in remaining if p not in ready]
+        groups.append(ordered)
+    groups.sort(key=len, reverse=True)
+    return groups
+
+
+def get_dependencies(packages, specs):
+    '''Return the packages each package depends on, from their specs.'''
+    provided_by = {}
+    for package in packages:
+        for name in specs[package][0]:
+            provided_by.setdefault(name, package)
+    dependencies = {}
+    for package in packages:
+        dependencies[package] = set(provided_by[name]
+                                    for name in specs[package][1]
+                                    if name in provided_by)
+        dependencies[package].discard(package)
+    return dependencies
+
+
+def get_max_workers(workers, build_cpus, build_memory):
+    '''Return the number of workers that fit in the CPUs and memory.'''
+    max_workers = min(workers, max(os.cpu_count() // build_cpus, 1))
+    try:
+        with open('/proc/meminfo') as meminfo:
+            for line in meminfo:
+                if line.startswith('MemAvailable:'):
+                    memory = int(line.split()[1]) // 1024
+                    max_workers = min(max_workers,
+                                      max(memory // build_memory, 1))
+                    break
+    except (IOError, OSError, ValueError):
+        pass
+    return max(max_workers, 1)
+
+
+def setup_worker(dlrn_dir, worker_dir, packages, config_file='projects.ini'):
+    '''Create the DLRN data dir, scripts and config of a worker.
+
+    Returns the path of the config file of the worker.
+    '''
+    data_dir = os.path.join(worker_dir, 'data')
+    os.makedirs(data_dir)
+    # sources cloned by the role for the packages built by this worker
+    for package in packages:
+        for name in [package, package + '_distro']:
+            source = os.path.join(dlrn_dir, 'data', name)
+            if os.path.exists(source):
+                os.symlink(source, os.path.join(data_dir, name))
+
+    # mock can't use the same root for builds running at the same time
+    scripts_dir = os.path.join(worker_dir, 'scripts')
+    shutil.copytree(os.path.join(dlrn_dir, 'scripts'), scripts_dir)
+    for mock_config in glob.glob(os.path.join(scripts_dir, '*.cfg')):
+        with open(mock_config, 'a') as mock_file:
+            mock_file.write(''.join([
+                "\nconfig_opts['root'] = config_opts['root'] + '-",
+                os.path.basename(worker_dir), "'\n"]))
+
+    config = configparser.RawConfigParser()
+    config.optionxform = str
+    config.read(os.path.join(dlrn_dir, config_file))
+    config.set('DEFAULT', 'datadir', data_dir)
+    config.set('DEFAULT', 'scriptsdir', scripts_dir)
+    config.set('DEFAULT', 'database_connection', ''.join([
+        'sqlite:///', os.path.join(worker_dir, 'commits.sqlite')]))
+    worker_config = os.path.join(worker_dir, config_file)
+    with open(worker_config, 'w') as config_fd:
+        config.write(config_fd)
+    return worker_config
+
+
+def run_worker(dlrn_cmd, dlrn_dir, worker_dir, worker_config, packages,
+               info_repo):
+    '''Build a group of packages with dlrn, like run_dlrn.sh does.
+
+    When dlrn_cmd is in a virtualenv, the virtualenv is activated as
+    run_dlrn.sh does, for the commands run by dlrn to be found.
+    '''
+    env = os.environ.copy()
+    bin_dir = os.path.dirname(dlrn_cmd)
+    if bin_dir:
+        env['PATH'] = os.pathsep.join([bin_dir, env.get('PATH', os.defpath)])
+        env['VIRTUAL_ENV'] = os.path.dirname(os.path.abspath(bin_dir))
+        env.pop('PYTHONHOME', None)
+    args = [dlrn_cmd, '--config-file', worker_config, '--head-only']
+    for package in packages:
+        args.extend(['--package-name', package])
+    args.extend(['--local', '--info-repo', info_repo])
+    if len(packages) > 1:
+        args.append('--order')
+    args.append('--dev')
+    log_path = os.path.join(worker_dir, 'dlrn.log')
+    with open(log_path, 'a') as log_file:
+        while True:
+            rc = subprocess.call(args, cwd=dlrn_dir, env=env,
+                                 stdout=log_file, stderr=subprocess.STDOUT)
+            if rc != DLRN_RETRY:
+                break
+    return rc, log_path
+
+
+def link_or_copy(src, dest):
+    '''Hard link a file, or copy it when on another filesystem.'''
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copy2(src, dest)
+
+
+def merge_rpms(worker_dir, merge_dir):
+    '''Merge the RPMs built by a worker into merge_dir.'''
+    rpms = []
+    for root, __, files in os.walk(os.path.join(worker_dir, 'data',
+                                                'repos')):
+        for name in sorted(files):
+            if name.endswith('.rpm'):
+                dest = os.path.join(merge_dir, name)
+                if os.path.exists(dest):
+                    os.remove(dest)
+                link_or_copy(os.path.join(root, name), dest)
+                rpms.append(name)
+    return rpms
+
+
+def build_packages(packages, dlrn_dir, info_repo, merge_dir, dlrn_cmd='dlrn',
+                   distgits=None, distgit_branch='rpm-master', log_file=None,
+                   workers=4, build_cpus=2, build_memory=4096):
+    '''Build the packages with parallel DLRN workers.
+
+    Returns the result of each group of packages and a message explaining
+    why all packages were built together, if they were.
+    '''
+    work_dir = os.path.join(dlrn_dir, 'workers')
+    shutil.rmtree(work_dir, ignore_errors=True)
+    os.makedirs(work_dir)
+
+    specs = {}
+    msg = ''
+    for package in packages:
+        spec_path = find_spec(package, dlrn_dir, work_dir, distgits or {},
+                              distgit_branch)
+        if not spec_path:
+            msg = ''.join(['spec of ', package, ' not found, building all',
+                           ' packages together'])
+            break
+        specs[package] = parse_spec(spec_path)
+    if msg:
+        groups = [list(packages)]
+    else:
+        groups = get_build_groups(get_dependencies(packages, specs))
+
+    worker_configs = []
+    for index, group in enumerate(groups):
+        worker_dir = os.path.join(work_dir, 'worker-%d' % index)
+        worker_configs.append(
+            (worker_dir, setup_worker(dlrn_dir, worker_dir, group)))
+
+    def build_group(index):
+        worker_dir, worker_config = worker_configs[index]
+        rc, log_path = run_worker(dlrn_cmd, dlrn_dir, worker_dir,
+                                  worker_config, groups[index], info_repo)
+        return {'packages': groups[index], 'rc': rc, 'log': log_path}
+
+    pool = ThreadPool(min(get_max_workers(workers, build_cpus, build_memory),
+                          len(groups)))
+    try:
+        results = pool.map(build_group, range(len(groups)))
+    finally:
+        pool.close()
+        pool.join()
+
+    if not os.path.isdir(merge_dir):
+        os.makedirs(merge_dir)
+    for result, (worker_dir, __) in zip(results, worker_configs):
+        result['rpms'] = merge_rpms(worker_dir, merge_dir)
+        if log_file:
+            with open(log_file, 'a') as log_fd, \
+                    open(result['log']) as worker_log:
+                log_fd.write(''.join(['==== ', ' '.join(result['packages']),
+                                      ' ====\n']))
+                shutil.copyfileobj(worker_log, log_fd)
+    return results, msg
+
+
+def main():
+    module = AnsibleModule(  # noqa
+        argument_spec=dict(
+            packages=dict(required=True, type='list', elements='str'),
+            dlrn_dir=dict(required=True, type='path'),
+            dlrn_cmd=dict(required=False, default='dlrn', type='str'),
+            info_repo=dict(required=True, type='str'),
+            distgits=dict(required=False, default={}, type='dict'),
+            distgit_branch=dict(required=False, default='rpm-master',
+                                type='str'),
+            merge_dir=dict(required=True, type='path'),
+            log_file=dict(required=False, default=None, type='path'),
+            workers=dict(required=False, default=4, type='int'),
+            build_cpus=dict(required=False, default=2, type='int'),
+            build_memory=dict(required=False, default=4096, type='int')
+        )
+    )
+    results, msg = build_packages(
+        module.params['packages'],
+        module.params['dlrn_dir'],
+        module.params['info_repo'],
+        module.params['merge_dir'],
+        dlrn_cmd=module.params['dlrn_cmd'],
+        distgits=module.params['distgits'],
+        distgit_branch=module.params['distgit_branch'],
+        log_file=module.params['log_file'],
+        workers=module.params['workers'],
+        build_cpus=module.params['build_cpus'],
+        build_memory=module.params['build_memory'])
+    failed = [r for r in results if r['rc'] != 0]
+    if failed:
+        msg = ''.join(['build of ', ', '.join(
+            ' '.join(r['packages']) for r in failed), ' failed'])
+    module.exit_json(changed=True, failed=bool(failed), groups=results,
+                     msg=msg)
+
+
+if __name__ == "__main__":
+    main()
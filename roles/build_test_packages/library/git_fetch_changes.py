@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# see http://docs.ansible.com/developing_modules.html#common-module-boilerplate
+import fcntl
+import os
+import re
+import shutil
+import subprocess
+from multiprocessing.pool import ThreadPool
+
+from ansible.module_utils.basic import *  # noqa
+
+
+DOCUMENTATION = '''
+---
+module: git_fetch_changes
+version_added: "2.0"
+short_description: Fetches the source of several Gerrit changes in parallel
+description:
+    - Fetches the source of a list of Gerrit changes, like the
+      jenkins_change_list returned by jenkins_deps, at the same time.
+      Each project is cloned as the git module would do, but objects are
+      taken from a persistent bare reference repo of the project, so only
+      the objects that are not there yet are downloaded.
+options:
+  changes:
+    description:
+      - List of changes to be fetched, each one with 'host', 'project',
+        'branch' and 'refspec' keys. An optional 'dest' key overrides the
+        destination directory of the change.
+    required: True
+  dest_dir:
+    description:
+      - Directory where each change is checked out, in a 'dest_dir/project'
+        subdirectory. Projects already cloned there are not fetched again.
+    required: True
+  reference_dir:
+    description:
+      - Directory with the bare reference repos, one per project, kept
+        between runs and shared by all jobs running on the same host. Repos
+        are cloned without reference if omitted.
+    required: False
+  dissociate:
+    description:
+      - Copy the objects borrowed from the reference repos, so the clones
+        keep working if the reference repos are removed. This repacks the
+        whole object store of each clone, so it's only worth it when the
+        reference repos are not kept between runs.
+    required: False
+    default: False
+  workers:
+    description:
+      - Maximum number of changes fetched at the same time.
+    required: False
+    default: 4
+'''
+
+EXAMPLES = '''
+- git_fetch_changes:
+    changes: "{{ jenkins_change_list }}"
+    dest_dir: /home/zuul/artg_repos
+    reference_dir: /home/zuul/.cache/git-reference
+'''
+
+
+def run_git(args, cwd=None):
+    '''Run a git command, returning its exit code and output.'''
+    proc = subprocess.Popen(['git'] + args, cwd=cwd, stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT)
+    output = proc.communicate()[0]
+    return proc.returncode, output.decode('utf-8', 'replace').strip()
+
+
+def get_reference_path(reference_dir, change):
+    '''Return the path of the bare reference repo of a change's project.'''
+    host = re.sub(r'^[a-z]+://', '', change['host']).strip('/')
+    return os.path.join(reference_dir, host, change['project'] + '.git')
+
+
+def update_reference(reference_path, url, branch):
+    '''Create or update the bare reference repo of a project.
+
+    Only the branch of the change and the tags are fetched. Jobs running at
+    the same time share the repo through a lock file.
+    '''
+    parent_dir = os.path.dirname(reference_path)
+    if not os.path.isdir(parent_dir):
+        try:
+            os.makedirs(parent_dir)
+        except OSError:
+            # created at the same time by another job
+            if not os.path.isdir(parent_dir):
+                raise
+    with open(reference_path + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        if not os.path.isdir(reference_path):
+            rc, output = run_git(['init', '--quiet', '--bare',
+                                  reference_path])
+            if rc != 0:
+                return rc, output
+        return run_git(['fetch', '--quiet', url,
+                        ''.join(['+refs/heads/', branch, ':refs/heads/',
+                                 branch]),
+                        '+refs/tags/*:refs/tags/*'],
+                       cwd=reference_path)
+
+
+def fetch_change(change, dest_dir, reference_dir=None, dissociate=False):
+    '''Fetch the source of a single change.
+
+    The result is the same as cloning the project with the git module using
+    the change refspec and the 'FETCH_HEAD' version: the branch of the
+    change and the tags are available and the change is checked out.
+    '''
+    url = '/'.join([change['host'].rstrip('/'), change['project']])
+    dest = get_dest(change, dest_dir)
+    result = {'project': change['project'],
+              'refspec': change['refspec'],
+              'dest': dest,
+              'changed': False}
+    if os.path.isdir(os.path.join(dest, '.git')):
+        result['msg'] = 'already cloned'
+        return result
+
+    reference_path = None
+    if reference_dir:
+        reference_path = get_reference_path(reference_dir, change)
+        rc, output = update_reference(reference_path, url, change['branch'])
+        if rc != 0:
+            result.update(failed=True, msg=''.join([
+                'failed to update reference repo ', reference_path, ': ',
+                output]))
+            return result
+
+    rc, output = run_git(['init', '--quiet', dest])
+    if rc != 0:
+        result.update(failed=True, msg=''.join(['git init failed: ', output]))
+        return result
+    alternates = os.path.join(dest, '.git', 'objects', 'info', 'alternates')
+    if reference_path:
+        # same as 'git clone --reference'
+        with open(alternates, 'w') as alternates_file:
+            alternates_file.write(''.join([
+                os.path.join(reference_path, 'objects'), '\n']))
+
+    commands = [
+        ['remote', 'add', 'origin', url],
+        # only the change branch and the tags, not every branch of the project
+        ['fetch', '--quiet', 'origin',
+         ''.join(['+refs/heads/', change['branch'], ':refs/remotes/origin/',
+                  change['branch']]),
+         '+refs/tags/*:refs/tags/*'],
+        ['fetch', '--quiet', 'origin', change['refspec']],
+        ['checkout', '--quiet', 'FETCH_HEAD'],
+    ]
+    if reference_path and dissociate:
+        # same as 'git clone --dissociate'
+        commands.append(['repack', '-a', '-d', '-q'])
+    for args in commands:
+        rc, output = run_git(args, cwd=dest)
+        if rc != 0:
+            # don't leave a broken clone that would be reused by the next run
+            shutil.rmtree(dest, ignore_errors=True)
+            result.update(failed=True, msg=''.join([
+                'git ', ' '.join(args), ' failed: ', output]))
+            return result
+    if reference_path and dissociate:
+        os.remove(alternates)
+    result.update(changed=True, msg='cloned')
+    return result
+
+
+def get_dest(change, dest_dir):
+    '''Return the directory where a change is cloned.'''
+    return change.get('dest') or os.path.join(dest_dir, change['project'])
+
+
+def fetch_changes(changes, dest_dir, reference_dir=None, dissociate=False,
+                  workers=4):
+    '''Fetch the source of several changes at the same time.
+
+    Changes cloned in the same directory, like two changes of the same
+    project, are fetched one after the other by the same worker, so the
+    first one cloned is reused by the others, as when fetched serially.
+
+    Returns the result of each change, in the same order.
+    '''
+    if not changes:
+        return []
+    groups = []
+    dest_groups = {}
+    for index, change in enumerate(changes):
+        dest = get_dest(change, dest_dir)
+        if dest not in dest_groups:
+            dest_groups[dest] = []
+            groups.append(dest_groups[dest])
+        dest_groups[dest].append(index)
+
+    def fetch_group(group):
+        return [fetch_change(changes[index], dest_dir,
+                             reference_dir=reference_dir,
+                             dissociate=dissociate)
+                for index in group]
+
+    pool = ThreadPool(min(workers, len(groups)))
+    try:
+        groups_results = pool.map(fetch_group, groups)
+    finally:
+        pool.close()
+        pool.join()
+    results = [None] * len(changes)
+    for group, group_results in zip(groups, groups_results):
+        for index, result in zip(group, group_results):
+            results[index] = result
+    return results
+
+
+def main():
+    module = AnsibleModule(  # noqa
+        argument_spec=dict(
+            changes=dict(required=True, type='list', elements='dict'),
+            dest_dir=dict(required=True, type='path'),
+            reference_dir=dict(required=False, default=None, type='path'),
+            dissociate=dict(required=False, default=False, type='bool'),
+            workers=dict(required=False, default=4, type='int')
+        )
+    )
+    results = fetch_changes(module.params['changes'],
+                            module.params['dest_dir'],
+                            reference_dir=module.params['reference_dir'],
+                            dissociate=module.params['dissociate'],
+                            workers=module.params['workers'])
+    failed = [r for r in results if r.get('failed')]
+    module.exit_json(changed=any(r['changed'] for r in results),
+                     failed=bool(failed),
+                     results=results,
+                     msg=', '.join(''.join([r['project'], ': ', r['msg']])
+                                   for r in failed))
+
+
+if __name__ == "__main__":
+    main()
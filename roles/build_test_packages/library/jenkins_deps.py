@@ -12,12 +12,24 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # see http://docs.ansible.com/developing_modules.html#common-module-boilerplate
+import fcntl
 import json
 import logging
+import os
 import re
+import tempfile
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
 import requests
 from ansible.module_utils.basic import *  # noqa
 
+try:
+    from urllib.parse import quote
+except ImportError:
+    from urllib import quote
+
 
 DOCUMENTATION = '''
 ---
@@ -47,6 +59,20 @@ options:
     description:
       - The sha hash of the patchset to be tested. Latest will be used if omitted.
     required: False
+  cache_dir:
+    description:
+      - Directory where the details of the resolved changes are cached, so
+        they can be shared by all jobs running on the same host. Details of
+        a specific patchset never change and are kept forever, details of
+        the latest patchset of a change expire after cache_ttl seconds.
+        Caching is disabled if omitted.
+    required: False
+  cache_ttl:
+    description:
+      - Time in seconds that the details of the latest patchset of a change
+        are cached.
+    required: False
+    default: 300
 '''
 
 EXAMPLES = '''
@@ -54,6 +80,7 @@ EXAMPLES = '''
     host: review.opendev.org
     change_id: I387b6bfd763d2d86cad68a3119b0edd0caa237b0
     patchset_rev: d18f21853e2f3be7382a20d0f42232ff3a78b348
+    cache_dir: /home/zuul/.cache/jenkins_deps
 '''
 
 # we ignore any other host reference
@@ -61,6 +88,32 @@ ALLOWED_HOSTS = ['review.opendev.org',
                  'review.gerrithub.io',
                  'review.rdoproject.org']
 
+# maximum number of queries sent at the same time
+MAX_WORKERS = 8
+
+# maximum number of changes looked up in a single query
+MAX_QUERY_CHANGES = 20
+
+# time in seconds that the details of the latest revision of a change are
+# cached, revision-pinned details never change
+LATEST_REVISION_TTL = 300
+
+# keep-alive sessions shared by all requests to the same Gerrit host
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(host):
+    '''Return the HTTP session used for all requests to a Gerrit host.'''
+    with _sessions_lock:
+        if host not in _sessions:
+            session = requests.Session()
+            # one pooled connection per worker
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=MAX_WORKERS)
+            session.mount('https://', adapter)
+            _sessions[host] = session
+        return _sessions[host]
+
 
 def parse_commit_msg(current_host, msg):
     '''Look for dependency links in the commit message.'''
@@ -91,48 +144,30 @@ def parse_commit_msg(current_host, msg):
     return tags
 
 
-def get_details(host, change_id, branch, revision):
-    '''Get the details of a specific change'''
-    url = ''.join(['https://', host, '/changes/?q=change:', change_id])
-    try:
-        req = requests.get(url)
-        req.raise_for_status()
-    except requests.exceptions.HTTPError:
-        return {'fail_msg': ''.join(['warning: failed to query change '
-                                     'details from ', url])}
-    # strip XSSI attack prevention prefix
-    data = json.loads(req.text[4:])
-    if len(data) == 0:
-        return {'fail_msg': ''.join(['warning: no change found with id ',
-                                     change_id, ' at ', url])}
-    elif len(data) == 1:
-        # not filtering by branch if not necessary
-        full_id = data[0]['id']
-    else:
-        # there are more than one change with the same ID
-        try:
-            full_id = [change['id'] for change
-                       in data if change['branch'] == branch][0]
-        except IndexError:
-            return {'fail_msg': ''.join(['warning: no change found with id ',
-                                         change_id, ' for branch ', branch,
-                                         ' at ', url])}
-    url = ''.join(['https://', host, '/changes/', full_id,
-                   '?o=ALL_REVISIONS&o=ALL_COMMITS'])
+def query_changes(host, change_ids, options):
+    '''Look up several changes with a single Gerrit query.
+
+    Returns a tuple with the query url and the list of changes found, or
+    None if the query failed.
+    '''
+    url = ''.join(['https://', host, '/changes/?q=',
+                   '+OR+'.join('change:' + c for c in change_ids),
+                   ''.join('&o=' + o for o in options)])
     try:
-        req = requests.get(url)
+        req = get_session(host).get(url)
         req.raise_for_status()
     except requests.exceptions.HTTPError:
-        return {'fail_msg': ''.join(['warning: failed to fetch details of ',
-                                     change_id, ' from ', url])}
+        return url, None
     # strip XSSI attack prevention prefix
-    data = json.loads(req.text[4:])
-    if revision is None:
-        revision = data['current_revision']
+    return url, json.loads(req.text[4:])
+
+
+def get_revision_details(host, data, revision, url):
+    '''Get the details of a change revision from the change data.'''
     if revision not in data['revisions']:
         return {'fail_msg': ''.join(['warning: cannot find revision ',
-                                     revision, ' of change ', change_id,
-                                     ' at ', url])}
+                                     revision, ' of change ',
+                                     data['change_id'], ' at ', url])}
     return {'host': host,
             'change_id': str(data['change_id']),
             'project': str(data['project']),
@@ -142,7 +177,185 @@ def get_details(host, change_id, branch, revision):
                 str(data['revisions'][revision]['commit']['message'])}
 
 
-def resolve_dep(host, change_id, branch, revision):
+def get_all_revisions_details(host, full_id, change_id, revision):
+    '''Get the details of an older revision of a change.'''
+    url = ''.join(['https://', host, '/changes/', full_id,
+                   '?o=ALL_REVISIONS&o=ALL_COMMITS'])
+    try:
+        req = get_session(host).get(url)
+        req.raise_for_status()
+    except requests.exceptions.HTTPError:
+        return {'fail_msg': ''.join(['warning: failed to fetch details of ',
+                                     change_id, ' from ', url])}
+    # strip XSSI attack prevention prefix
+    data = json.loads(req.text[4:])
+    return get_revision_details(host, data, revision, url)
+
+
+def get_details_batch(host, changes):
+    '''Get the details of several changes from the same Gerrit host.
+
+    All changes are looked up with a single query that only returns their
+    current revision. All revisions are only fetched for changes that
+    request an older one.
+
+    Returns a list with the details of each change, in the same order.
+    '''
+    url, data = query_changes(host, [c['change_id'] for c in changes],
+                              ['CURRENT_REVISION', 'CURRENT_COMMIT'])
+    if data is None:
+        return [{'fail_msg': ''.join(['warning: failed to query change '
+                                      'details from ', url])}] * len(changes)
+    found = {}
+    for change_data in data:
+        found.setdefault(change_data['change_id'], []).append(change_data)
+
+    results = []
+    for change in changes:
+        matches = found.get(change['change_id'], [])
+        if len(matches) > 1:
+            # there are more than one change with the same ID
+            matches = [m for m in matches if m['branch'] == change['branch']]
+            if not matches:
+                results.append({'fail_msg': ''.join([
+                    'warning: no change found with id ', change['change_id'],
+                    ' for branch ', str(change['branch']), ' at ', url])})
+                continue
+        elif not matches:
+            results.append({'fail_msg': ''.join([
+                'warning: no change found with id ', change['change_id'],
+                ' at ', url])})
+            continue
+        change_data = matches[0]
+        revision = change['revision']
+        if revision is None or revision == change_data['current_revision']:
+            results.append(get_revision_details(
+                host, change_data, change_data['current_revision'], url))
+        else:
+            results.append(get_all_revisions_details(
+                host, change_data['id'], change['change_id'], revision))
+    return results
+
+
+def get_cache_path(host_dir, change):
+    '''Return the cache file of a (host, change_id, revision) lookup.'''
+    name = '@'.join([change['change_id'], change['revision'] or 'latest',
+                     change['branch'] or ''])
+    return os.path.join(host_dir, quote(name, safe='@') + '.json')
+
+
+def read_cache(path, ttl):
+    '''Return cached change details, or None if missing or expired.'''
+    try:
+        if ttl is not None and time.time() - os.path.getmtime(path) > ttl:
+            return None
+        with open(path) as cache_file:
+            return json.load(cache_file)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def write_cache(path, details):
+    '''Write change details, so readers never see a partial file.'''
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'w') as cache_file:
+        json.dump(details, cache_file)
+    os.rename(tmp_path, path)
+
+
+def get_details_cached(host, changes, cache_dir, ttl):
+    '''Get the details of several changes, using the on-disk cache.
+
+    Only the changes that are not cached are looked up. Jobs share the
+    lookups through a lock per host: a job waiting for the lock finds the
+    changes fetched by the job holding it in the cache.
+    '''
+    if not cache_dir:
+        return get_details_batch(host, changes)
+    host_dir = os.path.join(cache_dir, host)
+    if not os.path.isdir(host_dir):
+        try:
+            os.makedirs(host_dir)
+        except OSError:
+            # created at the same time by another job
+            if not os.path.isdir(host_dir):
+                raise
+
+    results = [None] * len(changes)
+
+    def lookup_cache():
+        missing = []
+        for index, change in enumerate(changes):
+            if results[index] is None:
+                results[index] = read_cache(
+                    get_cache_path(host_dir, change),
+                    None if change['revision'] else ttl)
+                if results[index] is None:
+                    missing.append(index)
+        return missing
+
+    if lookup_cache():
+        with open(os.path.join(host_dir, '.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            missing = lookup_cache()
+            if missing:
+                fetched = get_details_batch(
+                    host, [changes[index] for index in missing])
+                for index, details in zip(missing, fetched):
+                    results[index] = details
+                    if 'fail_msg' not in details:
+                        write_cache(get_cache_path(host_dir, changes[index]),
+                                    details)
+    return results
+
+
+def get_details(host, change_id, branch, revision):
+    '''Get the details of a specific change'''
+    return get_details_batch(host, [{'change_id': change_id,
+                                     'branch': branch,
+                                     'revision': revision}])[0]
+
+
+def get_change_key(change):
+    '''Return the key of a change lookup.'''
+    return (change['host'], change['change_id'], change['branch'],
+            change['revision'])
+
+
+def prefetch_details(pool, changes, fetched, resolved_ids, cache_dir,
+                     cache_ttl):
+    '''Look up the details of the changes not fetched yet, in parallel.
+
+    The changes are looked up with one query per host for up to
+    MAX_QUERY_CHANGES changes, all sent at the same time. Their details are
+    added to fetched, by change key.
+    '''
+    pending = []
+    for change in changes:
+        key = get_change_key(change)
+        if change['change_id'] in resolved_ids or key in fetched or key in (
+                get_change_key(c) for c in pending):
+            continue
+        pending.append(change)
+
+    batches = []
+    host_batches = {}
+    for change in pending:
+        batch = host_batches.get(change['host'])
+        if batch is None or len(batch) >= MAX_QUERY_CHANGES:
+            batch = host_batches[change['host']] = []
+            batches.append((change['host'], batch))
+        batch.append(change)
+    batches_details = pool.map(
+        lambda b: get_details_cached(b[0], b[1], cache_dir, cache_ttl),
+        batches)
+    for (__, batch), batch_details in zip(batches, batches_details):
+        for change, details in zip(batch, batch_details):
+            fetched[get_change_key(change)] = details
+
+
+def resolve_dep(host, change_id, branch, revision, cache_dir=None,
+                cache_ttl=LATEST_REVISION_TTL):
     '''Dependency resolution.
 
     Resolve the dependencies in the target commits until there are no more
@@ -150,9 +363,16 @@ def resolve_dep(host, change_id, branch, revision):
     the dependencies. It only uses the branch when the change_id is ambigiuous
     and by default uses the latest patchset's revision.
 
+    When a change must be looked up, all the pending changes are looked up
+    at the same time, so each level of the dependency graph is fetched with
+    parallel queries. Changes are still processed depth first, the last
+    dependency found first.
+
     The function avoids circular dependencies and only allows one change per
     project to be added to the output list.
 
+    Change details are cached in cache_dir when it's set.
+
     Returns a list of dictionaries with the dependent changes.
 
     '''
@@ -162,37 +382,49 @@ def resolve_dep(host, change_id, branch, revision):
                    'change_id': change_id,
                    'branch': branch,
                    'revision': revision}]
+    fetched = {}
     output_msg = []
-    while len(to_resolve) > 0:
-        change = to_resolve.pop()
-        # use the original branch as default
-        if change['branch'] is None:
-            change['branch'] = branch
-
-        # avoid circular dependencies
-        if change['change_id'] in resolved_ids:
-            continue
+    pool = ThreadPool(MAX_WORKERS)
+    try:
+        while len(to_resolve) > 0:
+            # use the original branch as default
+            for change in to_resolve:
+                if change['branch'] is None:
+                    change['branch'] = branch
+            change = to_resolve.pop()
 
-        details = get_details(**change)
-        if 'fail_msg' in details:
-            output_msg.append(details['fail_msg'])
-            continue
-        resolved_ids.append(details['change_id'])
-
-        # allow only one of each project as a dependency
-        if details['project'] not in (d['project'] for d in deps):
-            deps.append({'host': change['host'],
-                         'project': details['project'],
-                         'branch': details['branch'],
-                         'refspec': details['refspec']})
-        else:
-            output_msg.append(
-                ''.join(['warning: skipping ', change['change_id'], ' on ',
-                         change['host'], ' because project "',
-                         details['project'], '" is already a dependency']))
-            continue
-        new_deps = parse_commit_msg(change['host'], details['commit_msg'])
-        to_resolve.extend(new_deps)
+            # avoid circular dependencies
+            if change['change_id'] in resolved_ids:
+                continue
+
+            if get_change_key(change) not in fetched:
+                prefetch_details(pool, [change] + to_resolve[::-1], fetched,
+                                 resolved_ids, cache_dir, cache_ttl)
+            details = fetched[get_change_key(change)]
+            if 'fail_msg' in details:
+                output_msg.append(details['fail_msg'])
+                continue
+            resolved_ids.append(details['change_id'])
+
+            # allow only one of each project as a dependency
+            if details['project'] not in (d['project'] for d in deps):
+                deps.append({'host': change['host'],
+                             'project': details['project'],
+                             'branch': details['branch'],
+                             'refspec': details['refspec']})
+            else:
+                output_msg.append(
+                    ''.join(['warning: skipping ', change['change_id'],
+                             ' on ', change['host'], ' because project "',
+                             details['project'],
+                             '" is already a dependency']))
+                continue
+            new_deps = parse_commit_msg(change['host'],
+                                        details['commit_msg'])
+            to_resolve.extend(new_deps)
+    finally:
+        pool.close()
+        pool.join()
     for index in range(len(deps)):
         if deps[index]['host'] == 'review.opendev.org':
             # redirect change cloning to reduce load on review.opendev.org
@@ -215,13 +447,18 @@ def main():
             host=dict(required=True, type='str'),
             change_id=dict(required=True, type='str'),
             branch=dict(required=False, default=None, type='str'),
-            patchset_rev=dict(required=False, default=None, type='str')
+            patchset_rev=dict(required=False, default=None, type='str'),
+            cache_dir=dict(required=False, default=None, type='path'),
+            cache_ttl=dict(required=False, default=LATEST_REVISION_TTL,
+                           type='int')
         )
     )
     result = resolve_dep(module.params['host'],
                          module.params['change_id'],
                          module.params['branch'],
-                         module.params['patchset_rev'])
+                         module.params['patchset_rev'],
+                         cache_dir=module.params['cache_dir'],
+                         cache_ttl=module.params['cache_ttl'])
     module.exit_json(**result)
 
 
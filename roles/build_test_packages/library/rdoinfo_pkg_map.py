@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# see http://docs.ansible.com/developing_modules.html#common-module-boilerplate
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+
+from ansible.module_utils.basic import *  # noqa
+
+
+DOCUMENTATION = '''
+---
+module: rdoinfo_pkg_map
+version_added: "2.0"
+short_description: Maps upstream projects to DLRN package names using rdoinfo
+description:
+    - Loads rdoinfo once, builds an index from the upstream project names
+      and URLs to the DLRN package names, and maps all the given projects
+      with it. Projects are looked up like 'rdopkg findpkg' does: first by
+      package name, then by rdoinfo project name, then by the upstream,
+      patches, distgit and review URLs.
+    - The index is cached by rdoinfo commit, so it's only built again when
+      rdoinfo changes.
+    - Requires PyYAML.
+options:
+  rdoinfo_dir:
+    description:
+      - Path to the local rdoinfo git repo.
+    required: True
+  info_file:
+    description:
+      - The rdoinfo file to be loaded, relative to rdoinfo_dir. Files listed
+        in its 'include' key are loaded too.
+    required: False
+    default: rdo-full.yml
+  projects:
+    description:
+      - List of upstream projects to be mapped, like 'openstack/nova'. Only
+        the last component of each project is used for the lookup.
+    required: True
+  cache_dir:
+    description:
+      - Directory where the index is cached. The index is not cached if
+        omitted.
+    required: False
+'''
+
+EXAMPLES = '''
+- rdoinfo_pkg_map:
+    rdoinfo_dir: /home/zuul/DLRN/rdoinfo
+    projects:
+      - openstack/nova
+      - openstack/tripleo-common
+    cache_dir: /home/zuul/.cache/rdoinfo
+'''
+
+RETURN = '''
+packages:
+    description: DLRN package name of each project that was found.
+    type: dict
+    sample: {"openstack/nova": "openstack-nova"}
+not_found:
+    description: Projects without a DLRN package.
+    type: list
+distgits:
+    description: Distgit URLs of each package found, by rdoinfo key.
+    type: dict
+    sample: {"openstack-nova": {
+        "distgit": "https://github.com/rdo-packages/nova-distgit.git"}}
+'''
+
+# package keys with URLs that can be used to find a package
+URL_KEYS = ['upstream', 'patches', 'distgit', 'master-distgit',
+            'review-origin', 'review-patches']
+# package keys with the URL of the packaging repo
+DISTGIT_KEYS = ['distgit', 'master-distgit']
+
+
+def load_info(info_path, loaded=None):
+    '''Load an rdoinfo file, merging the files it includes.'''
+    import yaml
+
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    loaded = set() if loaded is None else loaded
+    loaded.add(os.path.realpath(info_path))
+    with open(info_path) as info_file:
+        info = yaml.load(info_file, Loader=loader) or {}
+    includes = info.pop('include', None) or []
+    if not isinstance(includes, list):
+        includes = [includes]
+    for include in includes:
+        include_path = os.path.join(os.path.dirname(info_path), include)
+        if os.path.realpath(include_path) in loaded:
+            continue
+        included = load_info(include_path, loaded)
+        for key, value in included.items():
+            if isinstance(value, list):
+                info[key] = info.get(key, []) + value
+            elif isinstance(value, dict):
+                merged = dict(value)
+                merged.update(info.get(key, {}))
+                info[key] = merged
+            else:
+                info.setdefault(key, value)
+    return info
+
+
+def expand_package(package, package_configs):
+    '''Apply the package config template and '%(key)s' substitutions.'''
+    expanded = dict(package_configs.get(package.get('conf'), {}))
+    expanded.update(package)
+    # values can refer to other values, like name: openstack-%(project)s
+    for __ in range(3):
+        changed = False
+        for key, value in expanded.items():
+            if not isinstance(value, str) or '%(' not in value:
+                continue
+            try:
+                new_value = value % expanded
+            except (KeyError, ValueError, TypeError):
+                continue
+            if new_value != value:
+                expanded[key] = new_value
+                changed = True
+        if not changed:
+            break
+    return expanded
+
+
+def url_basename(url):
+    '''Return the last path component of a repo URL, without .git.'''
+    name = url.rstrip('/').rsplit('/', 1)[-1]
+    if name.endswith('.git'):
+        name = name[:-len('.git')]
+    return name
+
+
+def build_index(info):
+    '''Build the index from project names and URLs to package names.
+
+    The first package found for each key wins, as in 'rdopkg findpkg'.
+    '''
+    index = {'name': {}, 'project': {}, 'url': {}, 'distgit': {}}
+    package_configs = info.get('package-configs') or {}
+    for package in info.get('packages') or []:
+        package = expand_package(package, package_configs)
+        name = package.get('name')
+        if not name:
+            continue
+        index['name'].setdefault(name, name)
+        index['distgit'].setdefault(name, dict(
+            (key, package[key]) for key in DISTGIT_KEYS
+            if isinstance(package.get(key), str)))
+        if package.get('project'):
+            index['project'].setdefault(package['project'], name)
+        for key in URL_KEYS:
+            if isinstance(package.get(key), str):
+                index['url'].setdefault(url_basename(package[key]), name)
+    return index
+
+
+def get_rdoinfo_version(rdoinfo_dir):
+    '''Return the rdoinfo commit, including local changes, or None.'''
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                         cwd=rdoinfo_dir)
+        diff = subprocess.check_output(['git', 'diff', 'HEAD'],
+                                       cwd=rdoinfo_dir)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    version = commit.decode('utf-8').strip()
+    if diff:
+        version = '-'.join([version, hashlib.sha1(diff).hexdigest()[:12]])
+    return version
+
+
+def get_index(rdoinfo_dir, info_file, cache_dir=None):
+    '''Return the index of an rdoinfo file, cached by rdoinfo commit.'''
+    version = get_rdoinfo_version(rdoinfo_dir) if cache_dir else None
+    cache_path = None
+    if version:
+        cache_path = os.path.join(cache_dir, ''.join([
+            'rdoinfo-index-', os.path.splitext(info_file)[0], '-', version,
+            '.json']))
+        try:
+            with open(cache_path) as cache_file:
+                return json.load(cache_file)
+        except (IOError, OSError, ValueError):
+            pass
+
+    index = build_index(load_info(os.path.join(rdoinfo_dir, info_file)))
+    if cache_path:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        # readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir)
+        with os.fdopen(fd, 'w') as cache_file:
+            json.dump(index, cache_file)
+        os.rename(tmp_path, cache_path)
+    return index
+
+
+def find_package(index, project):
+    '''Find the DLRN package name of an upstream project.'''
+    query = url_basename(project)
+    for key in ['name', 'project', 'url']:
+        if query in index[key]:
+            return index[key][query]
+    return None
+
+
+def map_projects(rdoinfo_dir, projects, info_file='rdo-full.yml',
+                 cache_dir=None):
+    '''Map a list of upstream projects to DLRN package names.
+
+    Returns the packages found, the projects not found and the distgit URLs
+    of the packages found.
+    '''
+    index = get_index(rdoinfo_dir, info_file, cache_dir=cache_dir)
+    packages = {}
+    not_found = []
+    distgits = {}
+    for project in projects:
+        name = find_package(index, project)
+        if name:
+            packages[project] = name
+            distgits[name] = index['distgit'].get(name, {})
+        else:
+            not_found.append(project)
+    return packages, not_found, distgits
+
+
+def main():
+    module = AnsibleModule(  # noqa
+        argument_spec=dict(
+            rdoinfo_dir=dict(required=True, type='path'),
+            info_file=dict(required=False, default='rdo-full.yml',
+                           type='str'),
+            projects=dict(required=True, type='list', elements='str'),
+            cache_dir=dict(required=False, default=None, type='path')
+        )
+    )
+    try:
+        packages, not_found, distgits = map_projects(
+            module.params['rdoinfo_dir'],
+            module.params['projects'],
+            info_file=module.params['info_file'],
+            cache_dir=module.params['cache_dir'])
+    except ImportError:
+        module.fail_json(msg='PyYAML is required to load rdoinfo')
+    except (IOError, OSError) as e:
+        module.fail_json(msg=''.join(['failed to load rdoinfo: ', str(e)]))
+    module.exit_json(changed=False, packages=packages, not_found=not_found,
+                     distgits=distgits)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+#   Copyright 2021 Red Hat, Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+import importlib.util
+import os
+import sys
+import types
+
+from unittest import mock
+
+LIBRARY_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'roles',
+    'build_test_packages', 'library')
+
+# the role modules only use AnsibleModule, ansible isn't a test dependency
+if 'ansible.module_utils.basic' not in sys.modules:
+    basic = types.ModuleType('ansible.module_utils.basic')
+    basic.AnsibleModule = mock.Mock()
+    sys.modules.setdefault('ansible', types.ModuleType('ansible'))
+    sys.modules.setdefault('ansible.module_utils',
+                           types.ModuleType('ansible.module_utils'))
+    sys.modules['ansible.module_utils.basic'] = basic
+
+
+def load_module(name):
+    """Load a module of the role library by name."""
+    spec = importlib.util.spec_from_file_location(
+        name, os.path.join(LIBRARY_DIR, name + '.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,138 @@
+#   Copyright 2021 Red Hat, Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+import os
+
+import fixtures
+import testtools
+
+from . import library
+
+dlrn_build_cache = library.load_module('dlrn_build_cache')
+
+KEY_DATA = {'project': 'openstack/nova',
+            'refspec': 'refs/changes/01/123401/3',
+            'changes': ['refs/changes/01/123401/3'],
+            'distro': 'rpm-master',
+            'dlrn_target': 'centos9-stream'}
+
+
+class TestDlrnBuildCache(testtools.TestCase):
+
+    def setUp(self):
+        super(TestDlrnBuildCache, self).setUp()
+        tmp_dir = self.useFixture(fixtures.TempDir()).path
+        self.store_dir = os.path.join(tmp_dir, 'store')
+        self.rpms_dir = os.path.join(tmp_dir, 'repos')
+        self.dest_dir = os.path.join(tmp_dir, 'build-cache')
+
+    def _make_rpm(self, name, content, mtime=None):
+        path = os.path.join(self.rpms_dir, 'ab', 'cd', name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(content)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+        return path
+
+    def test_get_build_key(self):
+        key = dlrn_build_cache.get_build_key(KEY_DATA)
+        self.assertEqual(
+            key, dlrn_build_cache.get_build_key(dict(reversed(
+                list(KEY_DATA.items())))))
+        self.assertNotEqual(
+            key, dlrn_build_cache.get_build_key(dict(KEY_DATA, distro='x')))
+
+    def test_lookup_build_not_cached(self):
+        self.assertIsNone(dlrn_build_cache.lookup_build(
+            self.store_dir, KEY_DATA, self.dest_dir))
+        self.assertFalse(os.path.exists(self.dest_dir))
+
+    def test_store_and_lookup_build(self):
+        self._make_rpm('nova-1.rpm', 'nova')
+        self._make_rpm('nova-1.src.rpm', 'nova source')
+        self._make_rpm('build.log', 'not an rpm')
+
+        stored = dlrn_build_cache.store_build(self.store_dir, KEY_DATA,
+                                              self.rpms_dir)
+
+        self.assertEqual(['nova-1.rpm', 'nova-1.src.rpm'], stored)
+        rpms = dlrn_build_cache.lookup_build(self.store_dir, KEY_DATA,
+                                             self.dest_dir)
+        self.assertEqual(['nova-1.rpm', 'nova-1.src.rpm'], rpms)
+        build_dir = os.path.join(self.dest_dir,
+                                 dlrn_build_cache.get_build_key(KEY_DATA))
+        self.assertEqual(['nova-1.rpm', 'nova-1.src.rpm'],
+                         sorted(os.listdir(build_dir)))
+        with open(os.path.join(build_dir, 'nova-1.rpm')) as f:
+            self.assertEqual('nova', f.read())
+
+    def test_store_build_newer_than(self):
+        self._make_rpm('old-1.rpm', 'old', mtime=1000)
+        self._make_rpm('nova-1.rpm', 'nova', mtime=3000)
+
+        stored = dlrn_build_cache.store_build(self.store_dir, KEY_DATA,
+                                              self.rpms_dir, newer_than=2000)
+
+        self.assertEqual(['nova-1.rpm'], stored)
+
+    def test_store_build_nothing_built(self):
+        self._make_rpm('old-1.rpm', 'old', mtime=1000)
+
+        self.assertEqual([], dlrn_build_cache.store_build(
+            self.store_dir, KEY_DATA, self.rpms_dir, newer_than=2000))
+        self.assertIsNone(dlrn_build_cache.lookup_build(
+            self.store_dir, KEY_DATA, self.dest_dir))
+
+    def test_store_build_shares_objects(self):
+        self._make_rpm('nova-1.rpm', 'nova')
+        dlrn_build_cache.store_build(self.store_dir, KEY_DATA, self.rpms_dir)
+        dlrn_build_cache.store_build(self.store_dir,
+                                     dict(KEY_DATA, distro='other'),
+                                     self.rpms_dir)
+
+        objects = []
+        for __, __, files in os.walk(os.path.join(self.store_dir,
+                                                  'objects')):
+            objects.extend(files)
+        self.assertEqual(1, len(objects))
+
+    def test_lookup_build_relinks_existing_build_dir(self):
+        self._make_rpm('nova-1.rpm', 'nova')
+        dlrn_build_cache.store_build(self.store_dir, KEY_DATA, self.rpms_dir)
+        build_dir = os.path.join(self.dest_dir,
+                                 dlrn_build_cache.get_build_key(KEY_DATA))
+        os.makedirs(build_dir)
+        with open(os.path.join(build_dir, 'stale-0.rpm'), 'w') as f:
+            f.write('stale')
+        with open(os.path.join(build_dir, 'nova-1.rpm'), 'w') as f:
+            f.write('stale')
+
+        rpms = dlrn_build_cache.lookup_build(self.store_dir, KEY_DATA,
+                                             self.dest_dir)
+
+        self.assertEqual(['nova-1.rpm'], rpms)
+        self.assertEqual(['nova-1.rpm'], os.listdir(build_dir))
+        with open(os.path.join(build_dir, 'nova-1.rpm')) as f:
+            self.assertEqual('nova', f.read())
+
+    def test_lookup_build_missing_object(self):
+        self._make_rpm('nova-1.rpm', 'nova')
+        dlrn_build_cache.store_build(self.store_dir, KEY_DATA, self.rpms_dir)
+        sha256 = dlrn_build_cache.file_sha256(
+            os.path.join(self.rpms_dir, 'ab', 'cd', 'nova-1.rpm'))
+        os.remove(dlrn_build_cache.get_object_path(self.store_dir, sha256))
+
+        self.assertIsNone(dlrn_build_cache.lookup_build(
+            self.store_dir, KEY_DATA, self.dest_dir))
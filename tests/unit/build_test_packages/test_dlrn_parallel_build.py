@@ -0,0 +1,127 @@
+#   Copyright 2021 Red Hat, Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+import os
+from unittest import mock
+
+import fixtures
+import testtools
+
+from . import library
+
+dlrn_parallel_build = library.load_module('dlrn_parallel_build')
+
+SPEC = '''%global pypi_name foo
+%global with_doc 1
+Name:           python-%{pypi_name}
+Version:        1.0
+BuildRequires:  python3-devel >= 3.6, python3-pbr
+BuildRequires:  python3-%{?pypi_name}-lib
+Provides:       %{pypi_name}-common = %{version}
+
+%package -n python3-%{pypi_name}
+Summary: Foo
+
+%package doc
+Summary: Foo documentation
+%if 0%{?with_doc}
+BuildRequires:  python3-sphinx
+%endif
+'''
+
+
+class TestDlrnParallelBuild(testtools.TestCase):
+
+    def test_parse_deps(self):
+        self.assertEqual(
+            ['python3-foo', 'bar', 'baz'],
+            dlrn_parallel_build.parse_deps('python3-foo >= 1.0, bar baz'))
+
+    def test_parse_deps_empty(self):
+        self.assertEqual([], dlrn_parallel_build.parse_deps(''))
+
+    def test_parse_spec(self):
+        spec_path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                                 'python-foo.spec')
+        with open(spec_path, 'w') as spec_file:
+            spec_file.write(SPEC)
+
+        provides, requires = dlrn_parallel_build.parse_spec(spec_path)
+
+        self.assertEqual(set(['python-foo', 'foo-common', 'python3-foo',
+                              'python-foo-doc']), provides)
+        # BuildRequires under conditionals are kept
+        self.assertEqual(set(['python3-devel', 'python3-pbr',
+                              'python3-foo-lib', 'python3-sphinx']),
+                         requires)
+
+    def test_get_dependencies(self):
+        specs = {'foo': (set(['python3-foo']), set(['python3-lib', 'gcc'])),
+                 'lib': (set(['python3-lib']), set(['python3-foo-tests'])),
+                 'bar': (set(['python3-bar']), set(['python3-foo',
+                                                    'python3-bar']))}
+
+        dependencies = dlrn_parallel_build.get_dependencies(
+            ['foo', 'lib', 'bar'], specs)
+
+        # requires not built and self dependencies are ignored
+        self.assertEqual({'foo': set(['lib']), 'lib': set(),
+                          'bar': set(['foo'])}, dependencies)
+
+    def test_get_build_groups(self):
+        dependencies = {'nova': set(['lib']), 'other': set(),
+                        'client': set(['nova']), 'lib': set()}
+
+        groups = dlrn_parallel_build.get_build_groups(dependencies)
+
+        self.assertEqual([['lib', 'nova', 'client'], ['other']], groups)
+
+    def test_get_build_groups_shared_dependency(self):
+        # packages sharing a dependency are built by the same worker
+        dependencies = {'nova': set(['lib']), 'neutron': set(['lib']),
+                        'lib': set(), 'other': set()}
+
+        groups = dlrn_parallel_build.get_build_groups(dependencies)
+
+        self.assertEqual([['lib', 'nova', 'neutron'], ['other']], groups)
+
+    def test_get_build_groups_cycle(self):
+        dependencies = {'foo': set(['bar']), 'bar': set(['foo']),
+                        'baz': set(['foo'])}
+
+        groups = dlrn_parallel_build.get_build_groups(dependencies)
+
+        self.assertEqual([['foo', 'bar', 'baz']], groups)
+
+    @mock.patch.object(dlrn_parallel_build.subprocess, 'call',
+                       side_effect=[2, 0])
+    def test_run_worker_venv(self, mock_call):
+        worker_dir = self.useFixture(fixtures.TempDir()).path
+
+        rc, log_path = dlrn_parallel_build.run_worker(
+            '/opt/dlrn-venv/bin/dlrn', '/opt/DLRN', worker_dir,
+            'projects.ini', ['nova', 'client'], 'rdoinfo')
+
+        self.assertEqual(0, rc)
+        self.assertEqual(os.path.join(worker_dir, 'dlrn.log'), log_path)
+        # retried
+        self.assertEqual(2, mock_call.call_count)
+        args, kwargs = mock_call.call_args
+        self.assertEqual(['/opt/dlrn-venv/bin/dlrn', '--config-file',
+                          'projects.ini', '--head-only', '--package-name',
+                          'nova', '--package-name', 'client', '--local',
+                          '--info-repo', 'rdoinfo', '--order', '--dev'],
+                         args[0])
+        self.assertEqual('/opt/dlrn-venv', kwargs['env']['VIRTUAL_ENV'])
+        self.assertEqual('/opt/dlrn-venv/bin',
+                         kwargs['env']['PATH'].split(os.pathsep)[0])
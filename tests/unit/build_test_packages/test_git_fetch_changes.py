@@ -0,0 +1,133 @@
+#   Copyright 2021 Red Hat, Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+import os
+from unittest import mock
+
+import fixtures
+import testtools
+
+from . import library
+
+git_fetch_changes = library.load_module('git_fetch_changes')
+
+CHANGE = {'host': 'https://review.opendev.org',
+          'project': 'openstack/nova',
+          'branch': 'master',
+          'refspec': 'refs/changes/01/123401/3'}
+
+
+class TestFetchChange(testtools.TestCase):
+
+    def setUp(self):
+        super(TestFetchChange, self).setUp()
+        tmp_dir = self.useFixture(fixtures.TempDir()).path
+        self.dest_dir = os.path.join(tmp_dir, 'repos')
+        self.reference_dir = os.path.join(tmp_dir, 'reference')
+        self.dest = os.path.join(self.dest_dir, 'openstack/nova')
+        self.git_calls = []
+        self.failing_command = None
+        self.mock_run_git = self.useFixture(fixtures.MockPatchObject(
+            git_fetch_changes, 'run_git',
+            side_effect=self._fake_run_git)).mock
+
+    def _fake_run_git(self, args, cwd=None):
+        self.git_calls.append(args)
+        if args[0] == 'init' and '--bare' not in args:
+            os.makedirs(os.path.join(args[-1], '.git', 'objects', 'info'))
+        if args[0] == self.failing_command:
+            return 128, 'fatal: failed'
+        return 0, ''
+
+    def test_fetch_change_already_cloned(self):
+        os.makedirs(os.path.join(self.dest, '.git'))
+
+        result = git_fetch_changes.fetch_change(
+            CHANGE, self.dest_dir, reference_dir=self.reference_dir)
+
+        self.assertEqual('already cloned', result['msg'])
+        self.assertFalse(result['changed'])
+        self.mock_run_git.assert_not_called()
+
+    @mock.patch.object(git_fetch_changes, 'update_reference',
+                       return_value=(128, 'fatal: unable to access'))
+    def test_fetch_change_reference_update_fails(self, mock_update):
+        result = git_fetch_changes.fetch_change(
+            CHANGE, self.dest_dir, reference_dir=self.reference_dir)
+
+        self.assertTrue(result['failed'])
+        self.assertIn('failed to update reference repo', result['msg'])
+        self.assertIn('fatal: unable to access', result['msg'])
+        self.mock_run_git.assert_not_called()
+        self.assertFalse(os.path.exists(self.dest))
+
+    def test_fetch_change_failed_command_removes_clone(self):
+        self.failing_command = 'checkout'
+
+        result = git_fetch_changes.fetch_change(CHANGE, self.dest_dir)
+
+        self.assertTrue(result['failed'])
+        self.assertIn('git checkout --quiet FETCH_HEAD failed', result['msg'])
+        self.assertFalse(os.path.exists(self.dest))
+
+    def test_fetch_change_with_reference(self):
+        result = git_fetch_changes.fetch_change(
+            CHANGE, self.dest_dir, reference_dir=self.reference_dir)
+
+        self.assertTrue(result['changed'])
+        reference_path = os.path.join(
+            self.reference_dir, 'review.opendev.org', 'openstack/nova.git')
+        with open(os.path.join(self.dest, '.git', 'objects', 'info',
+                               'alternates')) as f:
+            self.assertEqual(os.path.join(reference_path, 'objects') + '\n',
+                             f.read())
+        # the borrowed objects are not copied by default
+        self.assertNotIn('repack', [args[0] for args in self.git_calls])
+
+    def test_fetch_change_dissociate(self):
+        result = git_fetch_changes.fetch_change(
+            CHANGE, self.dest_dir, reference_dir=self.reference_dir,
+            dissociate=True)
+
+        self.assertTrue(result['changed'])
+        self.assertEqual(['repack', '-a', '-d', '-q'], self.git_calls[-1])
+        self.assertFalse(os.path.exists(os.path.join(
+            self.dest, '.git', 'objects', 'info', 'alternates')))
+
+    def test_fetch_changes_same_project(self):
+        other_change = dict(CHANGE, refspec='refs/changes/02/123402/1')
+        neutron_change = dict(CHANGE, project='openstack/neutron')
+
+        results = git_fetch_changes.fetch_changes(
+            [CHANGE, neutron_change, other_change], self.dest_dir)
+
+        self.assertEqual(['cloned', 'cloned', 'already cloned'],
+                         [r['msg'] for r in results])
+        self.assertEqual(CHANGE['refspec'], results[0]['refspec'])
+        self.assertEqual(other_change['refspec'], results[2]['refspec'])
+        # the project is only cloned once
+        self.assertEqual(2, [args[0] for args in self.git_calls].count(
+            'init'))
+
+    def test_fetch_changes_same_project_first_fails(self):
+        self.failing_command = 'checkout'
+        other_change = dict(CHANGE, refspec='refs/changes/02/123402/1')
+
+        results = git_fetch_changes.fetch_changes([CHANGE, other_change],
+                                                  self.dest_dir)
+
+        # the second change is tried once the first clone is removed
+        self.assertTrue(results[0]['failed'])
+        self.assertTrue(results[1]['failed'])
+        self.assertEqual(2, [args[0] for args in self.git_calls].count(
+            'init'))
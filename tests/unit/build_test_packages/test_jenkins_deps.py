@@ -0,0 +1,154 @@
+#   Copyright 2021 Red Hat, Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+import json
+import os
+from unittest import mock
+
+import fixtures
+import requests
+import testtools
+
+from . import library
+
+jenkins_deps = library.load_module('jenkins_deps')
+
+HOST = 'review.opendev.org'
+
+
+def make_change(change_id, project, depends_on=(), revision='abc'):
+    message = ''.join(['Change ', change_id, '\n\n'] + [
+        'Depends-On: ' + dep + '\n' for dep in depends_on])
+    return {'id': project.replace('/', '%2F') + '~master~' + change_id,
+            'change_id': change_id,
+            'project': project,
+            'branch': 'master',
+            'current_revision': revision,
+            'revisions': {revision: {'ref': 'refs/changes/' + change_id,
+                                     'commit': {'message': message}}}}
+
+
+class FakeGerrit(object):
+    '''Gerrit answering the change queries from a list of changes.'''
+
+    def __init__(self, changes):
+        self.changes = dict((c['change_id'], c) for c in changes)
+        self.urls = []
+
+    def get(self, url):
+        self.urls.append(url)
+        query = url.split('?q=')[1].split('&')[0]
+        found = [self.changes[c.split(':')[1]] for c in query.split('+OR+')
+                 if c.split(':')[1] in self.changes]
+        response = mock.Mock(text=")]}'" + json.dumps(found))
+        return response
+
+
+class TestJenkinsDeps(testtools.TestCase):
+
+    def setUp(self):
+        super(TestJenkinsDeps, self).setUp()
+        self.cache_dir = self.useFixture(fixtures.TempDir()).path
+        self.gerrit = FakeGerrit([
+            make_change('I1', 'openstack/nova', ['I2', 'I3']),
+            make_change('I2', 'openstack/neutron', ['I4']),
+            make_change('I3', 'openstack/oslo.db'),
+            make_change('I4', 'openstack/oslo.db')])
+        self.useFixture(fixtures.MockPatchObject(
+            jenkins_deps, 'get_session', return_value=self.gerrit))
+
+    def _change(self, change_id, revision=None):
+        return {'host': HOST, 'change_id': change_id, 'branch': 'master',
+                'revision': revision}
+
+    def test_query_changes(self):
+        url, data = jenkins_deps.query_changes(
+            HOST, ['I1', 'I2'], ['CURRENT_REVISION', 'CURRENT_COMMIT'])
+
+        self.assertEqual(''.join([
+            'https://review.opendev.org/changes/?q=change:I1+OR+change:I2',
+            '&o=CURRENT_REVISION&o=CURRENT_COMMIT']), url)
+        self.assertEqual(['I1', 'I2'], [c['change_id'] for c in data])
+
+    def test_query_changes_http_error(self):
+        self.gerrit.get = mock.Mock(return_value=mock.Mock(
+            raise_for_status=mock.Mock(
+                side_effect=requests.exceptions.HTTPError)))
+
+        url, data = jenkins_deps.query_changes(HOST, ['I1'], [])
+
+        self.assertEqual('https://review.opendev.org/changes/?q=change:I1',
+                         url)
+        self.assertIsNone(data)
+
+    def test_get_details_cached(self):
+        changes = [self._change('I1'), self._change('I5'),
+                   self._change('I3')]
+
+        details = jenkins_deps.get_details_cached(HOST, changes,
+                                                  self.cache_dir, 300)
+
+        self.assertEqual('openstack/nova', details[0]['project'])
+        self.assertIn('no change found with id I5', details[1]['fail_msg'])
+        self.assertEqual('openstack/oslo.db', details[2]['project'])
+        self.assertEqual(1, len(self.gerrit.urls))
+        # failures are not cached
+        self.assertEqual(['.lock', 'I1@latest@master.json',
+                          'I3@latest@master.json'],
+                         sorted(os.listdir(os.path.join(self.cache_dir,
+                                                        HOST))))
+
+        details = jenkins_deps.get_details_cached(HOST, changes,
+                                                  self.cache_dir, 300)
+
+        self.assertEqual('openstack/nova', details[0]['project'])
+        # only the change that isn't cached is looked up again
+        self.assertEqual(2, len(self.gerrit.urls))
+        self.assertIn('?q=change:I5&', self.gerrit.urls[-1])
+
+    def test_get_details_cached_expired(self):
+        changes = [self._change('I1'), self._change('I2', revision='abc')]
+        jenkins_deps.get_details_cached(HOST, changes, self.cache_dir, 300)
+        for name in os.listdir(os.path.join(self.cache_dir, HOST)):
+            os.utime(os.path.join(self.cache_dir, HOST, name), (0, 0))
+
+        jenkins_deps.get_details_cached(HOST, changes, self.cache_dir, 300)
+
+        # details of a specific revision never expire
+        self.assertEqual(2, len(self.gerrit.urls))
+        self.assertIn('?q=change:I1&', self.gerrit.urls[-1])
+
+    def test_get_details_cached_disabled(self):
+        details = jenkins_deps.get_details_cached(
+            HOST, [self._change('I1')], None, 300)
+
+        self.assertEqual('openstack/nova', details[0]['project'])
+        self.assertEqual([], os.listdir(self.cache_dir))
+
+    def test_resolve_dep(self):
+        result = jenkins_deps.resolve_dep(HOST, 'I1', 'master', None)
+
+        # the last dependency found is resolved first, like a stack, so
+        # oslo.db comes from I3 and I4 is skipped
+        self.assertEqual(
+            ['openstack/nova', 'openstack/oslo.db', 'openstack/neutron'],
+            [d['project'] for d in result['ansible_facts'][
+                'jenkins_change_list']])
+        self.assertEqual('refs/changes/I3', result['ansible_facts'][
+            'jenkins_change_list'][1]['refspec'])
+        self.assertIn('skipping I4', result['msg'])
+        self.assertEqual('https://opendev.org', result['ansible_facts'][
+            'jenkins_change_list'][0]['host'])
+        # the dependencies of a change are looked up with a single query
+        self.assertEqual(3, len(self.gerrit.urls))
+        self.assertIn('change:I3+OR+change:I2', self.gerrit.urls[1])
@@ -0,0 +1,165 @@
+#   Copyright 2021 Red Hat, Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+import os
+import subprocess
+from unittest import mock
+
+import fixtures
+import testtools
+
+from . import library
+
+rdoinfo_pkg_map = library.load_module('rdoinfo_pkg_map')
+
+RDO_FULL = '''include:
+  - tags.yml
+  - rdo.yml
+package-configs:
+  rpmfactory-core:
+    name: openstack-%(project)s
+    upstream: https://opendev.org/openstack/%(project)s
+    distgit: https://github.com/rdo-packages/%(project)s-distgit.git
+packages:
+- project: nova
+  conf: rpmfactory-core
+'''
+
+RDO = '''include: rdo-full.yml
+packages:
+- project: oslo-db
+  name: python-oslo-db
+  upstream: https://opendev.org/openstack/oslo.db
+- project: tripleoclient
+  name: python-tripleoclient
+  upstream: https://opendev.org/openstack/python-tripleoclient.git
+'''
+
+TAGS = '''tags:
+  zed: null
+'''
+
+
+class TestRdoinfoPkgMap(testtools.TestCase):
+
+    def setUp(self):
+        super(TestRdoinfoPkgMap, self).setUp()
+        self.rdoinfo_dir = self.useFixture(fixtures.TempDir()).path
+        self.cache_dir = os.path.join(self.rdoinfo_dir, 'cache')
+        for name, content in [('rdo-full.yml', RDO_FULL), ('rdo.yml', RDO),
+                              ('tags.yml', TAGS)]:
+            with open(os.path.join(self.rdoinfo_dir, name), 'w') as f:
+                f.write(content)
+
+    def _git(self, *args):
+        subprocess.check_output(
+            ['git', '-c', 'user.name=test', '-c', 'user.email=test@test',
+             '-c', 'commit.gpgsign=false'] + list(args),
+            cwd=self.rdoinfo_dir, stderr=subprocess.STDOUT)
+
+    def test_load_info(self):
+        info = rdoinfo_pkg_map.load_info(
+            os.path.join(self.rdoinfo_dir, 'rdo-full.yml'))
+
+        # packages of the included files come after the own packages, and
+        # the include cycle of rdo.yml is skipped
+        self.assertEqual(['nova', 'oslo-db', 'tripleoclient'],
+                         [p['project'] for p in info['packages']])
+        self.assertEqual({'zed': None}, info['tags'])
+        self.assertIn('rpmfactory-core', info['package-configs'])
+        self.assertNotIn('include', info)
+
+    def test_expand_package(self):
+        package_configs = {'core': {
+            'name': 'openstack-%(project)s',
+            'upstream': 'https://opendev.org/openstack/%(project)s',
+            'maintainers': ['a@example.com']}}
+
+        package = rdoinfo_pkg_map.expand_package(
+            {'project': 'nova', 'conf': 'core',
+             'upstream': 'https://opendev.org/x/%(name)s'},
+            package_configs)
+
+        self.assertEqual('openstack-nova', package['name'])
+        # package values win over the config template
+        self.assertEqual('https://opendev.org/x/openstack-nova',
+                         package['upstream'])
+        self.assertEqual(['a@example.com'], package['maintainers'])
+
+    def test_find_package(self):
+        index = {'name': {'nova': 'nova'},
+                 'project': {'nova': 'openstack-nova',
+                             'oslo-db': 'python-oslo-db'},
+                 'url': {'nova': 'python-nova', 'oslo-db': 'python-oslo',
+                         'oslo.db': 'python-oslo-db'}}
+
+        # name first, then project, then url basename
+        self.assertEqual('nova',
+                         rdoinfo_pkg_map.find_package(index,
+                                                      'openstack/nova'))
+        self.assertEqual('python-oslo-db',
+                         rdoinfo_pkg_map.find_package(index,
+                                                      'openstack/oslo-db'))
+        self.assertEqual('python-oslo-db',
+                         rdoinfo_pkg_map.find_package(index,
+                                                      'openstack/oslo.db'))
+        self.assertIsNone(rdoinfo_pkg_map.find_package(index, 'x/unknown'))
+
+    def test_map_projects(self):
+        packages, not_found, distgits = rdoinfo_pkg_map.map_projects(
+            self.rdoinfo_dir, ['openstack/nova', 'openstack/oslo.db',
+                               'openstack/python-tripleoclient', 'x/foo'])
+
+        self.assertEqual({'openstack/nova': 'openstack-nova',
+                          'openstack/oslo.db': 'python-oslo-db',
+                          'openstack/python-tripleoclient':
+                              'python-tripleoclient'}, packages)
+        self.assertEqual(['x/foo'], not_found)
+        self.assertEqual(
+            {'distgit': 'https://github.com/rdo-packages/nova-distgit.git'},
+            distgits['openstack-nova'])
+
+    def test_get_index_cached(self):
+        self._git('init', '--quiet')
+        self._git('add', 'rdo-full.yml', 'rdo.yml', 'tags.yml')
+        self._git('commit', '--quiet', '-m', 'rdoinfo')
+        build_index = self.useFixture(fixtures.MockPatchObject(
+            rdoinfo_pkg_map, 'build_index',
+            side_effect=rdoinfo_pkg_map.build_index)).mock
+
+        index = rdoinfo_pkg_map.get_index(self.rdoinfo_dir, 'rdo-full.yml',
+                                          cache_dir=self.cache_dir)
+        self.assertEqual(index, rdoinfo_pkg_map.get_index(
+            self.rdoinfo_dir, 'rdo-full.yml', cache_dir=self.cache_dir))
+
+        # the cache is reused for the same commit
+        self.assertEqual(1, build_index.call_count)
+        self.assertEqual(1, len(os.listdir(self.cache_dir)))
+
+        with open(os.path.join(self.rdoinfo_dir, 'rdo.yml'), 'a') as f:
+            f.write('- project: neutron\n  name: openstack-neutron\n')
+        index = rdoinfo_pkg_map.get_index(self.rdoinfo_dir, 'rdo-full.yml',
+                                          cache_dir=self.cache_dir)
+
+        # a local change of rdoinfo builds the index again
+        self.assertEqual(2, build_index.call_count)
+        self.assertEqual(2, len(os.listdir(self.cache_dir)))
+        self.assertIn('openstack-neutron', index['name'])
+
+    @mock.patch.object(rdoinfo_pkg_map, 'get_rdoinfo_version',
+                       return_value=None)
+    def test_get_index_not_a_git_repo(self, mock_version):
+        rdoinfo_pkg_map.get_index(self.rdoinfo_dir, 'rdo-full.yml',
+                                  cache_dir=self.cache_dir)
+
+        self.assertFalse(os.path.exists(self.cache_dir))
@@ -14,6 +14,8 @@
 #
 #
 
+import shutil
+import tempfile
 import unittest
 import repo_setup.get_hash.hash_info as thi
 import repo_setup.get_hash.exceptions as exc
@@ -225,3 +227,75 @@ class TestGetHashInfo(unittest.TestCase):
                 "create HashInfo object."
             ).format(bad_dlrn_url, '404', response_text_404)
             self.assertIn(error_str, debug_msgs)
+
+
+class TestResolveHashQueries(unittest.TestCase):
+    """In this class we test resolve_hash_queries, which resolves each
+    unique query only once and shares the results through a cache dir.
+    """
+
+    def setUp(self):
+        super(TestResolveHashQueries, self).setUp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+    def test_resolve_hash_queries_dedupe(self):
+        mocked = MagicMock(
+            return_value=(test_fakes.TEST_REPO_MD5, 200))
+        with patch(
+                'repo_setup.get_hash.hash_info.http_get', mocked):
+            results = thi.resolve_hash_queries([
+                {'os_version': 'centos9', 'tag': 'current-podified'},
+                {'os_version': 'centos9', 'tag': 'podified-ci-testing'},
+                {'os_version': 'centos9', 'fact_name': 'dlrn_hash'},
+            ])
+        self.assertEqual(2, mocked.call_count)
+        self.assertEqual(
+            ['current-podified', 'podified-ci-testing', 'current-podified'],
+            [result['tag'] for result in results])
+        self.assertEqual(
+            'https://trunk.rdoproject.org/centos9-master/current-podified/delorean.repo.md5',  # noqa
+            results[2]['dlrn_url'])
+        self.assertEqual(test_fakes.TEST_REPO_MD5, results[2]['full_hash'])
+
+    def test_resolve_hash_queries_dlrn_url(self):
+        mocked = MagicMock(
+            return_value=(test_fakes.TEST_REPO_MD5, 200))
+        with patch(
+                'repo_setup.get_hash.hash_info.http_get', mocked):
+            results = thi.resolve_hash_queries(
+                [{}, {'dlrn_url': 'https://proxy'}],
+                config={'dlrn_url': 'https://foo.bar.baz'})
+        self.assertEqual(
+            ['https://foo.bar.baz/centos8-master/current-podified/delorean.repo.md5',  # noqa
+             'https://proxy/centos8-master/current-podified/delorean.repo.md5'],  # noqa
+            [result['dlrn_url'] for result in results])
+
+    def test_resolve_hash_queries_cache_dir(self):
+        mocked = MagicMock(
+            return_value=(test_fakes.TEST_COMMIT_YAML_COMPONENT, 200))
+        query = {'release': 'victoria', 'component': 'common'}
+        with patch(
+                'repo_setup.get_hash.hash_info.http_get', mocked):
+            first = thi.resolve_hash_queries([query], cache_dir=self.cache_dir)
+            # as resolved by another fork of the same run
+            second = thi.resolve_hash_queries(
+                [query], cache_dir=self.cache_dir)
+        mocked.assert_called_once()
+        self.assertEqual(first, second)
+        self.assertEqual(
+            '476a52df13202a44336c8b01419f8b73b93d93eb_1f5a41f3',
+            second[0]['full_hash'])
+
+    def test_resolve_hash_queries_failure_not_cached(self):
+        mocked = MagicMock(side_effect=[
+            ('NOT FOUND', 404), (test_fakes.TEST_REPO_MD5, 200)])
+        with patch(
+                'repo_setup.get_hash.hash_info.http_get', mocked):
+            with self.assertLogs():
+                self.assertRaises(
+                    exc.HashInvalidDLRNResponse,
+                    thi.resolve_hash_queries, [{}], cache_dir=self.cache_dir)
+            results = thi.resolve_hash_queries(
+                [{}], cache_dir=self.cache_dir)
+        self.assertEqual(test_fakes.TEST_REPO_MD5, results[0]['full_hash'])
@@ -12,11 +12,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
 import subprocess
 import sys
 from unittest import mock
 
 import ddt
+import fixtures
 import testtools
 
 from repo_setup import main
@@ -29,18 +31,39 @@ class TestTripleORepos(testtools.TestCase):
     @mock.patch('repo_setup.main._run_pkg_clean')
     @mock.patch('repo_setup.main._validate_args')
     @mock.patch('repo_setup.main._get_base_path')
-    @mock.patch('repo_setup.main._remove_existing')
-    @mock.patch('repo_setup.main._install_repos')
-    def test_main_centos8(self, mock_install, mock_remove, mock_gbp,
+    @mock.patch('repo_setup.main._sync_repo_files')
+    @mock.patch('repo_setup.main._render_repos')
+    def test_main_centos8(self, mock_render, mock_sync, mock_gbp,
                           mock_validate, mock_clean, mock_distro):
         mock_distro.return_value = ('centos', '8', 'CentOS 8')
         args = main._parse_args('centos', '8')
         mock_path = mock.Mock()
         mock_gbp.return_value = mock_path
-        main.main()
+        mock_render.return_value = {'/etc/yum.repos.d/delorean.repo': ''}
+        mock_sync.return_value = (['/etc/yum.repos.d/delorean.repo'], [])
+        result = main.main()
         mock_validate.assert_called_once_with(args, 'CentOS 8', '8')
         mock_gbp.assert_called_once_with(args)
-        mock_remove.assert_called_once_with(args)
+        mock_render.assert_called_once_with(args, mock_path)
+        mock_sync.assert_called_once_with(args, mock_render.return_value)
+        mock_clean.assert_called_once_with('centos8')
+        # the console script passes the result to sys.exit()
+        self.assertIsNone(result)
+
+    @mock.patch('repo_setup.main._get_distro')
+    @mock.patch('sys.argv', ['repo-setup', 'current', '-d', 'centos8'])
+    @mock.patch('repo_setup.main._run_pkg_clean')
+    @mock.patch('repo_setup.main._validate_args')
+    @mock.patch('repo_setup.main._get_base_path')
+    @mock.patch('repo_setup.main._sync_repo_files')
+    @mock.patch('repo_setup.main._render_repos')
+    def test_main_unchanged(self, mock_render, mock_sync, mock_gbp,
+                            mock_validate, mock_clean, mock_distro):
+        mock_distro.return_value = ('centos', '8', 'CentOS 8')
+        mock_render.return_value = {'/etc/yum.repos.d/delorean.repo': ''}
+        mock_sync.return_value = ([], [])
+        self.assertIsNone(main.main())
+        # the content behind unchanged baseurls, like deps/latest, may move
         mock_clean.assert_called_once_with('centos8')
 
     @mock.patch('repo_setup.main._get_distro')
@@ -49,20 +72,22 @@ class TestTripleORepos(testtools.TestCase):
     @mock.patch('repo_setup.main._validate_args')
     @mock.patch('repo_setup.main._get_base_path')
     @mock.patch('repo_setup.main._install_priorities')
-    @mock.patch('repo_setup.main._remove_existing')
-    @mock.patch('repo_setup.main._install_repos')
-    def test_main_fedora(self, mock_install, mock_remove, mock_ip, mock_gbp,
+    @mock.patch('repo_setup.main._sync_repo_files')
+    @mock.patch('repo_setup.main._render_repos')
+    def test_main_fedora(self, mock_render, mock_sync, mock_ip, mock_gbp,
                          mock_validate, mock_clean, mock_distro):
         mock_distro.return_value = ('centos', '8', 'CentOS 8')
         args = main._parse_args('centos', '8')
         mock_path = mock.Mock()
         mock_gbp.return_value = mock_path
+        mock_render.return_value = {}
+        mock_sync.return_value = ([], ['/etc/yum.repos.d/delorean.repo'])
         main.main()
         mock_validate.assert_called_once_with(args, 'CentOS 8', '8')
         mock_gbp.assert_called_once_with(args)
         assert not mock_ip.called, '_install_priorities should no tbe called'
-        mock_remove.assert_called_once_with(args)
-        mock_install.assert_called_once_with(args, mock_path)
+        mock_sync.assert_called_once_with(args, {})
+        mock_render.assert_called_once_with(args, mock_path)
         mock_clean.assert_called_once_with('fedora')
 
     @mock.patch('requests.get')
@@ -78,6 +103,29 @@ class TestTripleORepos(testtools.TestCase):
         self.assertEqual('88MPH', content)
         mock_get.assert_called_once_with(fake_addr)
 
+    @mock.patch('repo_setup.utils.get_repo_file')
+    @mock.patch('requests.get')
+    def test_get_repo_md5_unchanged(self, mock_get, mock_get_file):
+        mock_get_file.return_value = (
+            'baseurl=%s/centos9-master/ab/cd/abcd' % main.DEFAULT_RDO_MIRROR)
+        args = main._make_args(['current'], 'centos9',
+                               rdo_mirror='http://mirror', cache_dir='cache')
+        content = main._get_repo('http://trunk/current/delorean.repo', args)
+        self.assertEqual('baseurl=http://mirror/centos9-master/ab/cd/abcd',
+                         content)
+        mock_get_file.assert_called_once_with(
+            'http://trunk/current/delorean.repo', mock.ANY, cache_dir='cache')
+        self.assertFalse(mock_get.called)
+
+    @mock.patch('repo_setup.utils.get_repo_file')
+    @mock.patch('requests.get')
+    def test_get_repo_no_cache_dir(self, mock_get, mock_get_file):
+        mock_get.return_value = mock.Mock(text='88MPH', status_code=200)
+        args = main._make_args(['current'], 'centos9', cache_dir=None)
+        content = main._get_repo('http://trunk/current/delorean.repo', args)
+        self.assertEqual('88MPH', content)
+        self.assertFalse(mock_get_file.called)
+
     @mock.patch('requests.get')
     def test_get_repo_404(self, mock_get):
         mock_response = mock.Mock()
@@ -88,35 +136,6 @@ class TestTripleORepos(testtools.TestCase):
         mock_get.assert_called_once_with(fake_addr)
         mock_response.raise_for_status.assert_called_once_with()
 
-    @mock.patch('os.listdir')
-    @mock.patch('os.remove')
-    @mock.patch('os.path.exists')
-    def test_remove_existing(self, mock_exists, mock_remove, mock_listdir):
-        fake_list = ['foo.repo', 'delorean.repo',
-                     'delorean-current-podified.repo',
-                     'repo-setup-centos-opstools.repo',
-                     'repo-setup-centos-highavailability.repo']
-        mock_exists.return_value = [True, False, True, False, True,
-                                    False, False, True]
-        mock_listdir.return_value = fake_list
-        mock_args = mock.Mock()
-        mock_args.output_path = '/etc/yum.repos.d'
-        main._remove_existing(mock_args)
-        self.assertIn(mock.call('/etc/yum.repos.d/delorean.repo'),
-                      mock_remove.mock_calls)
-        self.assertIn(mock.call('/etc/yum.repos.d/'
-                                'delorean-current-podified.repo'),
-                      mock_remove.mock_calls)
-        self.assertIn(
-            mock.call('/etc/yum.repos.d/repo-setup-centos-opstools.repo'),
-            mock_remove.mock_calls)
-        self.assertIn(
-            mock.call('/etc/distro.repos.d/'
-                      'repo-setup-centos-highavailability.repo'),
-            mock_remove.mock_calls)
-        self.assertNotIn(mock.call('/etc/yum.repos.d/foo.repo'),
-                         mock_remove.mock_calls)
-
     # There is no $DISTRO single path anymore, every path has branch
     # specification, even master
     def test_get_base_path(self):
@@ -151,6 +170,7 @@ class TestTripleORepos(testtools.TestCase):
     @mock.patch('repo_setup.main._write_repo')
     def test_install_repos_current(self, mock_write, mock_get):
         args = mock.Mock()
+        args.pin = False
         args.repos = ['current']
         args.branch = 'master'
         args.output_path = 'test'
@@ -167,10 +187,62 @@ class TestTripleORepos(testtools.TestCase):
                           ],
                          mock_write.mock_calls)
 
+    @mock.patch('repo_setup.main._get_pinned_path')
+    @mock.patch('repo_setup.main._get_repo')
+    @mock.patch('repo_setup.main._write_repo')
+    def test_install_repos_current_pinned(self, mock_write, mock_get,
+                                          mock_pinned):
+        args = main._make_args(['current-podified'], 'centos9',
+                               output_path='test', pin=True)
+        mock_pinned.return_value = 'ab/cd/abcd1234'
+        mock_get.side_effect = [
+            '[delorean]\nbaseurl=https://trunk/centos9-master/'
+            'current-podified/\nmetadata_expire=60\n',
+            '[delorean-deps]\nbaseurl=https://deps/\n']
+        main._install_repos(args, 'https://trunk/centos9-master/')
+        mock_pinned.assert_called_once_with(args, 'current-podified')
+        self.assertEqual(
+            [mock.call('https://trunk/centos9-master/ab/cd/abcd1234/'
+                       'delorean.repo', args),
+             mock.call('https://trunk/centos9-master/delorean-deps.repo',
+                       args)],
+            mock_get.mock_calls)
+        self.assertEqual(
+            '[delorean]\nmetadata_expire=never\n'
+            'baseurl=https://trunk/centos9-master/ab/cd/abcd1234/\n',
+            mock_write.mock_calls[0][1][0])
+        self.assertEqual('[delorean-deps]\nbaseurl=https://deps/\n',
+                         mock_write.mock_calls[1][1][0])
+
+    def test_pin_repo(self):
+        content = ('[delorean-current]\n'
+                   'baseurl=http://mirror/centos9-master/current/\n'
+                   '[delorean-common]\n'
+                   'baseurl=http://mirror/centos9-master/current-podified\n')
+        self.assertEqual(
+            '[delorean-current]\nmetadata_expire=never\n'
+            'baseurl=http://mirror/centos9-master/00/11/0011aa/\n'
+            '[delorean-common]\nmetadata_expire=never\n'
+            'baseurl=http://mirror/centos9-master/current-podified\n',
+            main._pin_repo(content, 'http://mirror/centos9-master/',
+                           'current', '00/11/0011aa'))
+
+    @mock.patch('repo_setup.get_hash.hash_info.HashInfo')
+    def test_get_pinned_path(self, mock_hash_info):
+        mock_hash_info.return_value.full_hash = 'abcd1234_5678'
+        args = main._make_args(['current'], 'ubi9', branch='zed',
+                               rdo_mirror='http://mirror')
+        self.assertEqual('ab/cd/abcd1234_5678',
+                         main._get_pinned_path(args, 'current'))
+        mock_hash_info.assert_called_once_with(
+            'centos9', 'zed', None, 'current',
+            config={'dlrn_url': 'http://mirror'})
+
     @mock.patch('repo_setup.main._get_repo')
     @mock.patch('repo_setup.main._write_repo')
     def test_install_repos_current_mitaka(self, mock_write, mock_get):
         args = mock.Mock()
+        args.pin = False
         args.repos = ['current']
         args.branch = 'mitaka'
         args.output_path = 'test'
@@ -191,6 +263,7 @@ class TestTripleORepos(testtools.TestCase):
     @mock.patch('repo_setup.main._write_repo')
     def test_install_repos_deps(self, mock_write, mock_get):
         args = mock.Mock()
+        args.pin = False
         args.repos = ['deps']
         args.branch = 'master'
         args.output_path = 'test'
@@ -205,6 +278,7 @@ class TestTripleORepos(testtools.TestCase):
     @mock.patch('repo_setup.main._write_repo')
     def test_install_repos_current_podified(self, mock_write, mock_get):
         args = mock.Mock()
+        args.pin = False
         args.repos = ['current-podified']
         args.branch = 'master'
         args.output_path = 'test'
@@ -225,6 +299,7 @@ class TestTripleORepos(testtools.TestCase):
     @mock.patch('repo_setup.main._write_repo')
     def test_install_repos_current_podified_dev(self, mock_write, mock_get):
         args = mock.Mock()
+        args.pin = False
         args.repos = ['current-podified-dev']
         args.branch = 'master'
         args.output_path = 'test'
@@ -249,6 +324,7 @@ class TestTripleORepos(testtools.TestCase):
     @mock.patch('repo_setup.main._write_repo')
     def test_install_repos_podified_ci_testing(self, mock_write, mock_get):
         args = mock.Mock()
+        args.pin = False
         args.repos = ['podified-ci-testing']
         args.branch = 'master'
         args.output_path = 'test'
@@ -269,6 +345,7 @@ class TestTripleORepos(testtools.TestCase):
     @mock.patch('repo_setup.main._write_repo')
     def test_install_repos_current_podified_rdo(self, mock_write, mock_get):
         args = mock.Mock()
+        args.pin = False
         args.repos = ['current-podified-rdo']
         args.branch = 'master'
         args.output_path = 'test'
@@ -308,6 +385,7 @@ class TestTripleORepos(testtools.TestCase):
             'master': 'pacific',
         }
         args = mock.Mock()
+        args.pin = False
         args.repos = ['ceph']
         args.branch = branch
         args.output_path = 'test'
@@ -321,6 +399,7 @@ class TestTripleORepos(testtools.TestCase):
     @mock.patch('repo_setup.main._write_repo')
     def test_install_repos_opstools(self, mock_write):
         args = mock.Mock()
+        args.pin = False
         args.repos = ['opstools']
         args.branch = 'master'
         args.output_path = 'test'
@@ -339,6 +418,7 @@ class TestTripleORepos(testtools.TestCase):
     @mock.patch('repo_setup.main._write_repo')
     def test_install_repos_deps_mirror(self, mock_write, mock_get):
         args = mock.Mock()
+        args.pin = False
         args.repos = ['deps']
         args.branch = 'master'
         args.output_path = 'test'
@@ -346,6 +426,7 @@ class TestTripleORepos(testtools.TestCase):
         args.mirror = 'http://foo'
         args.distro = 'centos7'
         args.rdo_mirror = 'http://bar'
+        args.cache_dir = None
         # Abbreviated repos to verify the regex works
         fake_repo = '''
 [delorean-current-podified]
@@ -377,6 +458,7 @@ enabled=1
 
     def test_install_repos_invalid(self):
         args = mock.Mock()
+        args.pin = False
         args.repos = ['roads?']
         self.assertRaises(main.InvalidArguments, main._install_repos, args,
                           'roads/')
@@ -385,6 +467,7 @@ enabled=1
     @mock.patch('repo_setup.main._write_repo')
     def test_install_repos_centos8(self, mock_write, mock_get):
         args = mock.Mock()
+        args.pin = False
         args.repos = ['current']
         args.branch = 'master'
         args.output_path = 'test'
@@ -419,6 +502,7 @@ enabled=1
     @mock.patch('repo_setup.main._write_repo')
     def test_install_repos_centos8_stream(self, mock_write, mock_get):
         args = mock.Mock()
+        args.pin = False
         args.repos = ['current']
         args.branch = 'master'
         args.output_path = 'test'
@@ -454,6 +538,7 @@ enabled=1
     @mock.patch('repo_setup.main._write_repo')
     def test_install_repos_centos9_stream(self, mock_write, mock_get):
         args = mock.Mock()
+        args.pin = False
         args.repos = ['current']
         args.branch = 'master'
         args.output_path = 'test'
@@ -501,6 +586,7 @@ enabled=1
     @mock.patch('repo_setup.main._write_repo')
     def test_install_repos_centos8_no_stream(self, mock_write, mock_get):
         args = mock.Mock()
+        args.pin = False
         args.repos = ['current']
         args.branch = 'master'
         args.output_path = 'test'
@@ -677,22 +763,215 @@ enabled=1
         self.assertEqual(start_repo, main._inject_mirrors(start_repo,
                                                           mock_args))
 
-    @mock.patch('subprocess.check_call')
-    def test_run_pkg_clean(self, mock_check_call):
+    @mock.patch('subprocess.check_output', return_value=b'0 files removed')
+    def test_run_pkg_clean(self, mock_check_output):
         main._run_pkg_clean('centos7')
-        mock_check_call.assert_called_once_with(['yum', 'clean', 'metadata'])
+        mock_check_output.assert_called_once_with(
+            ['yum', 'clean', 'metadata'], stderr=subprocess.STDOUT)
 
-    @mock.patch('subprocess.check_call')
-    def test_run_pkg_clean_fedora(self, mock_check_call):
+    @mock.patch('subprocess.check_output', return_value=b'0 files removed')
+    def test_run_pkg_clean_fedora(self, mock_check_output):
         main._run_pkg_clean('fedora')
-        mock_check_call.assert_called_once_with(['dnf', 'clean', 'metadata'])
+        mock_check_output.assert_called_once_with(
+            ['dnf', 'clean', 'metadata'], stderr=subprocess.STDOUT)
 
-    @mock.patch('subprocess.check_call')
-    def test_run_pkg_clean_fails(self, mock_check_call):
-        mock_check_call.side_effect = subprocess.CalledProcessError(88, '88')
+    @mock.patch('subprocess.check_output')
+    def test_run_pkg_clean_fails(self, mock_check_output):
+        mock_check_output.side_effect = subprocess.CalledProcessError(88, '88')
         self.assertRaises(subprocess.CalledProcessError,
                           main._run_pkg_clean, ['centos7'])
 
+    def test_get_enabled_repo_ids(self):
+        tmp_dir = self.useFixture(fixtures.TempDir()).path
+        repo_file = os.path.join(tmp_dir, 'delorean-deps.repo')
+        with open(repo_file, 'w') as f:
+            f.write('[deps]\nbaseurl=http://a\n'
+                    '[build-deps]\nbaseurl=http://b\nenabled=0\n'
+                    '[other]\nbaseurl=http://c\nenabled=1\n')
+        self.assertEqual(['deps', 'other'],
+                         main._get_enabled_repo_ids([repo_file]))
+
+    @mock.patch('repo_setup.utils.prewarm_dnf_cache')
+    @mock.patch('repo_setup.main._get_enabled_repo_ids')
+    def test_prewarm_repos(self, mock_repo_ids, mock_prewarm):
+        mock_repo_ids.return_value = ['delorean', 'deps']
+        mock_prewarm.return_value = []
+        args = mock.Mock()
+        args.distro = 'centos9'
+        repo_files = ['/etc/yum.repos.d/delorean.repo',
+                      '/etc/yum.repos.d/delorean-deps.repo']
+        main._prewarm_repos(args, repo_files)
+        mock_repo_ids.assert_called_once_with(repo_files)
+        mock_prewarm.assert_called_once_with(['delorean', 'deps'],
+                                             reposdir='/etc/yum.repos.d')
+
+    @mock.patch('repo_setup.utils.prewarm_dnf_cache')
+    def test_prewarm_repos_centos7(self, mock_prewarm):
+        args = mock.Mock()
+        args.distro = 'centos7'
+        main._prewarm_repos(args, ['/etc/yum.repos.d/delorean.repo'])
+        self.assertFalse(mock_prewarm.called)
+
+    @mock.patch('repo_setup.main._get_distro')
+    @mock.patch('sys.argv', ['repo-setup', 'current', '-d', 'centos9',
+                             '--prewarm'])
+    @mock.patch('repo_setup.main._prewarm_repos')
+    @mock.patch('repo_setup.main._run_pkg_clean')
+    @mock.patch('repo_setup.main._validate_args')
+    @mock.patch('repo_setup.main._get_base_path')
+    @mock.patch('repo_setup.main._sync_repo_files')
+    @mock.patch('repo_setup.main._render_repos')
+    def test_main_prewarm(self, mock_render, mock_sync, mock_gbp,
+                          mock_validate, mock_clean, mock_prewarm,
+                          mock_distro):
+        mock_distro.return_value = ('centos', '9', 'CentOS Stream')
+        mock_render.return_value = {'/etc/yum.repos.d/delorean.repo': ''}
+        mock_sync.return_value = ([], [])
+        mock_prewarm.return_value = []
+        main.main()
+        args = mock_render.call_args[0][0]
+        self.assertTrue(args.prewarm)
+        mock_prewarm.assert_called_once_with(
+            args, ['/etc/yum.repos.d/delorean.repo'])
+
+    def test_make_args(self):
+        args = main._make_args(['current-podified', 'ceph'], 'centos9',
+                               branch='zed', output_path='test')
+        self.assertEqual(['current-podified', 'ceph'], args.repos)
+        self.assertEqual('centos9', args.distro)
+        self.assertEqual('zed', args.branch)
+        self.assertEqual('test', args.output_path)
+        self.assertEqual('http://mirror.stream.centos.org', args.mirror)
+        self.assertEqual('http://mirror.stream.centos.org', args.old_mirror)
+        self.assertEqual(main.DEFAULT_RDO_MIRROR, args.rdo_mirror)
+        self.assertFalse(args.pin)
+        self.assertEqual(main.DEFAULT_CACHE_DIR, args.cache_dir)
+        self.assertTrue(args.stream)
+        self.assertFalse(args.no_stream)
+
+    def test_make_args_mirror(self):
+        args = main._make_args(['current'], 'fedora', mirror='http://foo',
+                               stream=False)
+        self.assertEqual('http://foo', args.mirror)
+        self.assertEqual('https://mirrors.fedoraproject.org', args.old_mirror)
+        self.assertTrue(args.no_stream)
+
+    @mock.patch('repo_setup.main._get_repo')
+    def test_render_repos(self, mock_get):
+        args = main._make_args(['current-podified', 'opstools'], 'fake',
+                               mirror='mirror', output_path='test')
+        mock_get.side_effect = ['[delorean]\nMr. Fusion',
+                                '[delorean-deps]\nMr. Fusion']
+        self.assertEqual(
+            {'test/delorean.repo': '[delorean]\nMr. Fusion',
+             'test/delorean-deps.repo': '[delorean-deps]\nMr. Fusion',
+             'test/repo-setup-centos-opstools.repo':
+                 main.OPSTOOLS_REPO_TEMPLATE % {'mirror': 'mirror'}},
+            main._render_repos(args, 'roads/'))
+
+    @mock.patch('os.path.exists', return_value=False)
+    def test_sync_repo_files(self, mock_exists):
+        tmp_dir = self.useFixture(fixtures.TempDir()).path
+        args = main._make_args(['current-podified'], 'centos9',
+                               output_path=tmp_dir)
+        files = dict((name, os.path.join(tmp_dir, name)) for name in [
+            'delorean.repo', 'delorean-deps.repo', 'delorean-old.repo',
+            'other.repo'])
+        for name, path in files.items():
+            with open(path, 'w') as f:
+                f.write('[%s]\n' % name)
+        rendered = {
+            files['delorean.repo']: '[delorean.repo]\n',
+            files['delorean-deps.repo']: '[delorean-deps]\nnew\n',
+            os.path.join(tmp_dir, 'repo-setup-centos-ceph-pacific.repo'):
+                '[ceph]\n',
+        }
+
+        written, removed = main._sync_repo_files(args, rendered)
+
+        self.assertEqual(
+            [files['delorean-deps.repo'],
+             os.path.join(tmp_dir, 'repo-setup-centos-ceph-pacific.repo')],
+            written)
+        self.assertEqual([files['delorean-old.repo']], removed)
+        self.assertEqual(
+            ['delorean-deps.repo', 'delorean.repo', 'other.repo',
+             'repo-setup-centos-ceph-pacific.repo'],
+            sorted(os.listdir(tmp_dir)))
+        with open(files['delorean-deps.repo']) as f:
+            self.assertEqual('[delorean-deps]\nnew\n', f.read())
+        self.assertEqual(([], []), main._sync_repo_files(args, rendered))
+
+    @mock.patch('repo_setup.main._run_pkg_clean')
+    @mock.patch('repo_setup.main._get_distro')
+    @mock.patch('repo_setup.main._get_repo')
+    def test_setup_repos(self, mock_get, mock_distro, mock_clean):
+        tmp_dir = self.useFixture(fixtures.TempDir()).path
+        mock_get.return_value = '[delorean]\nMr. Fusion'
+
+        result = main.setup_repos(['current'], distro='centos9',
+                                  output_path=tmp_dir)
+
+        self.assertFalse(mock_distro.called)
+        self.assertFalse(mock_clean.called)
+        repo_path = os.path.join(tmp_dir, 'delorean.repo')
+        self.assertIn(repo_path, result.repo_files)
+        self.assertEqual(sorted(result.repo_files), sorted(result.written))
+        self.assertEqual([], result.removed)
+        self.assertTrue(result.changed)
+        self.assertIn('total', result.timings)
+
+        result = main.setup_repos(['current'], distro='centos9',
+                                  output_path=tmp_dir)
+        self.assertFalse(result.changed)
+        self.assertEqual([], result.written)
+
+    @mock.patch('repo_setup.main._run_pkg_clean')
+    @mock.patch('repo_setup.main._get_distro')
+    @mock.patch('repo_setup.main._sync_repo_files')
+    @mock.patch('repo_setup.main._render_repos')
+    def test_setup_repos_always_clean(self, mock_render, mock_sync,
+                                      mock_distro, mock_clean):
+        mock_render.return_value = {'test/delorean.repo': ''}
+        mock_sync.return_value = ([], [])
+
+        result = main.setup_repos(['current'], distro='centos9',
+                                  output_path='test', always_clean=True)
+
+        self.assertFalse(result.changed)
+        mock_clean.assert_called_once_with('centos9')
+
+    @mock.patch('repo_setup.main._prewarm_repos')
+    @mock.patch('repo_setup.main._run_pkg_clean')
+    @mock.patch('repo_setup.main._get_distro')
+    @mock.patch('repo_setup.main._sync_repo_files')
+    @mock.patch('repo_setup.main._render_repos')
+    def test_setup_repos_prewarm_written(self, mock_render, mock_sync,
+                                         mock_distro, mock_clean,
+                                         mock_prewarm):
+        mock_render.return_value = {'test/delorean.repo': '',
+                                    'test/delorean-deps.repo': ''}
+        mock_sync.return_value = (['test/delorean.repo'], [])
+
+        main.setup_repos(['current'], distro='centos9', output_path='test',
+                         prewarm=True)
+
+        # metadata wasn't cleaned, only the changed repos are pre-warmed
+        self.assertFalse(mock_clean.called)
+        mock_prewarm.assert_called_once_with(mock.ANY, ['test/delorean.repo'])
+
+        mock_prewarm.reset_mock()
+        mock_sync.return_value = ([], [])
+        main.setup_repos(['current'], distro='centos9', output_path='test',
+                         prewarm=True)
+        self.assertFalse(mock_prewarm.called)
+
+    @mock.patch('repo_setup.main._get_distro')
+    def test_setup_repos_invalid(self, mock_distro):
+        self.assertRaises(main.InvalidArguments, main.setup_repos,
+                          ['current-podified-dev'], distro='fedora',
+                          output_path='test')
+
 
 class TestValidate(testtools.TestCase):
     def setUp(self):
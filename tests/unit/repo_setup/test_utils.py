@@ -0,0 +1,151 @@
+#   Copyright 2021 Red Hat, Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+
+import hashlib
+import os
+from unittest import mock
+
+import fixtures
+import testtools
+
+from repo_setup import utils
+
+
+class TestPrewarmDnfCache(testtools.TestCase):
+
+    def setUp(self):
+        super(TestPrewarmDnfCache, self).setUp()
+        self.cachedir = self.useFixture(fixtures.TempDir()).path
+
+    def _fake_makecache(self, repo_id, reposdir, tmp_cachedir):
+        # Mimic the cache layout created by dnf
+        os.makedirs(os.path.join(tmp_cachedir, repo_id + '-0123456789abcdef',
+                                 'repodata'))
+        with open(os.path.join(tmp_cachedir, repo_id + '.solv'), 'w'):
+            pass
+        with open(os.path.join(tmp_cachedir, 'expired_repos.json'), 'w'):
+            pass
+        return repo_id, 0 if repo_id != 'broken' else 1, ''
+
+    def test_prewarm_dnf_cache(self):
+        with mock.patch.object(utils, '_makecache_repo',
+                               side_effect=self._fake_makecache) as mock_mc:
+            failed = utils.prewarm_dnf_cache(
+                ['delorean', 'deps', 'broken', 'deps'],
+                reposdir='/etc/yum.repos.d', cachedir=self.cachedir)
+
+        self.assertEqual(['broken'], failed)
+        self.assertEqual(3, mock_mc.call_count)
+        self.assertEqual(
+            sorted(['delorean-0123456789abcdef', 'delorean.solv',
+                    'deps-0123456789abcdef', 'deps.solv']),
+            sorted(os.listdir(self.cachedir)))
+
+    def test_prewarm_dnf_cache_no_repos(self):
+        with mock.patch.object(utils, '_makecache_repo') as mock_mc:
+            self.assertEqual([], utils.prewarm_dnf_cache([]))
+        self.assertFalse(mock_mc.called)
+
+    @mock.patch('subprocess.Popen')
+    def test_makecache_repo(self, mock_popen):
+        mock_popen.return_value.communicate.return_value = ('', None)
+        mock_popen.return_value.returncode = 0
+
+        result = utils._makecache_repo('delorean', '/etc/yum.repos.d',
+                                       '/tmp/cache')
+
+        self.assertEqual(('delorean', 0, ''), result)
+        self.assertEqual(
+            ['dnf', 'makecache', '--quiet', '--repo', 'delorean',
+             '--setopt=cachedir=/tmp/cache',
+             '--setopt=reposdir=/etc/yum.repos.d'],
+            mock_popen.call_args[0][0])
+
+
+class TestGetRepoFile(testtools.TestCase):
+
+    URL = 'https://trunk/centos9-master/current-podified/delorean.repo'
+    CONTENT = '[delorean]\nbaseurl=https://trunk/centos9-master/ab/cd/abcd\n'
+    MD5 = hashlib.md5(CONTENT.encode('utf-8')).hexdigest()
+
+    def setUp(self):
+        super(TestGetRepoFile, self).setUp()
+        self.cache_dir = self.useFixture(fixtures.TempDir()).path
+        self.download = mock.Mock(return_value=self.CONTENT)
+
+    @mock.patch.object(utils, 'http_get')
+    def test_get_repo_file_cached(self, mock_get):
+        mock_get.return_value = (self.MD5 + '\n', 200)
+
+        for __ in range(2):
+            self.assertEqual(
+                self.CONTENT,
+                utils.get_repo_file(self.URL, self.download,
+                                    cache_dir=self.cache_dir))
+
+        self.download.assert_called_once_with()
+        mock_get.assert_called_with(self.URL + '.md5')
+        self.assertEqual(2, mock_get.call_count)
+
+    @mock.patch.object(utils, 'http_get')
+    def test_get_repo_file_changed(self, mock_get):
+        mock_get.return_value = (self.MD5, 200)
+        utils.get_repo_file(self.URL, self.download, cache_dir=self.cache_dir)
+        new_content = self.CONTENT + 'priority=1\n'
+        mock_get.return_value = (
+            hashlib.md5(new_content.encode('utf-8')).hexdigest(), 200)
+        self.download.return_value = new_content
+
+        self.assertEqual(
+            new_content,
+            utils.get_repo_file(self.URL, self.download,
+                                cache_dir=self.cache_dir))
+        self.assertEqual(2, self.download.call_count)
+
+    @mock.patch.object(utils, 'http_get')
+    def test_get_repo_file_no_md5(self, mock_get):
+        mock_get.return_value = ('Not Found', 404)
+
+        for __ in range(2):
+            utils.get_repo_file(self.URL, self.download,
+                                cache_dir=self.cache_dir)
+
+        self.assertEqual(2, self.download.call_count)
+        self.assertEqual([], os.listdir(self.cache_dir))
+
+    @mock.patch.object(utils, 'http_get')
+    def test_get_repo_file_md5_mismatch(self, mock_get):
+        # the sidecar was updated before the repo file, don't cache it
+        mock_get.return_value = ('0' * 32, 200)
+
+        utils.get_repo_file(self.URL, self.download, cache_dir=self.cache_dir)
+
+        self.assertEqual([], os.listdir(self.cache_dir))
+
+    @mock.patch.object(utils, 'http_get')
+    def test_get_repo_file_not_repo(self, mock_get):
+        self.assertEqual(
+            self.CONTENT,
+            utils.get_repo_file('https://trunk/centos9-master/commit.yaml',
+                                self.download, cache_dir=self.cache_dir))
+        self.assertFalse(mock_get.called)
+
+    @mock.patch.object(utils, 'http_get')
+    def test_get_repo_file_not_dlrn(self, mock_get):
+        # no sidecar is published for other repo files
+        self.assertEqual(
+            self.CONTENT,
+            utils.get_repo_file('https://mirror/repos/CentOS-Stream.repo',
+                                self.download, cache_dir=self.cache_dir))
+        self.assertFalse(mock_get.called)
@@ -111,3 +111,8 @@ class FakeConfigParser(dict):
 
     def sections(self):
         return self.keys()
+
+    def items(self, section=None, raw=False):
+        if section is None:
+            return super(FakeConfigParser, self).items()
+        return self[section].items()
@@ -12,10 +12,14 @@
 #   License for the specific language governing permissions and limitations
 #   under the License.
 
+import configparser
 import copy
 import json
 import os
+import shutil
+import tempfile
 from unittest import mock
+import urllib.error
 import urllib.request
 
 from . import fakes
@@ -25,11 +29,45 @@ import repo_setup.yum_config.exceptions as exc
 import repo_setup.yum_config.compose_repos as repos
 import repo_setup.yum_config.yum_config as yum_config
 
+FAKE_COMPOSE_RPMS = {
+    "header": {"version": "1.2"},
+    "payload": {
+        "compose": {"id": "fake_compose_id"},
+        "rpms": {
+            "AppStream": {
+                "x86_64": {
+                    "httpd-0:2.4.51-7.el9.src": {
+                        "httpd-0:2.4.51-7.el9.src": {"category": "source"},
+                        "httpd-0:2.4.51-7.el9.x86_64": {
+                            "category": "binary",
+                            "path": "AppStream/x86_64/os/Packages/h.rpm",
+                        },
+                    },
+                },
+            },
+            "BaseOS": {
+                "x86_64": {
+                    "bash-0:5.1.8-2.el9.src": {
+                        "bash-0:5.1.8-2.el9.x86_64": {"category": "binary"},
+                        "bash-doc-0:5.1.8-2.el9.noarch": {
+                            "category": "binary",
+                            "sigkey": ["{fake}"],
+                        },
+                    },
+                },
+            },
+        },
+    },
+}
+
 
 class TestComposeRepos(test_main.TestYumConfigBase):
     """Tests for ComposeRepos class and its methods."""
     def setUp(self):
         super(TestComposeRepos, self).setUp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        self.mock_object(repos, 'COMPOSE_REPOS_CACHE_DIR', self.cache_dir)
         self.repos = self._create_compose_repos_obj(
             dir_path='/tmp'
         )
@@ -41,7 +79,7 @@ class TestComposeRepos(test_main.TestYumConfigBase):
             dir_path=None,
             arch=const.COMPOSE_REPOS_SUPPORTED_ARCHS[0]):
 
-        url_res = mock.Mock()
+        url_res = mock.Mock(headers={})
         json_data = json.dumps(fakes.FAKE_COMPOSE_INFO)
         self.mock_object(urllib.request, "urlopen",
                          mock.Mock(return_value=url_res))
@@ -64,12 +102,125 @@ class TestComposeRepos(test_main.TestYumConfigBase):
                           const.COMPOSE_REPOS_RELEASES[0])
 
     def test__get_compose_info_exc(self):
+        self.mock_object(self.repos, '_get_cache_dir',
+                         mock.Mock(return_value=None))
         self.mock_object(urllib.request, "urlopen",
                          mock.Mock(side_effect=Exception))
 
         self.assertRaises(exc.YumConfigComposeError,
                           self.repos._get_compose_info)
 
+    def test__get_compose_info_cached_compose_id(self):
+        compose_url = ('https://composes.centos.org/'
+                       'CentOS-Stream-8-20211201.0/compose/')
+        self._create_compose_repos_obj(compose_url=compose_url,
+                                       dir_path=self.cache_dir)
+        mock_urlopen = self.mock_object(urllib.request, 'urlopen',
+                                        mock.Mock(side_effect=Exception))
+
+        # compose-id info is immutable and never downloaded again
+        repo_obj = repos.YumComposeRepoConfig(
+            compose_url, const.COMPOSE_REPOS_RELEASES[0],
+            dir_path=self.cache_dir)
+
+        mock_urlopen.assert_not_called()
+        self.assertEqual(fakes.FAKE_COMPOSE_INFO['payload'],
+                         repo_obj.compose_info)
+        self.assertTrue(os.path.isfile(os.path.join(
+            self.cache_dir, 'CentOS-Stream-8-20211201.0.json')))
+
+    def test__get_compose_info_cached_label(self):
+        url_res = mock.Mock(headers={'ETag': '"fake-etag"'})
+        self.mock_object(url_res, 'read', mock.Mock(
+            return_value=json.dumps(fakes.FAKE_COMPOSE_INFO)))
+        mock_urlopen = self.mock_object(urllib.request, 'urlopen',
+                                        mock.Mock(return_value=url_res))
+        self.repos.cache_dir = tempfile.mkdtemp(dir=self.cache_dir)
+
+        self.repos._get_compose_info()
+        # label is still fresh, no request is needed
+        self.repos._get_compose_info()
+        self.assertEqual(1, mock_urlopen.call_count)
+        self.assertTrue(os.path.isfile(os.path.join(
+            self.repos.cache_dir, 'fake_compose_id.json')))
+
+        # expired label is revalidated with a conditional request
+        mock_urlopen.side_effect = urllib.error.HTTPError(
+            self.repos.compose_info_url, 304, 'Not Modified', {}, None)
+        self.mock_object(repos, 'COMPOSE_REPOS_LABEL_TTL', -1)
+
+        compose_info = self.repos._get_compose_info()
+
+        self.assertEqual(2, mock_urlopen.call_count)
+        request = mock_urlopen.call_args[0][0]
+        self.assertEqual('"fake-etag"', request.get_header('If-none-match'))
+        self.assertEqual(fakes.FAKE_COMPOSE_INFO['payload'], compose_info)
+
+    def test_iter_compose_rpms(self):
+        rpms_json = json.dumps(FAKE_COMPOSE_RPMS, indent=4, sort_keys=True)
+
+        self.assertEqual(
+            [('AppStream', 'x86_64', 'httpd-0:2.4.51-7.el9.x86_64'),
+             ('BaseOS', 'x86_64', 'bash-0:5.1.8-2.el9.x86_64'),
+             ('BaseOS', 'x86_64', 'bash-doc-0:5.1.8-2.el9.noarch')],
+            list(repos.iter_compose_rpms(rpms_json.splitlines())))
+        # compact json, in a single line
+        self.assertEqual(
+            3, len(list(repos.iter_compose_rpms([json.dumps(
+                FAKE_COMPOSE_RPMS)]))))
+
+    def test_iter_compose_rpms_chunks(self):
+        compose_rpms = copy.deepcopy(FAKE_COMPOSE_RPMS)
+        compose_rpms['payload']['rpms']['BaseOS']['x86_64'][
+            'bash-0:5.1.8-2.el9.src']['a\\"b,{c}-0:1-1.el9.noarch'] = {}
+        rpms_json = json.dumps(compose_rpms, sort_keys=True)
+        expected = list(repos.iter_compose_rpms([rpms_json]))
+
+        self.assertIn(('BaseOS', 'x86_64', 'a\\"b,{c}-0:1-1.el9.noarch'),
+                      expected)
+        # tokens cut anywhere, including inside strings and escapes
+        for size in (1, 2, 3, 7):
+            chunks = [rpms_json[i:i + size]
+                      for i in range(0, len(rpms_json), size)]
+            self.assertEqual(expected,
+                             list(repos.iter_compose_rpms(chunks)))
+
+    def test_select_variants(self):
+        index = {
+            'pkg1': ['AppStream'],
+            'pkg2': ['AppStream', 'CRB'],
+            'pkg3': ['CRB', 'HighAvailability'],
+            'pkg4': ['BaseOS'],
+        }
+
+        self.assertEqual(
+            (['BaseOS', 'AppStream', 'CRB'], ['pkg5']),
+            repos.select_variants(
+                index, ['pkg1', 'pkg2', 'pkg3', 'pkg4', 'pkg5'],
+                required=['BaseOS']))
+
+    def test_get_variants_for_packages(self):
+        url_res = mock.Mock()
+        rpms_json = json.dumps(FAKE_COMPOSE_RPMS, indent=4).encode('utf-8')
+        # content is downloaded in chunks
+        self.mock_object(url_res, 'read', mock.Mock(
+            side_effect=[rpms_json[:100], rpms_json[100:], b'']))
+        mock_urlopen = self.mock_object(urllib.request, 'urlopen',
+                                        mock.Mock(return_value=url_res))
+        self.repos.arches = ['x86_64']
+
+        self.assertEqual(['BaseOS', 'AppStream'],
+                         self.repos.get_variants_for_packages(['httpd']))
+        # package index is cached by compose id
+        self.assertEqual(['BaseOS'],
+                         self.repos.get_variants_for_packages(['bash-doc']))
+        mock_urlopen.assert_called_once_with(
+            '/'.join([self.repos.compose_url.rstrip('/'),
+                      'metadata/rpms.json']))
+        self.assertRaises(exc.YumConfigComposeError,
+                          self.repos.get_variants_for_packages,
+                          ['fake-package'])
+
     def test_enable_compose_repos(self):
         self.mock_object(self.repos, 'add_section')
         self.repos.enable_compose_repos(
@@ -77,6 +228,140 @@ class TestComposeRepos(test_main.TestYumConfigBase):
             override_repos=False
         )
 
+    def test_enable_compose_repos_override_repos(self):
+        repos_dir = tempfile.mkdtemp(dir=self.cache_dir)
+        self.repos.dir_path = repos_dir
+        self.repos.compose_info = copy.deepcopy(
+            fakes.FAKE_COMPOSE_INFO['payload'])
+        for var, info in self.repos.compose_info['variants'].items():
+            info['paths']['repository'] = {self.repos.arch: var + '/os'}
+        other_file = os.path.join(repos_dir, 'other.repo')
+        with open(other_file, 'w') as f:
+            f.write('[appstream]\nenabled=1\n[baseos]\nenabled=1\n'
+                    '[extras]\nenabled=1\n')
+        mock_write = self.mock_object(yum_config, 'write_config_file',
+                                      mock.Mock(wraps=yum_config.
+                                                write_config_file))
+        mock_scan = self.mock_object(
+            self.repos, '_get_sections_config_files',
+            mock.Mock(wraps=self.repos._get_sections_config_files))
+
+        result = self.repos.enable_compose_repos(override_repos=True)
+
+        self.assertTrue(result)
+        mock_scan.assert_called_once_with(
+            {'appstream': mock.ANY, 'baseos': mock.ANY}, dir_path=repos_dir)
+        # a single write disables all conflicting sections of the file
+        self.assertEqual(
+            1, [c[0][0] for c in mock_write.call_args_list].count(other_file))
+        self.assertEqual(
+            {'appstream': {'enabled': ('1', '0')},
+             'baseos': {'enabled': ('1', '0')}},
+            self.repos.changes[other_file])
+
+    def test_get_repodata_checksums(self):
+        repomd = (
+            '<repomd xmlns="http://linux.duke.edu/metadata/repo">'
+            '<revision>1</revision>'
+            '<data type="primary"><checksum type="sha256">abc</checksum>'
+            '</data></repomd>')
+        self.mock_object(repos, 'fetch_repomd',
+                         mock.Mock(return_value=(repomd, 0.1)))
+
+        self.assertEqual({'primary': 'abc'},
+                         repos.get_repodata_checksums('http://fake'))
+
+        repos.fetch_repomd.side_effect = IOError
+        self.assertIsNone(repos.get_repodata_checksums('http://fake'))
+
+    def test_enable_compose_repos_incremental(self):
+        repos_dir = tempfile.mkdtemp(dir=self.cache_dir)
+        self.repos.dir_path = repos_dir
+        self.repos.compose_info = copy.deepcopy(
+            fakes.FAKE_COMPOSE_INFO['payload'])
+        for var, info in self.repos.compose_info['variants'].items():
+            info['paths']['repository'] = {self.repos.arch: var + '/os'}
+        old_file = os.path.join(repos_dir, 'old_compose_id.repo')
+        with open(old_file, 'w') as f:
+            f.write('[appstream]\nbaseurl=http://old/AppStream/os\n'
+                    'enabled=1\n'
+                    '[baseos]\nbaseurl=http://old/BaseOS/os\nenabled=1\n')
+
+        def fake_checksums(base_url):
+            if 'AppStream' in base_url:
+                return {'primary': base_url}
+            return {'primary': 'same'}
+
+        self.mock_object(repos, 'get_repodata_checksums', fake_checksums)
+
+        result = self.repos.enable_compose_repos(override_repos=True,
+                                                 incremental=True)
+
+        self.assertTrue(result)
+        self.assertEqual({self.repos.arch: ['AppStream']},
+                         self.repos.changed_variants)
+        self.assertFalse(os.path.exists(
+            os.path.join(repos_dir, 'fake_compose_id-BaseOS.repo')))
+        self.assertTrue(os.path.exists(
+            os.path.join(repos_dir, 'fake_compose_id-AppStream.repo')))
+        # only the changed variant is disabled in the old repo file
+        self.assertEqual({'appstream': {'enabled': ('1', '0')}},
+                         self.repos.changes[old_file])
+
+    def test_enable_compose_repos_multiple_arches(self):
+        output_dir = tempfile.mkdtemp(dir=self.cache_dir)
+        self.repos.arches = const.COMPOSE_REPOS_SUPPORTED_ARCHS
+        self.repos.output_dir_template = os.path.join(output_dir, '{arch}')
+        self.repos.compose_info = copy.deepcopy(
+            fakes.FAKE_COMPOSE_INFO['payload'])
+        for var, info in self.repos.compose_info['variants'].items():
+            info['paths']['repository'] = dict(
+                (arch, '%s/%s/os' % (var, arch))
+                for arch in const.COMPOSE_REPOS_SUPPORTED_ARCHS)
+
+        result = self.repos.enable_compose_repos(variants=['BaseOS'])
+
+        self.assertTrue(result)
+        for arch in const.COMPOSE_REPOS_SUPPORTED_ARCHS:
+            repo_file = os.path.join(output_dir, arch,
+                                     'fake_compose_id-BaseOS.repo')
+            config = configparser.ConfigParser()
+            config.read(repo_file)
+            self.assertTrue(
+                config.get('baseos', 'baseurl').endswith(
+                    'BaseOS/%s/os' % arch))
+
+    def test_enable_compose_repos_multiple_arches_failure(self):
+        output_dir = tempfile.mkdtemp(dir=self.cache_dir)
+        self.repos.arches = const.COMPOSE_REPOS_SUPPORTED_ARCHS
+        self.repos.output_dir_template = os.path.join(output_dir, '{arch}')
+        self.repos.compose_info = copy.deepcopy(
+            fakes.FAKE_COMPOSE_INFO['payload'])
+        for var, info in self.repos.compose_info['variants'].items():
+            info['paths']['repository'] = dict(
+                (arch, '%s/%s/os' % (var, arch))
+                for arch in const.COMPOSE_REPOS_SUPPORTED_ARCHS)
+        last_dir = os.path.join(output_dir,
+                                const.COMPOSE_REPOS_SUPPORTED_ARCHS[-1])
+        os.makedirs(last_dir)
+        with open(os.path.join(last_dir, 'fake_compose_id-BaseOS.repo'),
+                  'w') as f:
+            f.write('not an ini file')
+        mock_write = self.mock_object(yum_config, 'write_config_file')
+
+        self.assertRaises(exc.YumConfigFileParseError,
+                          self.repos.enable_compose_repos,
+                          variants=['BaseOS'])
+
+        # the repos of the other arches are not written either
+        mock_write.assert_not_called()
+        self.assertEqual({}, self.repos._pending_configs)
+
+    def test_multiple_arches_without_template(self):
+        self.assertRaises(exc.YumConfigComposeError,
+                          self._create_compose_repos_obj,
+                          arch=const.COMPOSE_REPOS_SUPPORTED_ARCHS)
+
     @mock.patch('builtins.open')
     def test_add_section(self, open):
         self.mock_object(os.path, 'isfile', mock.Mock(return_value=False))
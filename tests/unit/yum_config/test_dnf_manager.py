@@ -12,10 +12,17 @@
 #   License for the specific language governing permissions and limitations
 #   under the License.
 import ddt
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
 from unittest import mock
 
 from . import test_main
 import repo_setup.yum_config.dnf_manager as dnf_mgr
+import repo_setup.yum_config.exceptions as exc
 
 
 @ddt.ddt
@@ -25,6 +32,14 @@ class TestDnfManager(test_main.TestYumConfigBase):
     def setUp(self):
         super(TestDnfManager, self).setUp()
         self.dnf = dnf_mgr.DnfModuleManager()
+        # dnf.Base is a shared mock, don't keep calls from other tests
+        self.dnf.base.reset_mock()
+        self.dnf.base.conf.optional_metadata_types = ['comps', 'filelists']
+        # optional metadata types each time the sack is filled
+        self.loaded_types = []
+        self.dnf.base.fill_sack.side_effect = (
+            lambda **kwargs: self.loaded_types.append(
+                list(self.dnf.base.conf.optional_metadata_types)))
 
     @ddt.data(
         {'module': 'fake', 'stream': None, 'profile': None},
@@ -69,3 +84,161 @@ class TestDnfManager(test_main.TestYumConfigBase):
             fake_module, stream=fake_stream, profile=fake_profile)
         mock_op.assert_called_once()
         mock_transaction.assert_called_once()
+
+    @ddt.data(('enable', False), ('disable', False), ('reset', False),
+              ('install', True), ('remove', True))
+    @ddt.unpack
+    def test_module_operations_sack_loading(self, operation, full):
+        self.mock_object(self.dnf, '_do_transaction')
+
+        getattr(self.dnf, operation + "_module")('fake_module')
+        # sack is loaded only once
+        getattr(self.dnf, operation + "_module")('fake_module')
+
+        self.dnf.base.read_all_repos.assert_called_once_with()
+        self.dnf.base.fill_sack.assert_called_once_with(
+            load_system_repo=full)
+        expected_types = ['comps', 'filelists'] if full else ['comps']
+        self.assertEqual([expected_types], self.loaded_types)
+
+    def test_load_sack_modules_then_full(self):
+        self.dnf._load_sack(full=False)
+        self.dnf._load_sack(full=True)
+
+        self.assertEqual([['comps'], ['comps', 'filelists']], self.loaded_types)
+        self.assertEqual(['comps', 'filelists'],
+                         self.dnf.base.conf.optional_metadata_types)
+
+    def test_load_sack_modules_old_dnf(self):
+        # dnf versions without optional metadata types
+        del self.dnf.base.conf.optional_metadata_types
+        self.dnf.base.fill_sack.side_effect = None
+
+        self.dnf._load_sack(full=False)
+
+        self.dnf.base.fill_sack.assert_called_once_with(
+            load_system_repo=False)
+        self.assertFalse(
+            hasattr(self.dnf.base.conf, 'optional_metadata_types'))
+
+    def _set_repos(self, expired):
+        repos = []
+        for repo_id in ['appstream', 'baseos']:
+            repo = mock.Mock(id=repo_id)
+            repo._repo.isExpired.return_value = repo_id in expired
+            repos.append(repo)
+        self.dnf.base.repos.iter_enabled.return_value = repos
+
+    def test_load_sack_cacheonly(self):
+        self.dnf.cacheonly = True
+        self._set_repos(expired=[])
+
+        self.dnf._load_sack()
+
+        self.dnf.base.fill_sack_from_repos_in_cache.assert_called_once_with(
+            load_system_repo=True)
+        self.dnf.base.fill_sack.assert_not_called()
+
+    def test_load_sack_cacheonly_expired(self):
+        self.dnf.cacheonly = True
+        self._set_repos(expired=['baseos'])
+
+        self.dnf._load_sack(full=False)
+
+        self.dnf.base.fill_sack_from_repos_in_cache.assert_called_once_with(
+            load_system_repo=False)
+        self.dnf.base.fill_sack.assert_called_once_with(
+            load_system_repo=False)
+        self.assertEqual(['baseos'], self.dnf._get_expired_repos())
+
+    def test_load_sack_cacheonly_not_cached(self):
+        self.dnf.cacheonly = True
+        self.mock_object(sys.modules['dnf'].exceptions, 'RepoError', IOError)
+        self.dnf.base.fill_sack_from_repos_in_cache.side_effect = IOError
+
+        self.dnf._load_sack(full=False)
+
+        self.dnf.base.fill_sack.assert_called_once_with(
+            load_system_repo=False)
+
+    def test_run_operations(self):
+        mock_transaction = self.mock_object(self.dnf, '_do_transaction')
+        mock_enable = self.mock_object(self.dnf.module_base, 'enable')
+        mock_install = self.mock_object(self.dnf.module_base, 'install')
+
+        self.dnf.run_operations([
+            ('enable', 'fake_module1', 'fake_stream', None),
+            ('install', 'fake_module1', None, 'fake_profile'),
+            ('install', 'fake_module2', None, None),
+        ])
+
+        mock_enable.assert_called_once_with(['fake_module1:fake_stream'])
+        mock_install.assert_has_calls([
+            mock.call(['fake_module1/fake_profile']),
+            mock.call(['fake_module2'])])
+        self.dnf.base.fill_sack.assert_called_once_with(load_system_repo=True)
+        self.dnf.base.resolve.assert_called_once_with(allow_erasing=False)
+        # all packages are downloaded and installed at once
+        self.dnf.base.download_packages.assert_called_once_with(
+            self.dnf.base.transaction.install_set)
+        mock_transaction.assert_called_once_with()
+
+    def test_run_operations_invalid_operation(self):
+        self.assertRaises(exc.YumConfigInvalidOption,
+                          self.dnf.run_operations,
+                          [('fake_op', 'fake_module', None, None)])
+
+    @ddt.data(('fake', ('fake', None, None)),
+              ('fake:1.0', ('fake', '1.0', None)),
+              ('fake/prof', ('fake', None, 'prof')),
+              ('fake:1.0/prof', ('fake', '1.0', 'prof')))
+    @ddt.unpack
+    def test_parse_module_spec(self, module_spec, expected):
+        self.assertEqual(expected, dnf_mgr.parse_module_spec(module_spec))
+
+    def test_prefetch_modules(self):
+        mock_transaction = self.mock_object(self.dnf, '_do_transaction')
+        mock_install = self.mock_object(self.dnf.module_base, 'install')
+        self.dnf.base.transaction.install_set = [
+            mock.Mock(downloadsize=100), mock.Mock(downloadsize=23)]
+
+        result = self.dnf.prefetch_modules(
+            [('fake_module1', 'fake_stream', 'fake_profile'),
+             ('fake_module2', None, None)])
+
+        self.assertEqual({'packages': 2, 'download_size': 123}, result)
+        mock_install.assert_has_calls([
+            mock.call(['fake_module1:fake_stream/fake_profile']),
+            mock.call(['fake_module2'])])
+        self.dnf.base.resolve.assert_called_once_with()
+        self.dnf.base.download_packages.assert_called_once_with(
+            self.dnf.base.transaction.install_set)
+        # packages are only downloaded, nothing is installed
+        mock_transaction.assert_not_called()
+
+    def test_prefetch_in_background(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        status_file = os.path.join(tmp_dir, 'status', 'prefetch.json')
+        mock_dnf_mod = mock.Mock()
+        mock_dnf_mod.prefetch_modules.return_value = {
+            'packages': 1, 'download_size': 10}
+        mock_dnf_mod_obj = self.mock_object(
+            dnf_mgr, 'DnfModuleManager', mock.Mock(return_value=mock_dnf_mod))
+
+        dnf_mgr.prefetch_in_background([('fake_module', None, None)],
+                                       status_file=status_file)
+
+        # dnf is only started by the background process
+        mock_dnf_mod_obj.assert_not_called()
+        deadline = time.time() + 10
+        while True:
+            with open(status_file) as f:
+                status = json.load(f)
+            if status['status'] != 'running' or time.time() > deadline:
+                break
+            time.sleep(0.05)
+        self.assertEqual('done', status['status'])
+        self.assertEqual({'packages': 1, 'download_size': 10},
+                         status['result'])
+        self.assertNotEqual(os.getpid(), status['pid'])
@@ -13,6 +13,7 @@
 #   under the License.
 
 import ddt
+import json
 import sys
 import unittest
 from unittest import mock
@@ -23,6 +24,8 @@ import repo_setup.yum_config.__main__ as main
 import repo_setup.yum_config.compose_repos as repos
 import repo_setup.yum_config.constants as const
 import repo_setup.yum_config.dnf_manager as dnf_mgr
+import repo_setup.yum_config.module_query as module_query
+import repo_setup.yum_config.repo_audit as repo_audit
 import repo_setup.yum_config.utils as utils
 import repo_setup.yum_config.yum_config as yum_cfg
 
@@ -56,7 +59,7 @@ class TestYumConfigMain(TestYumConfigBase):
                         '--config-file-path', fakes.FAKE_FILE_PATH,
                         '--down-url', fakes.FAKE_REPO_DOWN_URL]
 
-        yum_repo_obj = mock.Mock()
+        yum_repo_obj = mock.Mock(changed=False)
         mock_update_section = self.mock_object(yum_repo_obj,
                                                'add_or_update_section')
         mock_yum_repo_obj = self.mock_object(
@@ -67,11 +70,12 @@ class TestYumConfigMain(TestYumConfigBase):
         expected_dict = {'key1': 'value1', 'key2': 'value2'}
 
         mock_yum_repo_obj.assert_called_once_with(dir_path=const.YUM_REPO_DIR,
-                                                  environment_file=None)
+                                                  environment_file=None,
+                                                  dry_run=False)
         mock_update_section.assert_called_once_with(
             'fake_repo', set_dict=expected_dict,
             file_path=fakes.FAKE_FILE_PATH, enabled=True,
-            from_url=fakes.FAKE_REPO_DOWN_URL)
+            from_url=fakes.FAKE_REPO_DOWN_URL, mirrors=None)
 
     def test_main_repo_from_url(self):
         sys.argv[1:] = ['repo', '--enable',
@@ -79,7 +83,7 @@ class TestYumConfigMain(TestYumConfigBase):
                         '--config-file-path', fakes.FAKE_FILE_PATH,
                         '--down-url', fakes.FAKE_REPO_DOWN_URL]
 
-        yum_repo_obj = mock.Mock()
+        yum_repo_obj = mock.Mock(changed=False)
         mock_update_all_sections = self.mock_object(
             yum_repo_obj, 'add_or_update_all_sections_from_url')
         mock_yum_repo_obj = self.mock_object(
@@ -90,10 +94,11 @@ class TestYumConfigMain(TestYumConfigBase):
         expected_dict = {'key1': 'value1', 'key2': 'value2'}
 
         mock_yum_repo_obj.assert_called_once_with(dir_path=const.YUM_REPO_DIR,
-                                                  environment_file=None)
+                                                  environment_file=None,
+                                                  dry_run=False)
         mock_update_all_sections.assert_called_once_with(
             fakes.FAKE_REPO_DOWN_URL, file_path=fakes.FAKE_FILE_PATH,
-            set_dict=expected_dict, enabled=True)
+            set_dict=expected_dict, enabled=True, mirrors=None)
 
     @ddt.data('enable', 'disable', 'reset', 'install', 'remove')
     def test_main_module(self, operation):
@@ -101,20 +106,93 @@ class TestYumConfigMain(TestYumConfigBase):
                         'fake_stream', '--profile', 'fake_profile']
 
         mock_dnf_mod = mock.Mock()
-        mock_op = self.mock_object(mock_dnf_mod, operation + '_module')
+        mock_op = self.mock_object(mock_dnf_mod, 'run_operations')
         mock_dnf_mod_obj = self.mock_object(
             dnf_mgr, 'DnfModuleManager',
             mock.Mock(return_value=mock_dnf_mod))
 
         main.main()
 
-        mock_dnf_mod_obj.assert_called_once()
+        mock_dnf_mod_obj.assert_called_once_with(cacheonly=False)
         mock_op.assert_called_once_with(
-            'fake_module', stream='fake_stream', profile='fake_profile')
+            [(operation, 'fake_module', 'fake_stream', 'fake_profile')])
+
+    @mock.patch('builtins.print')
+    def test_main_module_list(self, mock_print):
+        sys.argv[1:] = ['module', 'list', 'nodejs', '--cacheonly',
+                        '--config-dir-path', fakes.FAKE_DIR_PATH,
+                        '--output-format', 'json']
+        modules = [{'name': 'nodejs', 'stream': '12'}]
+        query_obj = mock.Mock()
+        self.mock_object(query_obj, 'list_modules',
+                         mock.Mock(return_value=modules))
+        mock_query_obj = self.mock_object(
+            module_query, 'DnfModuleQuery', mock.Mock(return_value=query_obj))
+        mock_dnf_mod_obj = self.mock_object(dnf_mgr, 'DnfModuleManager')
+
+        main.main()
+
+        mock_query_obj.assert_called_once_with(
+            dir_path=fakes.FAKE_DIR_PATH, cacheonly=True)
+        query_obj.list_modules.assert_called_once_with(names=['nodejs'])
+        mock_print.assert_called_once_with(json.dumps(modules, indent=2))
+        mock_dnf_mod_obj.assert_not_called()
+
+    def test_main_module_without_name(self):
+        sys.argv[1:] = ['module', 'enable']
+
+        with self.assertRaises(SystemExit) as command:
+            main.main()
+
+        self.assertEqual(2, command.exception.code)
+
+    def test_main_module_prefetch(self):
+        sys.argv[1:] = ['module', 'prefetch', 'fake_module:fake_stream',
+                        '--profile', 'fake_profile']
+        mock_dnf_mod = mock.Mock()
+        mock_prefetch = self.mock_object(
+            mock_dnf_mod, 'prefetch_modules',
+            mock.Mock(return_value={'packages': 1, 'download_size': 10}))
+        self.mock_object(dnf_mgr, 'DnfModuleManager',
+                         mock.Mock(return_value=mock_dnf_mod))
+
+        main.main()
+
+        mock_prefetch.assert_called_once_with(
+            [('fake_module', 'fake_stream', 'fake_profile')])
+
+    def test_main_module_prefetch_background(self):
+        sys.argv[1:] = ['module', 'prefetch', 'fake_module', '--background',
+                        '--status-file', '/tmp/fake_status.json']
+        mock_background = self.mock_object(dnf_mgr, 'prefetch_in_background')
+        mock_dnf_mod_obj = self.mock_object(dnf_mgr, 'DnfModuleManager')
+
+        main.main()
+
+        mock_background.assert_called_once_with(
+            [('fake_module', None, None)],
+            status_file='/tmp/fake_status.json', cacheonly=False)
+        mock_dnf_mod_obj.assert_not_called()
+
+    def test_main_module_multiple_specs(self):
+        sys.argv[1:] = ['module', 'enable', 'fake_module1:stream1',
+                        'fake_module2:stream2/profile2', 'fake_module3',
+                        '--profile', 'fake_profile']
+        mock_dnf_mod = mock.Mock()
+        mock_op = self.mock_object(mock_dnf_mod, 'run_operations')
+        self.mock_object(dnf_mgr, 'DnfModuleManager',
+                         mock.Mock(return_value=mock_dnf_mod))
+
+        main.main()
+
+        mock_op.assert_called_once_with(
+            [('enable', 'fake_module1', 'stream1', 'fake_profile'),
+             ('enable', 'fake_module2', 'stream2', 'profile2'),
+             ('enable', 'fake_module3', None, 'fake_profile')])
 
     def test_main_global_conf(self):
         sys.argv[1:] = ['global', '--set-opts', 'key1=value1', 'key2=value2']
-        yum_global_obj = mock.Mock()
+        yum_global_obj = mock.Mock(changed=False)
         mock_update_section = self.mock_object(
             yum_global_obj, 'update_section')
         mock_yum_global_obj = self.mock_object(
@@ -125,9 +203,89 @@ class TestYumConfigMain(TestYumConfigBase):
         expected_dict = {'key1': 'value1', 'key2': 'value2'}
 
         mock_yum_global_obj.assert_called_once_with(file_path=None,
-                                                    environment_file=None)
+                                                    environment_file=None,
+                                                    dry_run=False)
         mock_update_section.assert_called_once_with('main', expected_dict)
 
+    def test_main_global_conf_dry_run(self):
+        sys.argv[1:] = ['global', '--set-opts', 'key1=value1', '--dry-run']
+        yum_global_obj = mock.Mock(changed=True, dry_run=True)
+        self.mock_object(yum_global_obj, 'get_diff', mock.Mock(
+            return_value=[{'before_header': fakes.FAKE_FILE_PATH,
+                           'after_header': fakes.FAKE_FILE_PATH,
+                           'before': '[main]\n',
+                           'after': '[main]\nkey1=value1\n'}]))
+        mock_yum_global_obj = self.mock_object(
+            yum_cfg, 'YumGlobalConfig',
+            mock.Mock(return_value=yum_global_obj))
+
+        main.main()
+
+        mock_yum_global_obj.assert_called_once_with(file_path=None,
+                                                    environment_file=None,
+                                                    dry_run=True)
+        yum_global_obj.get_diff.assert_called_once_with()
+
+    @mock.patch('repo_setup.yum_config.__main__.prewarm_dnf_cache')
+    def test_main_repo_prewarm(self, mock_prewarm):
+        sys.argv[1:] = ['repo', '--name', 'fake_repo', '--enable',
+                        '--config-dir-path', fakes.FAKE_DIR_PATH,
+                        '--prewarm']
+        yum_repo_obj = mock.Mock(changed=False, dry_run=False,
+                                 dir_path=fakes.FAKE_DIR_PATH)
+        self.mock_object(yum_repo_obj, 'get_changed_repos',
+                         mock.Mock(return_value=['fake_repo']))
+        self.mock_object(yum_cfg, 'YumRepoConfig',
+                         mock.Mock(return_value=yum_repo_obj))
+        mock_prewarm.return_value = []
+
+        main.main()
+
+        mock_prewarm.assert_called_once_with(['fake_repo'],
+                                             reposdir=fakes.FAKE_DIR_PATH)
+
+    def test_main_repo_resolve_mirrors(self):
+        sys.argv[1:] = ['repo', '--name', 'fake_repo',
+                        '--config-file-path', fakes.FAKE_FILE_PATH,
+                        '--resolve-mirrors', '--mirrors-ttl', '60',
+                        '--verify-mirrors']
+        yum_repo_obj = mock.Mock(changed=False)
+        mock_update_section = self.mock_object(yum_repo_obj,
+                                               'add_or_update_section')
+        self.mock_object(yum_cfg, 'YumRepoConfig',
+                         mock.Mock(return_value=yum_repo_obj))
+
+        main.main()
+
+        # mirrors are resolved in the same write as the other options
+        mock_update_section.assert_called_once_with(
+            'fake_repo', set_dict={}, file_path=fakes.FAKE_FILE_PATH,
+            enabled=None, from_url=None,
+            mirrors={'ttl': 60, 'verify': True,
+                     'max_mirrors': const.YUM_REPO_MIRRORS_MAX})
+        self.assertFalse(yum_repo_obj.resolve_mirrors.called)
+
+    @mock.patch('builtins.print')
+    def test_main_audit(self, mock_print):
+        sys.argv[1:] = ['audit', '--config-dir-path', fakes.FAKE_DIR_PATH,
+                        '--timeout', '5', '--max-age', '3600',
+                        '--output-format', 'json', '--disable-failed']
+        results = [{'repo': 'fake_repo', 'status': 'unreachable'}]
+        audit_obj = mock.Mock(changed=False)
+        self.mock_object(audit_obj, 'audit',
+                         mock.Mock(return_value=results))
+        mock_disable = self.mock_object(audit_obj, 'disable_failed_repos')
+        mock_audit_obj = self.mock_object(
+            repo_audit, 'YumRepoAudit', mock.Mock(return_value=audit_obj))
+
+        main.main()
+
+        mock_audit_obj.assert_called_once_with(
+            dir_path=fakes.FAKE_DIR_PATH, dry_run=False)
+        audit_obj.audit.assert_called_once_with(timeout=5.0, max_age=3600)
+        mock_print.assert_called_once_with(json.dumps(results, indent=2))
+        mock_disable.assert_called_once_with(results)
+
     def test_main_no_command(self):
         sys.argv[1:] = []
         with self.assertRaises(SystemExit) as command:
@@ -173,7 +331,7 @@ class TestYumConfigMain(TestYumConfigBase):
             '--disable-repos', fakes.FAKE_REPO_PATH,
             '--arch', const.COMPOSE_REPOS_SUPPORTED_ARCHS[0],
         ]
-        repos_obj = mock.Mock()
+        repos_obj = mock.Mock(changed=False)
         mock_yum_global_obj = self.mock_object(
             repos, 'YumComposeRepoConfig',
             mock.Mock(return_value=repos_obj))
@@ -190,14 +348,40 @@ class TestYumConfigMain(TestYumConfigBase):
             fakes.FAKE_COMPOSE_URL,
             const.COMPOSE_REPOS_RELEASES[0],
             dir_path=const.YUM_REPO_DIR,
-            arch=const.COMPOSE_REPOS_SUPPORTED_ARCHS[0],
-            environment_file=None)
+            arch=[const.COMPOSE_REPOS_SUPPORTED_ARCHS[0]],
+            environment_file=None,
+            dry_run=False,
+            cache_dir=const.COMPOSE_REPOS_CACHE_DIR,
+            output_dir_template=None)
         mock_enable_composes.assert_called_once_with(
-            variants=['fake_variant'], override_repos=False)
+            variants=['fake_variant'], override_repos=False,
+            incremental=False)
         mock_update_all.assert_called_once_with(
             fakes.FAKE_REPO_PATH, enabled=False
         )
 
+    @mock.patch('builtins.open',
+                mock.mock_open(read_data='pkg1\n# comment\n\npkg2 # a\n'))
+    def test_main_enable_compose_repos_packages_file(self):
+        sys.argv[1:] = [
+            'enable-compose-repos', '--compose-url', fakes.FAKE_COMPOSE_URL,
+            '--packages-file', fakes.FAKE_FILE_PATH,
+        ]
+        repos_obj = mock.Mock(changed=False)
+        self.mock_object(repos, 'YumComposeRepoConfig',
+                         mock.Mock(return_value=repos_obj))
+        mock_get_variants = self.mock_object(
+            repos_obj, 'get_variants_for_packages',
+            mock.Mock(return_value=['BaseOS']))
+        mock_enable_composes = self.mock_object(
+            repos_obj, 'enable_compose_repos')
+
+        main.main()
+
+        mock_get_variants.assert_called_once_with(['pkg1', 'pkg2'])
+        mock_enable_composes.assert_called_once_with(
+            variants=['BaseOS'], override_repos=False, incremental=False)
+
     def test_main_invalid_release_for_dnf_module(self):
         self.mock_object(utils, 'get_distro_info',
                          mock.Mock(return_value=("centos", "7", None)))
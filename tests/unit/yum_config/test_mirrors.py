@@ -0,0 +1,132 @@
+#   Copyright 2021 Red Hat, Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+
+import hashlib
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from . import test_main
+import repo_setup.yum_config.exceptions as exc
+import repo_setup.yum_config.mirrors as mirrors
+import repo_setup.utils as repos_utils
+
+FAKE_REPOMD = b'<repomd/>'
+FAKE_OLD_REPOMD = b'<repomd>old</repomd>'
+
+FAKE_METALINK = (
+    '<?xml version="1.0" encoding="utf-8"?>\n'
+    '<metalink version="3.0" xmlns="http://www.metalinker.org/"'
+    ' xmlns:mm0="http://fedorahosted.org/mirrormanager">\n'
+    ' <files>\n'
+    '  <file name="repomd.xml">\n'
+    '   <mm0:alternates>\n'
+    '    <mm0:alternate>\n'
+    '     <verification>\n'
+    '      <hash type="sha256">%s</hash>\n'
+    '     </verification>\n'
+    '    </mm0:alternate>\n'
+    '   </mm0:alternates>\n'
+    '   <verification>\n'
+    '    <hash type="sha256">%s</hash>\n'
+    '   </verification>\n'
+    '   <resources maxconnections="1">\n'
+    '    <url protocol="https" preference="90">'
+    'https://mirror2/repodata/repomd.xml</url>\n'
+    '    <url protocol="rsync" preference="100">'
+    'rsync://mirror1/repodata/repomd.xml</url>\n'
+    '    <url protocol="http" preference="100">'
+    'http://mirror1/repodata/repomd.xml</url>\n'
+    '   </resources>\n'
+    '  </file>\n'
+    ' </files>\n'
+    '</metalink>\n'
+) % (hashlib.sha256(b'<repomd>alternate</repomd>').hexdigest(),
+     hashlib.sha256(FAKE_REPOMD).hexdigest())
+
+
+class TestMirrors(test_main.TestYumConfigBase):
+    """Tests for mirror resolution functions."""
+
+    def test_parse_mirrorlist(self):
+        self.assertEqual(
+            ['http://mirror1/', 'http://mirror2/'],
+            mirrors.parse_mirrorlist(
+                '# comment\nhttp://mirror1/\n\n  http://mirror2/ \n'))
+
+    def test_parse_metalink(self):
+        urls, hashes = mirrors.parse_metalink(FAKE_METALINK)
+
+        self.assertEqual(['http://mirror1/', 'https://mirror2/'], urls)
+        self.assertEqual(2, len(hashes))
+        self.assertTrue(
+            mirrors.repomd_checksum_matches(FAKE_REPOMD, hashes))
+        self.assertFalse(
+            mirrors.repomd_checksum_matches(FAKE_OLD_REPOMD, hashes))
+
+    def test_get_mirror_urls_metalink(self):
+        url_res = mock.Mock()
+        self.mock_object(url_res, 'read', mock.Mock(
+            return_value=FAKE_METALINK.encode('utf-8')))
+        self.mock_object(repos_utils, 'http_open',
+                         mock.Mock(return_value=url_res))
+
+        urls, hashes = mirrors.get_mirror_urls('http://fake', 'metalink')
+
+        self.assertEqual(['http://mirror1/', 'https://mirror2/'], urls)
+        self.assertEqual(2, len(hashes))
+
+    def test_get_mirror_urls_invalid_url(self):
+        self.mock_object(repos_utils, 'http_open',
+                         mock.Mock(side_effect=IOError('fake error')))
+
+        self.assertRaises(exc.YumConfigUrlError, mirrors.get_mirror_urls,
+                          'http://fake', 'mirrorlist')
+
+    def test_rank_mirrors(self):
+        def fake_fetch_repomd(base_url, timeout):
+            fake_mirrors = {
+                'http://slow/': (FAKE_REPOMD, 0.5),
+                'http://fast/': (FAKE_REPOMD, 0.1),
+                'http://outdated/': (FAKE_OLD_REPOMD, 0.01),
+            }
+            if base_url not in fake_mirrors:
+                raise IOError('unreachable')
+            return fake_mirrors[base_url]
+
+        self.mock_object(mirrors, 'fetch_repomd', fake_fetch_repomd)
+        base_urls = ['http://slow/', 'http://down/', 'http://fast/',
+                     'http://outdated/']
+        hashes = [('sha256', hashlib.sha256(FAKE_REPOMD).hexdigest())]
+
+        self.assertEqual(
+            ['http://outdated/', 'http://fast/', 'http://slow/'],
+            mirrors.rank_mirrors(base_urls, timeout=5))
+        self.assertEqual(
+            ['http://fast/', 'http://slow/'],
+            mirrors.rank_mirrors(base_urls, timeout=5, hashes=hashes))
+        self.assertEqual(
+            ['http://outdated/'],
+            mirrors.rank_mirrors(base_urls, timeout=5, max_mirrors=1))
+
+    def test_mirrors_cache(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        cache_file = os.path.join(tmp_dir, 'cache', 'mirrors.json')
+        cache = {'fake_repo': {'baseurls': ['http://fake/']}}
+
+        self.assertEqual({}, mirrors.load_mirrors_cache(cache_file))
+        mirrors.save_mirrors_cache(cache_file, cache)
+        self.assertEqual(cache, mirrors.load_mirrors_cache(cache_file))
@@ -0,0 +1,264 @@
+#   Copyright 2021 Red Hat, Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+
+import bz2
+import gzip
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from . import test_main
+import repo_setup.yum_config.exceptions as exc
+import repo_setup.yum_config.module_query as module_query
+import repo_setup.yum_config.utils as utils
+
+FAKE_MODULES_YAML = """---
+document: modulemd
+version: 2
+data:
+  name: nodejs
+  stream: "12"
+  version: 8030020210304194401
+  summary: Javascript runtime
+  description: >-
+    profiles: not a real key
+  dependencies:
+  - buildrequires:
+      platform: [el8]
+  profiles:
+    common:
+      rpms:
+      - nodejs
+    development:
+      description: dev tools
+      rpms:
+      - nodejs-devel
+  api:
+    rpms:
+    - nodejs
+...
+---
+document: modulemd
+version: 2
+data:
+  name: nodejs
+  stream: 14
+  profiles:
+    common:
+      rpms:
+      - nodejs
+    minimal:
+      rpms:
+      - nodejs
+...
+---
+document: modulemd-defaults
+version: 1
+data:
+  module: nodejs
+  stream: "12"
+  profiles:
+    '12': [common]
+    14:
+    - minimal
+...
+---
+document: modulemd
+version: 2
+data:
+  name: nginx
+  stream: "1.14"
+  profiles:
+    common:
+      rpms:
+      - nginx
+...
+"""
+
+FAKE_REPOMD = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<repomd xmlns="http://linux.duke.edu/metadata/repo">\n'
+    '  <data type="modules">\n'
+    '    <location href="repodata/abc-modules.yaml.gz"/>\n'
+    '  </data>\n'
+    '</repomd>\n'
+)
+
+FAKE_MODULE_STATE = """[nodejs]
+name=nodejs
+stream=14
+profiles=common
+state=enabled
+"""
+
+
+class TestDnfModuleQuery(test_main.TestYumConfigBase):
+    """Tests for DnfModuleQuery class and its methods."""
+
+    def setUp(self):
+        super(TestDnfModuleQuery, self).setUp()
+        self.mock_object(utils, 'get_distro_info',
+                         mock.Mock(return_value=('centos', '8', None)))
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.repos_dir = os.path.join(self.tmp_dir, 'yum.repos.d')
+        self.cache_dir = os.path.join(self.tmp_dir, 'cache')
+        self.modules_dir = os.path.join(self.tmp_dir, 'modules.d')
+        for path in (self.repos_dir, self.cache_dir, self.modules_dir):
+            os.mkdir(path)
+        # remote repo served through a file:// url
+        self.repo_dir = os.path.join(self.tmp_dir, 'appstream')
+        repodata_dir = os.path.join(self.repo_dir, 'repodata')
+        os.makedirs(repodata_dir)
+        with open(os.path.join(repodata_dir, 'repomd.xml'), 'w') as f:
+            f.write(FAKE_REPOMD)
+        with gzip.open(os.path.join(repodata_dir, 'abc-modules.yaml.gz'),
+                       'wt') as f:
+            f.write(FAKE_MODULES_YAML)
+        with open(os.path.join(self.repos_dir, 'fake.repo'), 'w') as f:
+            f.write('[appstream]\nbaseurl=file://{0}\n'
+                    '[disabled]\nbaseurl=file:///fake\nenabled=0\n'.format(
+                        self.repo_dir))
+
+    def _create_query_obj(self, cacheonly=False):
+        return module_query.DnfModuleQuery(
+            dir_path=self.repos_dir, cache_dir=self.cache_dir,
+            modules_dir=self.modules_dir, cacheonly=cacheonly)
+
+    def test_iter_modulemd(self):
+        documents = list(module_query.iter_modulemd(
+            FAKE_MODULES_YAML.splitlines(True)))
+
+        self.assertEqual([
+            {'document': 'modulemd', 'name': 'nodejs', 'stream': '12',
+             'profiles': ['common', 'development']},
+            {'document': 'modulemd', 'name': 'nodejs', 'stream': '14',
+             'profiles': ['common', 'minimal']},
+            {'document': 'modulemd-defaults', 'name': 'nodejs',
+             'stream': '12',
+             'profiles': {'12': ['common'], '14': ['minimal']}},
+            {'document': 'modulemd', 'name': 'nginx', 'stream': '1.14',
+             'profiles': ['common']},
+        ], documents)
+
+    def test_get_index_from_remote_repo(self):
+        query = self._create_query_obj()
+
+        index = query.get_index()
+
+        self.assertEqual({
+            'nodejs': {
+                'streams': {'12': ['common', 'development'],
+                            '14': ['common', 'minimal']},
+                'default_stream': '12',
+                'default_profiles': {'12': ['common'], '14': ['minimal']}},
+            'nginx': {
+                'streams': {'1.14': ['common']},
+                'default_stream': None,
+                'default_profiles': {}},
+        }, index)
+
+    def test_get_index_prefers_dnf_cache(self):
+        cached_dir = os.path.join(
+            self.cache_dir, 'appstream-0123456789abcdef', 'repodata')
+        os.makedirs(cached_dir)
+        with gzip.open(os.path.join(cached_dir, 'xyz-modules.yaml.gz'),
+                       'wt') as f:
+            f.write(FAKE_MODULES_YAML.split('...\n')[-2])
+        # cache of another repo with a similar name must be ignored
+        os.makedirs(os.path.join(
+            self.cache_dir, 'appstream-source-0123456789abcdef', 'repodata'))
+        mock_fetch = self.mock_object(module_query, 'fetch_repomd')
+
+        index = self._create_query_obj().get_index()
+
+        self.assertEqual(['nginx'], list(index))
+        mock_fetch.assert_not_called()
+
+    def _write_cached_modules(self, name, content):
+        cached_dir = os.path.join(
+            self.cache_dir, 'appstream-0123456789abcdef', 'repodata')
+        os.makedirs(cached_dir)
+        with open(os.path.join(cached_dir, name), 'wb') as f:
+            f.write(content)
+
+    def test_get_index_cached_bz2(self):
+        self._write_cached_modules(
+            'xyz-modules.yaml.bz2',
+            bz2.compress(FAKE_MODULES_YAML.split('...\n')[-2].encode()))
+        mock_fetch = self.mock_object(module_query, 'fetch_repomd')
+
+        index = self._create_query_obj().get_index()
+
+        self.assertEqual(['nginx'], list(index))
+        mock_fetch.assert_not_called()
+
+    def test_get_index_cached_unsupported_compression(self):
+        self._write_cached_modules('xyz-modules.yaml.lz4', b'fake')
+
+        # the remote repo metadata is read instead
+        index = self._create_query_obj().get_index()
+
+        self.assertEqual(['nginx', 'nodejs'], sorted(index))
+
+        # the repo isn't silently left out of the index
+        self.assertRaises(exc.YumConfigFileParseError,
+                          self._create_query_obj(cacheonly=True).get_index)
+
+    def test_get_index_cacheonly(self):
+        mock_fetch = self.mock_object(module_query, 'fetch_repomd')
+
+        self.assertEqual({}, self._create_query_obj(cacheonly=True).get_index())
+        mock_fetch.assert_not_called()
+
+    def test_get_index_unreachable_repo(self):
+        shutil.rmtree(self.repo_dir)
+
+        self.assertEqual({}, self._create_query_obj().get_index())
+
+    def test_list_modules(self):
+        with open(os.path.join(self.modules_dir, 'nodejs.module'), 'w') as f:
+            f.write(FAKE_MODULE_STATE)
+        query = self._create_query_obj()
+
+        modules = query.list_modules(names=['nodejs', 'fake_module'])
+
+        self.assertEqual([
+            {'name': 'nodejs', 'stream': '12',
+             'profiles': ['common', 'development'], 'default': True,
+             'default_profiles': ['common'], 'state': None,
+             'installed_profiles': []},
+            {'name': 'nodejs', 'stream': '14',
+             'profiles': ['common', 'minimal'], 'default': False,
+             'default_profiles': ['minimal'], 'state': 'enabled',
+             'installed_profiles': ['common']},
+        ], modules)
+        self.assertEqual('14', query.get_enabled_stream('nodejs'))
+        self.assertIsNone(query.get_enabled_stream('nginx'))
+
+    def test_format_modules_table(self):
+        modules = [
+            {'name': 'nodejs', 'stream': '12',
+             'profiles': ['common', 'development'], 'default': True,
+             'default_profiles': ['common'], 'state': 'enabled'},
+            {'name': 'nginx', 'stream': '1.14', 'profiles': ['common'],
+             'default': False, 'default_profiles': [], 'state': 'disabled'},
+        ]
+
+        self.assertEqual(
+            'NAME    STREAM      PROFILES\n'
+            'nodejs  12 [d] [e]  common [d], development\n'
+            'nginx   1.14 [x]    common',
+            module_query.format_modules_table(modules))
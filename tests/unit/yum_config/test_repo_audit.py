@@ -0,0 +1,188 @@
+#   Copyright 2021 Red Hat, Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+
+import os
+import shutil
+import socket
+import tempfile
+import time
+from unittest import mock
+import urllib.error
+
+from . import test_main
+import repo_setup.yum_config.repo_audit as repo_audit
+import repo_setup.yum_config.utils as utils
+
+FAKE_REPOMD = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<repomd xmlns="http://linux.duke.edu/metadata/repo">\n'
+    '  <revision>1600000000</revision>\n'
+    '  <data type="primary">\n'
+    '    <timestamp>1600000100</timestamp>\n'
+    '    <size>1000</size>\n'
+    '  </data>\n'
+    '  <data type="filelists">\n'
+    '    <timestamp>1600000200</timestamp>\n'
+    '    <size>234</size>\n'
+    '  </data>\n'
+    '</repomd>\n'
+)
+
+
+class TestYumRepoAudit(test_main.TestYumConfigBase):
+    """Tests for YumRepoAudit class and its methods."""
+
+    def setUp(self):
+        super(TestYumRepoAudit, self).setUp()
+        self.mock_object(utils, 'get_distro_info',
+                         mock.Mock(return_value=('centos', '9', None)))
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.repos_dir = os.path.join(self.tmp_dir, 'yum.repos.d')
+        os.mkdir(self.repos_dir)
+        # local repo served through a file:// url
+        repodata_dir = os.path.join(self.tmp_dir, '9', 'x86_64', 'repodata')
+        os.makedirs(repodata_dir)
+        with open(os.path.join(repodata_dir, 'repomd.xml'), 'w') as f:
+            f.write(FAKE_REPOMD)
+
+    def _write_repo_file(self, content, name='fake.repo'):
+        file_path = os.path.join(self.repos_dir, name)
+        with open(file_path, 'w') as f:
+            f.write(content)
+        return file_path
+
+    def _create_audit_obj(self, dry_run=False):
+        return repo_audit.YumRepoAudit(
+            dir_path=self.repos_dir, dry_run=dry_run,
+            repo_vars={'basearch': 'x86_64'})
+
+    def test_substitute_repo_vars(self):
+        self.assertEqual(
+            'http://fake/9-stream/x86_64/os',
+            utils.substitute_repo_vars(
+                'http://fake/${releasever}-stream/$basearch/os',
+                {'releasever': '9', 'basearch': 'x86_64', 'arch': 'x86_64'}))
+
+    def test_parse_repomd(self):
+        self.assertEqual((1600000200, 1234),
+                         repo_audit.parse_repomd(FAKE_REPOMD))
+
+    def test_get_enabled_repos(self):
+        file_path = self._write_repo_file(
+            '[fake-repo1]\n'
+            'baseurl=file://%s/$releasever/$basearch\n'
+            '        http://fake-mirror/\n'
+            '[fake-repo2]\nbaseurl=http://fake\nenabled=0\n'
+            '[fake-repo3]\nmirrorlist=http://fake-mirrorlist\n' % self.tmp_dir)
+        self._write_repo_file('[fake-repo4]\nbaseurl=http://fake\n',
+                              name='not-a-repo-file.conf')
+
+        audit_obj = self._create_audit_obj()
+
+        self.assertEqual(
+            [{'repo': 'fake-repo1', 'file': file_path,
+              'url': 'file://%s/9/x86_64' % self.tmp_dir},
+             {'repo': 'fake-repo3', 'file': file_path, 'url': None}],
+            audit_obj.get_enabled_repos())
+
+    def test_audit(self):
+        self._write_repo_file(
+            '[fake-repo1]\nbaseurl=file://%s/$releasever/$basearch\n'
+            '[fake-repo2]\nbaseurl=file://%s/missing\n'
+            '[fake-repo3]\nmirrorlist=http://fake-mirrorlist\n'
+            % (self.tmp_dir, self.tmp_dir))
+
+        results = self._create_audit_obj().audit(timeout=5)
+
+        self.assertEqual(['fake-repo1', 'fake-repo2', 'fake-repo3'],
+                         [r['repo'] for r in results])
+        self.assertEqual('ok', results[0]['status'])
+        self.assertEqual(1600000200, results[0]['timestamp'])
+        self.assertEqual(1234, results[0]['size'])
+        self.assertIsNotNone(results[0]['latency'])
+        self.assertEqual('unreachable', results[1]['status'])
+        self.assertEqual('skipped', results[2]['status'])
+
+    def test_audit_stale(self):
+        self._write_repo_file(
+            '[fake-repo1]\nbaseurl=file://%s/$releasever/$basearch\n'
+            % self.tmp_dir)
+
+        results = self._create_audit_obj().audit(
+            timeout=5, max_age=time.time() - 1600000300)
+
+        self.assertEqual('stale', results[0]['status'])
+
+    def test_audit_timeout(self):
+        self._write_repo_file('[fake-repo1]\nbaseurl=http://fake-slow\n')
+
+        def slow_probe(base_url, timeout):
+            time.sleep(1)
+            return {}
+
+        self.mock_object(repo_audit, 'probe_repomd', slow_probe)
+
+        start = time.time()
+        results = self._create_audit_obj().audit(timeout=0.1)
+
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual('timeout', results[0]['status'])
+
+    def test_probe_repomd_request_timeout(self):
+        mock_fetch = self.mock_object(repo_audit, 'fetch_repomd', mock.Mock(
+            side_effect=socket.timeout('timed out')))
+
+        result = repo_audit.probe_repomd('http://fake', 5)
+
+        self.assertEqual('timeout', result['status'])
+        self.assertEqual('timed out', result['error'])
+
+        mock_fetch.side_effect = urllib.error.URLError(
+            socket.timeout('timed out'))
+        self.assertEqual('timeout',
+                         repo_audit.probe_repomd('http://fake', 5)['status'])
+
+        mock_fetch.side_effect = urllib.error.URLError(
+            ConnectionRefusedError('refused'))
+        self.assertEqual('unreachable',
+                         repo_audit.probe_repomd('http://fake', 5)['status'])
+
+    def test_disable_failed_repos(self):
+        file_path = self._write_repo_file(
+            '[fake-repo1]\nbaseurl=file://%s/$releasever/$basearch\n'
+            '[fake-repo2]\nbaseurl=file://%s/missing\n'
+            % (self.tmp_dir, self.tmp_dir))
+        audit_obj = self._create_audit_obj(dry_run=True)
+        results = audit_obj.audit(timeout=5)
+
+        disabled = audit_obj.disable_failed_repos(results)
+
+        self.assertEqual(['fake-repo2'], disabled)
+        self.assertEqual({file_path: {'fake-repo2': {'enabled': (None, '0')}}},
+                         audit_obj.changes)
+
+    def test_format_audit_table(self):
+        table = repo_audit.format_audit_table(
+            [{'repo': 'fake-repo1', 'status': 'ok', 'latency': 0.1234,
+              'size': 1234, 'timestamp': 1600000200, 'url': 'http://fake'},
+             {'repo': 'fake-repo2', 'status': 'skipped', 'latency': None,
+              'size': None, 'timestamp': None, 'url': None}])
+
+        self.assertEqual(
+            'REPO        STATUS   LATENCY  SIZE  TIMESTAMP            URL\n'
+            'fake-repo1  ok       0.123s   1234  2020-09-13 12:30:00  '
+            'http://fake\n'
+            'fake-repo2  skipped  -        -     -                    -',
+            table)
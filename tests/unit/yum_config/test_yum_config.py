@@ -17,6 +17,7 @@ import copy
 import ddt
 import os
 import subprocess
+import tempfile
 from unittest import mock
 
 from . import fakes
@@ -228,6 +229,271 @@ class TestYumConfig(test_main.TestYumConfigBase):
 
         mock_read_config.assert_called_once_with(fakes.FAKE_FILE_PATH)
 
+    def _write_tmp_config(self, content):
+        fd, file_path = tempfile.mkstemp(suffix='.repo')
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+        self.addCleanup(os.remove, file_path)
+        return file_path
+
+    def test_update_section_without_changes(self):
+        file_path = self._write_tmp_config(
+            '[fake_section1]\nfake_option1=fake_value\n')
+        mtime = os.path.getmtime(file_path)
+        yum_config = yum_cfg.YumConfig(valid_options=fakes.FAKE_SUPP_OPTIONS)
+        mock_write = self.mock_object(yum_cfg, 'write_config_file')
+
+        result = yum_config.update_section(
+            fakes.FAKE_SECTION1, {fakes.FAKE_OPTION1: 'fake_value'},
+            file_path=file_path)
+
+        self.assertFalse(result)
+        self.assertFalse(yum_config.changed)
+        self.assertEqual({}, yum_config.changes)
+        mock_write.assert_not_called()
+        self.assertEqual(mtime, os.path.getmtime(file_path))
+
+    def test_update_section_with_changes(self):
+        file_path = self._write_tmp_config(
+            '[fake_section1]\nfake_option1=old_value\n')
+        yum_config = yum_cfg.YumConfig(valid_options=fakes.FAKE_SUPP_OPTIONS)
+
+        result = yum_config.update_section(
+            fakes.FAKE_SECTION1,
+            {fakes.FAKE_OPTION1: 'new_value', 'fake_option2': 'value2'},
+            file_path=file_path)
+
+        self.assertTrue(result)
+        self.assertEqual(
+            {file_path: {fakes.FAKE_SECTION1: {
+                fakes.FAKE_OPTION1: ('old_value', 'new_value'),
+                'fake_option2': (None, 'value2')}}},
+            yum_config.changes)
+        config = configparser.ConfigParser()
+        config.read(file_path)
+        self.assertEqual('new_value',
+                         config[fakes.FAKE_SECTION1][fakes.FAKE_OPTION1])
+        self.assertEqual(
+            [{'before_header': file_path,
+              'after_header': file_path,
+              'before': '[fake_section1]\nfake_option1=old_value\n',
+              'after': ('[fake_section1]\nfake_option1=new_value\n'
+                        'fake_option2=value2\n')}],
+            yum_config.get_diff())
+
+    def test_update_section_dry_run(self):
+        content = '[fake_section1]\nfake_option1=old_value\n'
+        file_path = self._write_tmp_config(content)
+        yum_config = yum_cfg.YumConfig(valid_options=fakes.FAKE_SUPP_OPTIONS,
+                                       dry_run=True)
+
+        result = yum_config.update_section(
+            fakes.FAKE_SECTION1, {fakes.FAKE_OPTION1: 'new_value'},
+            file_path=file_path)
+        # a second update must consider the pending changes
+        second_result = yum_config.update_section(
+            fakes.FAKE_SECTION1, {fakes.FAKE_OPTION1: 'new_value'},
+            file_path=file_path)
+
+        self.assertTrue(result)
+        self.assertFalse(second_result)
+        self.assertTrue(yum_config.changed)
+        with open(file_path) as f:
+            self.assertEqual(content, f.read())
+
+    def test_add_section_dry_run_new_file(self):
+        yum_config = yum_cfg.YumRepoConfig(dir_path=tempfile.gettempdir(),
+                                           dry_run=True)
+        file_path = os.path.join(tempfile.gettempdir(), 'fake-dry-run.repo')
+
+        yum_config.add_or_update_section(
+            fakes.FAKE_SECTION1, set_dict={'baseurl': 'fake_url'},
+            file_path=file_path, enabled=True)
+
+        self.assertFalse(os.path.exists(file_path))
+        self.assertEqual(
+            [{'before_header': file_path,
+              'after_header': file_path,
+              'before': '',
+              'after': ('[fake_section1]\nbaseurl=fake_url\nenabled=1\n'
+                        'name=fake_section1\n')}],
+            yum_config.get_diff())
+
+    def test_update_all_sections_single_write(self):
+        file_path = self._write_tmp_config(
+            '[fake_section1]\nfake_option1=1\n'
+            '[fake_section2]\nfake_option1=0\n')
+        yum_config = yum_cfg.YumConfig(valid_options=fakes.FAKE_SUPP_OPTIONS)
+        mock_write = self.mock_object(yum_cfg, 'write_config_file')
+
+        result = yum_config.update_all_sections(
+            {fakes.FAKE_OPTION1: '0'}, file_path)
+
+        self.assertTrue(result)
+        self.assertEqual(
+            {file_path: {fakes.FAKE_SECTION1: {
+                fakes.FAKE_OPTION1: ('1', '0')}}},
+            yum_config.changes)
+        mock_write.assert_called_once_with(file_path, mock.ANY)
+
+    def test_update_sections(self):
+        file_path = self._write_tmp_config(
+            '[fake_section1]\nfake_option1=1\n'
+            '[fake_section2]\nfake_option1=1\n')
+        yum_config = yum_cfg.YumConfig(valid_options=fakes.FAKE_SUPP_OPTIONS)
+        mock_write = self.mock_object(yum_cfg, 'write_config_file')
+
+        result = yum_config.update_sections(
+            {fakes.FAKE_SECTION1: {fakes.FAKE_OPTION1: '0'},
+             fakes.FAKE_SECTION2: {fakes.FAKE_OPTION1: '0'}}, file_path)
+
+        self.assertTrue(result)
+        self.assertEqual(
+            {file_path: {
+                fakes.FAKE_SECTION1: {fakes.FAKE_OPTION1: ('1', '0')},
+                fakes.FAKE_SECTION2: {fakes.FAKE_OPTION1: ('1', '0')}}},
+            yum_config.changes)
+        mock_write.assert_called_once_with(file_path, mock.ANY)
+
+    def test_update_sections_invalid_section(self):
+        file_path = self._write_tmp_config('[fake_section1]\n')
+        yum_config = yum_cfg.YumConfig(valid_options=fakes.FAKE_SUPP_OPTIONS)
+
+        self.assertRaises(exc.YumConfigInvalidSection,
+                          yum_config.update_sections,
+                          {fakes.FAKE_SECTION2: {fakes.FAKE_OPTION1: '0'}},
+                          file_path)
+
+    def test_get_changed_repos(self):
+        file_path = self._write_tmp_config(
+            '[fake_section1]\nenabled=1\n[fake_section2]\nenabled=1\n')
+        yum_config = yum_cfg.YumRepoConfig(dir_path=tempfile.gettempdir())
+
+        yum_config.update_section(fakes.FAKE_SECTION1, set_dict={},
+                                  file_path=file_path, enabled=False)
+        yum_config.update_section(fakes.FAKE_SECTION2,
+                                  set_dict={'baseurl': 'fake_url'},
+                                  file_path=file_path)
+
+        self.assertEqual([fakes.FAKE_SECTION2],
+                         yum_config.get_changed_repos())
+
+    def test_resolve_mirrors(self):
+        file_path = self._write_tmp_config(
+            '[fake_section1]\nmirrorlist=http://fake/$basearch\n')
+        cache_file = file_path + '.json'
+        self.addCleanup(os.remove, cache_file)
+        self.mock_object(yum_cfg, 'get_repo_vars',
+                         mock.Mock(return_value={'basearch': 'x86_64'}))
+        mock_get_urls = self.mock_object(
+            yum_cfg, 'get_mirror_urls',
+            mock.Mock(return_value=(['http://m1/', 'http://m2/'], [])))
+        mock_rank = self.mock_object(
+            yum_cfg, 'rank_mirrors',
+            mock.Mock(return_value=['http://m2/', 'http://m1/']))
+        yum_config = yum_cfg.YumRepoConfig(dir_path=tempfile.gettempdir())
+
+        result = yum_config.resolve_mirrors(
+            fakes.FAKE_SECTION1, file_path=file_path, cache_file=cache_file)
+
+        self.assertTrue(result)
+        mock_get_urls.assert_called_once_with(
+            'http://fake/x86_64', 'mirrorlist', timeout=None)
+        mock_rank.assert_called_once_with(
+            ['http://m1/', 'http://m2/'], timeout=None, hashes=None,
+            max_mirrors=None)
+        config = configparser.ConfigParser()
+        config.read(file_path)
+        self.assertEqual('http://m2/,http://m1/',
+                         config.get(fakes.FAKE_SECTION1, 'baseurl'))
+        self.assertEqual('', config.get(fakes.FAKE_SECTION1, 'mirrorlist'))
+
+        # a fresh resolution is reused, without measuring mirrors again
+        yum_config = yum_cfg.YumRepoConfig(dir_path=tempfile.gettempdir())
+        result = yum_config.resolve_mirrors(
+            fakes.FAKE_SECTION1, file_path=file_path, cache_file=cache_file)
+
+        self.assertFalse(result)
+        self.assertEqual(1, mock_get_urls.call_count)
+
+        # an expired resolution is refreshed from the cached source
+        mock_rank.return_value = ['http://m1/']
+        result = yum_config.resolve_mirrors(
+            fakes.FAKE_SECTION1, file_path=file_path, ttl=0,
+            cache_file=cache_file)
+
+        self.assertTrue(result)
+        self.assertEqual(2, mock_get_urls.call_count)
+        self.assertEqual(
+            {file_path: {fakes.FAKE_SECTION1: {
+                'baseurl': ('http://m2/,http://m1/', 'http://m1/')}}},
+            yum_config.changes)
+
+    def test_add_or_update_all_sections_from_url_mirrors(self):
+        file_path = self._write_tmp_config(
+            '[fake_section1]\nmirrorlist=http://fake/$basearch\n')
+        cache_file = file_path + '.json'
+        self.addCleanup(os.remove, cache_file)
+        self.mock_object(yum_cfg, 'get_repo_vars',
+                         mock.Mock(return_value={'basearch': 'x86_64'}))
+        mock_get_urls = self.mock_object(
+            yum_cfg, 'get_mirror_urls',
+            mock.Mock(return_value=(['http://m1/', 'http://m2/'], [])))
+        self.mock_object(yum_cfg, 'rank_mirrors',
+                         mock.Mock(return_value=['http://m2/', 'http://m1/']))
+        fake_config = configparser.ConfigParser()
+        fake_config.read_string(
+            '[fake_section1]\nmirrorlist=http://fake/$basearch\n')
+        mock_get_from_url = self.mock_object(
+            yum_cfg.YumRepoConfig, 'get_config_from_url',
+            mock.Mock(return_value=fake_config))
+        mock_write = self.mock_object(yum_cfg, 'write_config_file',
+                                      mock.Mock(wraps=yum_cfg.
+                                                write_config_file))
+        mirrors = {'cache_file': cache_file}
+
+        yum_config = yum_cfg.YumRepoConfig(dir_path=tempfile.gettempdir())
+        result = yum_config.add_or_update_all_sections_from_url(
+            fakes.FAKE_REPO_DOWN_URL, file_path=file_path, set_dict={},
+            mirrors=mirrors)
+
+        self.assertTrue(result)
+        self.assertEqual(1, mock_write.call_count)
+        self.assertEqual(1, mock_get_from_url.call_count)
+        self.assertEqual(
+            {file_path: {fakes.FAKE_SECTION1: {
+                'baseurl': (None, 'http://m2/,http://m1/'),
+                'mirrorlist': ('http://fake/$basearch', ''),
+                'name': (None, fakes.FAKE_SECTION1)}}},
+            yum_config.changes)
+
+        # the repo file from the url still has the mirrorlist, but the
+        # resolved repo is already written
+        for __ in range(2):
+            yum_config = yum_cfg.YumRepoConfig(
+                dir_path=tempfile.gettempdir())
+            result = yum_config.add_or_update_all_sections_from_url(
+                fakes.FAKE_REPO_DOWN_URL, file_path=file_path, set_dict={},
+                mirrors=mirrors)
+
+            self.assertFalse(result)
+            self.assertFalse(yum_config.changed)
+        self.assertEqual(1, mock_write.call_count)
+        self.assertEqual(1, mock_get_urls.call_count)
+
+    def test_resolve_mirrors_no_mirrors(self):
+        file_path = self._write_tmp_config(
+            '[fake_section1]\nmetalink=http://fake\n')
+        self.mock_object(yum_cfg, 'get_mirror_urls',
+                         mock.Mock(return_value=(['http://m1/'], [])))
+        self.mock_object(yum_cfg, 'rank_mirrors',
+                         mock.Mock(return_value=[]))
+        yum_config = yum_cfg.YumRepoConfig(dir_path=tempfile.gettempdir())
+
+        self.assertRaises(exc.YumConfigUrlError, yum_config.resolve_mirrors,
+                          fakes.FAKE_SECTION1, file_path=file_path,
+                          cache_file=file_path + '.json')
+
     def test_source_env_file(self):
         p_open_mock = mock.Mock()
         mock_open = self.mock_object(subprocess, 'Popen',
@@ -435,6 +701,20 @@ class TestYumRepoConfig(test_main.TestYumConfigBase):
             file_path=exp_file_path, enabled=True,
             create_if_not_exists=True)
 
+    def test_get_config_from_url_md5_cached(self):
+        mock_get_file = self.mock_object(
+            repos_utils, 'get_repo_file',
+            mock.Mock(return_value='[%s]\nkey=value\n' % fakes.FAKE_SECTION1))
+        mock_http_get = self.mock_object(repos_utils, 'http_get')
+
+        config = self.config_obj.get_config_from_url(fakes.FAKE_REPO_DOWN_URL)
+
+        self.assertEqual([fakes.FAKE_SECTION1], config.sections())
+        mock_get_file.assert_called_once_with(
+            fakes.FAKE_REPO_DOWN_URL, mock.ANY,
+            cache_dir=repos_utils.REPO_FILES_CACHE_DIR)
+        self.assertFalse(mock_http_get.called)
+
 
 @ddt.ddt
 class TestYumGlobalConfig(test_main.TestYumConfigBase):